@@ -0,0 +1,396 @@
+"""
+    Serveur CalDAV minimal, en mémoire, pour remplacer iCloud en local.
+
+    Il implémente juste ce qu'utilise caldav.DAVClient dans Salva.Calendars :
+    découverte PROPFIND (principal, calendar-home-set, calendriers),
+    REPORT calendar-query avec time-range, calendar-multiget, GET/PUT/DELETE
+    et ETags. Une latence fixe peut être ajoutée à chaque requête pour
+    simuler le réseau.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter
+from datetime import datetime, timedelta, timezone, date
+from typing import Optional, List
+from xml.sax.saxutils import escape
+import threading
+import hashlib
+import time
+import re
+
+from icalendar import Calendar, Event
+
+PRINCIPAL_PATH = "/principal/"
+HOME_PATH = "/calendars/"
+
+TIME_RANGE_PATTERN = re.compile(r"<[^>]*time-range[^>]*>", re.IGNORECASE)
+ATTR_PATTERN = re.compile(r'(start|end)="([0-9TZ]+)"', re.IGNORECASE)
+HREF_PATTERN = re.compile(r"<(?:[\w-]+:)?href>([^<]+)</(?:[\w-]+:)?href>", re.IGNORECASE)
+COMP_PATTERN = re.compile(r'comp-filter[^>]*name="(VEVENT|VTODO|VJOURNAL)"', re.IGNORECASE)
+
+
+def _to_utc(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    raise ValueError(f"Date invalide : {value}")
+
+
+def _parse_caldav_time(value: str) -> datetime:
+    return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+
+
+def _etag(data: str) -> str:
+    return '"' + hashlib.md5(data.encode("utf-8")).hexdigest() + '"'
+
+
+def build_event_ics(uid: str, summary: str, start: datetime, end: datetime, **fields) -> str:
+    """Construit un VCALENDAR contenant un seul VEVENT."""
+    cal = Calendar()
+    cal.add("prodid", "-//DailyBrief//Stub//EN")
+    cal.add("version", "2.0")
+
+    event = Event()
+    event.add("uid", uid)
+    event.add("summary", summary)
+    event.add("dtstart", start)
+    event.add("dtend", end)
+    event.add("dtstamp", datetime.now(timezone.utc))
+    for key, value in fields.items():
+        if value is not None:
+            event.add(key, value)
+
+    cal.add_component(event)
+    return cal.to_ical().decode("utf-8")
+
+
+class StoredObject:
+    __slots__ = ("ics", "etag", "start", "end", "component")
+
+    def __init__(self, ics: str):
+        self.ics = ics
+        self.etag = _etag(ics)
+        self.start, self.end, self.component = self._time_bounds(ics)
+
+    @staticmethod
+    def _time_bounds(ics: str):
+        cal = Calendar.from_ical(ics)
+        for component in cal.walk():
+            if component.name in ("VEVENT", "VTODO", "VJOURNAL"):
+                dtstart = component.get("DTSTART") or component.get("DUE")
+                dtend = component.get("DTEND")
+                start = _to_utc(dtstart.dt) if dtstart else None
+                end = _to_utc(dtend.dt) if dtend else (start + timedelta(seconds=1) if start else None)
+                return start, end, component.name
+        return None, None, None
+
+
+class CalDAVStub:
+    """Serveur CalDAV local pour les tests de synchronisation et les benchmarks.
+
+    Usage :
+        stub = CalDAVStub(calendars=["Travail"], latency=0.02)
+        stub.start()
+        cal = Calendars(url=stub.url, username="bench", password="bench")
+        ...
+        stub.stop()
+    """
+
+    def __init__(
+        self,
+        calendars: Optional[List[str]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+
+        # {slug: {"name": "Travail", "objects": {href: StoredObject}}}
+        self.calendars = {}
+        for name in calendars or ["Travail"]:
+            self.add_calendar(name)
+
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # ============================================
+    # CYCLE DE VIE
+    # ============================================
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self) -> "CalDAVStub":
+        handler = type("CalDAVStubHandler", (_CalDAVHandler,), {"stub": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ============================================
+    # DONNÉES
+    # ============================================
+
+    def add_calendar(self, name: str) -> str:
+        slug = re.sub(r"[^\w-]", "-", name.lower())
+        self.calendars[slug] = {"name": name, "objects": {}}
+        return slug
+
+    def calendar_path(self, name: str) -> str:
+        slug = next(s for s, c in self.calendars.items() if c["name"] == name)
+        return f"{HOME_PATH}{slug}/"
+
+    def put_object(self, path: str, ics: str) -> StoredObject:
+        slug, href = self._split_object_path(path)
+        obj = StoredObject(ics)
+        with self._lock:
+            self.calendars[slug]["objects"][href] = obj
+        return obj
+
+    def seed(self, calendar_name: str, events: List[dict]) -> None:
+        """Ajoute des events directement en mémoire (sans passer par HTTP).
+
+        Chaque event est un dict avec uid, summary, start, end et
+        éventuellement description, location, url.
+        """
+        base = self.calendar_path(calendar_name)
+        for event in events:
+            fields = {k: v for k, v in event.items() if k not in ("uid", "summary", "start", "end")}
+            ics = build_event_ics(event["uid"], event["summary"], event["start"], event["end"], **fields)
+            self.put_object(f"{base}{event['uid']}.ics", ics)
+
+    def object_count(self, calendar_name: str) -> int:
+        slug = self.calendar_path(calendar_name).strip("/").split("/")[-1]
+        return len(self.calendars[slug]["objects"])
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.request_counts.clear()
+
+    def _split_object_path(self, path: str):
+        parts = path.strip("/").split("/")
+        if len(parts) != 3 or "/" + parts[0] + "/" != HOME_PATH or parts[1] not in self.calendars:
+            raise KeyError(path)
+        return parts[1], parts[2]
+
+
+class _CalDAVHandler(BaseHTTPRequestHandler):
+    stub: CalDAVStub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Silencieux : les benchmarks génèrent des milliers de requêtes
+        pass
+
+    # ============================================
+    # UTILITAIRES
+    # ============================================
+
+    def _begin(self) -> str:
+        with self.stub._lock:
+            self.stub.request_counts[self.command] += 1
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length).decode("utf-8") if length else ""
+
+    def _send(self, status: int, body: str = "", content_type: str = "application/xml; charset=utf-8", headers: Optional[dict] = None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("DAV", "1, 2, 3, calendar-access")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    @staticmethod
+    def _multistatus(responses: List[str]) -> str:
+        return (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<d:multistatus xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav" '
+            'xmlns:cs="http://calendarserver.org/ns/">'
+            + "".join(responses)
+            + "</d:multistatus>"
+        )
+
+    @staticmethod
+    def _response(href: str, props: str) -> str:
+        return (
+            f"<d:response><d:href>{escape(href)}</d:href>"
+            f"<d:propstat><d:prop>{props}</d:prop>"
+            f"<d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+        )
+
+    def _calendar_props(self, slug: str) -> str:
+        calendar = self.stub.calendars[slug]
+        ctag = hashlib.md5("".join(o.etag for o in calendar["objects"].values()).encode()).hexdigest()
+        return (
+            "<d:resourcetype><d:collection/><c:calendar/></d:resourcetype>"
+            f"<d:displayname>{escape(calendar['name'])}</d:displayname>"
+            "<c:supported-calendar-component-set>"
+            '<c:comp name="VEVENT"/><c:comp name="VTODO"/>'
+            "</c:supported-calendar-component-set>"
+            f"<cs:getctag>{ctag}</cs:getctag>"
+        )
+
+    def _principal_props(self) -> str:
+        return (
+            "<d:resourcetype><d:principal/></d:resourcetype>"
+            f"<d:current-user-principal><d:href>{PRINCIPAL_PATH}</d:href></d:current-user-principal>"
+            f"<c:calendar-home-set><d:href>{HOME_PATH}</d:href></c:calendar-home-set>"
+            "<d:displayname>bench</d:displayname>"
+        )
+
+    @staticmethod
+    def _object_props(obj: StoredObject, with_data: bool) -> str:
+        props = f"<d:getetag>{escape(obj.etag)}</d:getetag><d:getcontenttype>text/calendar</d:getcontenttype>"
+        if with_data:
+            props += f"<c:calendar-data>{escape(obj.ics)}</c:calendar-data>"
+        return props
+
+    # ============================================
+    # MÉTHODES HTTP
+    # ============================================
+
+    def do_OPTIONS(self):
+        self._begin()
+        self._send(200, headers={"Allow": "OPTIONS, GET, PUT, DELETE, PROPFIND, REPORT"})
+
+    def do_PROPFIND(self):
+        self._begin()
+        path = self.path.split("?")[0]
+        depth = self.headers.get("Depth", "0")
+
+        if path in ("/", PRINCIPAL_PATH):
+            self._send(207, self._multistatus([self._response(path, self._principal_props())]))
+            return
+
+        if path == HOME_PATH:
+            responses = [self._response(HOME_PATH, "<d:resourcetype><d:collection/></d:resourcetype>")]
+            if depth != "0":
+                for slug in self.stub.calendars:
+                    responses.append(self._response(f"{HOME_PATH}{slug}/", self._calendar_props(slug)))
+            self._send(207, self._multistatus(responses))
+            return
+
+        parts = path.strip("/").split("/")
+        if len(parts) >= 2 and parts[1] in self.stub.calendars:
+            slug = parts[1]
+            objects = self.stub.calendars[slug]["objects"]
+            if len(parts) == 2:
+                responses = [self._response(f"{HOME_PATH}{slug}/", self._calendar_props(slug))]
+                if depth != "0":
+                    for href, obj in list(objects.items()):
+                        responses.append(self._response(f"{HOME_PATH}{slug}/{href}", self._object_props(obj, False)))
+                self._send(207, self._multistatus(responses))
+                return
+            obj = objects.get(parts[2])
+            if obj:
+                self._send(207, self._multistatus([self._response(path, self._object_props(obj, False))]))
+                return
+
+        self._send(404)
+
+    def do_REPORT(self):
+        body = self._begin()
+        path = self.path.split("?")[0]
+        parts = path.strip("/").split("/")
+        if len(parts) != 2 or parts[1] not in self.stub.calendars:
+            self._send(404)
+            return
+
+        slug = parts[1]
+        objects = list(self.stub.calendars[slug]["objects"].items())
+        base = f"{HOME_PATH}{slug}/"
+
+        if "calendar-multiget" in body:
+            wanted = {href.strip().rsplit("/", 1)[-1] for href in HREF_PATTERN.findall(body)}
+            matches = [(href, obj) for href, obj in objects if href in wanted]
+        else:
+            start, end = None, None
+            time_range = TIME_RANGE_PATTERN.search(body)
+            if time_range:
+                for attr, value in ATTR_PATTERN.findall(time_range.group(0)):
+                    if attr.lower() == "start":
+                        start = _parse_caldav_time(value)
+                    else:
+                        end = _parse_caldav_time(value)
+
+            comps = {c.upper() for c in COMP_PATTERN.findall(body)}
+            matches = []
+            for href, obj in objects:
+                if comps and obj.component not in comps:
+                    continue
+                if start and obj.end and obj.end <= start:
+                    continue
+                if end and obj.start and obj.start >= end:
+                    continue
+                matches.append((href, obj))
+
+        responses = [self._response(f"{base}{href}", self._object_props(obj, True)) for href, obj in matches]
+        self._send(207, self._multistatus(responses))
+
+    def do_GET(self):
+        self._begin()
+        try:
+            slug, href = self.stub._split_object_path(self.path.split("?")[0])
+            obj = self.stub.calendars[slug]["objects"][href]
+        except KeyError:
+            self._send(404)
+            return
+        self._send(200, obj.ics, content_type="text/calendar; charset=utf-8", headers={"ETag": obj.etag})
+
+    def do_PUT(self):
+        body = self._begin()
+        path = self.path.split("?")[0]
+        try:
+            slug, href = self.stub._split_object_path(path)
+        except KeyError:
+            self._send(404)
+            return
+
+        existing = self.stub.calendars[slug]["objects"].get(href)
+        if self.headers.get("If-None-Match") == "*" and existing:
+            self._send(412)
+            return
+        if_match = self.headers.get("If-Match")
+        if if_match and (not existing or existing.etag != if_match):
+            self._send(412)
+            return
+
+        obj = self.stub.put_object(path, body)
+        self._send(204 if existing else 201, headers={"ETag": obj.etag})
+
+    def do_DELETE(self):
+        self._begin()
+        try:
+            slug, href = self.stub._split_object_path(self.path.split("?")[0])
+        except KeyError:
+            self._send(404)
+            return
+
+        with self.stub._lock:
+            removed = self.stub.calendars[slug]["objects"].pop(href, None)
+        self._send(204 if removed else 404)
@@ -0,0 +1,121 @@
+"""
+    Compare les latences de Salva sur MySQL et sur SQLite (WAL).
+
+    Pour chaque environnement de Salva.database (--envs) :
+        - sync cold / warm contre un serveur CalDAVStub local
+        - planification d'une semaine (templates hebdomadaires)
+        - écritures unitaires : N create_instance, un commit chacun
+
+    Les tables de chaque environnement sont supprimées puis recréées :
+    l'environnement 'prod' est refusé, et une base MySQL n'est utilisée
+    qu'avec --yes. Par défaut, seul SQLite est mesuré.
+
+    Usage (depuis app/) :
+        python -m Bench.bench_backends --events 1000
+        python -m Bench.bench_backends --envs test sqlite --yes --events 1000
+"""
+from datetime import datetime, timedelta, timezone, date
+import argparse
+import statistics
+import time
+
+from sqlmodel import SQLModel, Session
+
+from Bench.bench_sync import run_case
+from Salva.database import get_engine, resolve_env, is_sqlite
+from Salva.models import User, TaskTemplate, RecurrencePattern
+from Salva.Repository.Instances import InstancesRepository
+from Salva.Services.ScheduleEvent import ScheduleEvent
+
+
+def bench_schedule(engine, templates: int) -> float:
+    """Planifie une semaine pour `templates` templates hebdomadaires (7 jours chacun)."""
+    with Session(engine) as session:
+        user = User(email="bench-schedule@example.com")
+        session.add(user)
+        session.commit()
+
+        for t in range(templates):
+            session.add(TaskTemplate(
+                user_id=user.id,
+                title=f"Habitude {t}",
+                normalized_title=f"habitude {t}",
+                recurrence_pattern=RecurrencePattern.WEEKLY,
+                recurrence_data={"days": list(range(7)), "time": f"{8 + t % 10}:00"},
+            ))
+        session.commit()
+
+        SE = ScheduleEvent(session)
+        week = date(2026, 1, 4)
+
+        # Même travail que calcul_new_week, qui ne s'exécute que le dimanche
+        t0 = time.perf_counter()
+        Templates = SE.TemRep.get_user_templates(user.id)
+        with SE.InsRep.batch():
+            for template in Templates:
+                for jour in template.recurrence_data["days"]:
+                    SE._create_instance(template, week + timedelta(days=jour))
+            SE._create_pending_instances(user.id)
+        return time.perf_counter() - t0
+
+
+def bench_single_writes(engine, count: int) -> list[float]:
+    """Latence (ms) de create_instance hors batch : un INSERT + un commit par appel."""
+    timings = []
+    with Session(engine) as session:
+        user = User(email="bench-writes@example.com")
+        session.add(user)
+        session.commit()
+
+        repo = InstancesRepository(session)
+        start = datetime(2026, 1, 5, 8, 0, tzinfo=timezone.utc)
+        for i in range(count):
+            t0 = time.perf_counter()
+            repo.create_instance(
+                user_id=user.id,
+                title=f"Écriture {i}",
+                scheduled_start=start + timedelta(hours=i),
+                scheduled_end=start + timedelta(hours=i, minutes=30),
+            )
+            timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def run_env(env: str, opt) -> None:
+    engine = get_engine(env)
+    print(f"\n=== {resolve_env(env)} ({engine.dialect.name}) ===")
+
+    result = run_case(opt.events, opt, engine=engine)
+    for phase, elapsed in result["timings"].items():
+        print(f"  {'sync ' + phase:18s} : {elapsed:8.2f}s  ({opt.events} events)")
+
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    elapsed = bench_schedule(engine, opt.templates)
+    print(f"  {'planification':18s} : {elapsed:8.2f}s  ({opt.templates} templates x 7 jours)")
+
+    timings = sorted(bench_single_writes(engine, opt.writes))
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"  {'create_instance':18s} : p50 = {statistics.median(timings):.2f} ms   p95 = {p95:.2f} ms  ({opt.writes} commits)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparaison MySQL / SQLite pour la sync et la planification")
+    parser.add_argument("--envs", nargs="+", default=["sqlite"], help="Environnements de Salva.database à comparer")
+    parser.add_argument("--yes", action="store_true", help="Accepte d'effacer les tables des bases MySQL de --envs")
+    parser.add_argument("--events", type=int, default=1000, help="Nombre d'events iCloud pour la sync")
+    parser.add_argument("--days", type=int, default=90, help="Période couverte par les events")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence ajoutée à chaque requête CalDAV (secondes)")
+    parser.add_argument("--templates", type=int, default=50, help="Nombre de templates à planifier")
+    parser.add_argument("--writes", type=int, default=200, help="Nombre d'écritures unitaires")
+
+    args = parser.parse_args()
+
+    for env in args.envs:
+        if resolve_env(env) == "PROD":
+            parser.error("l'environnement 'prod' ne peut pas être utilisé pour un benchmark")
+        if not is_sqlite(env) and not args.yes:
+            parser.error(f"les tables de '{resolve_env(env)}' seraient supprimées : relancer avec --yes pour confirmer")
+
+    for env in args.envs:
+        run_env(env, args)
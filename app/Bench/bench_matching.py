@@ -0,0 +1,137 @@
+"""
+    Compare le matching par paire (Matcher) et le matching vectorisé (BatchMatcher).
+
+    Données synthétiques : T templates, N instances PENDING dont les titres
+    reprennent un template (à l'identique, au pluriel, avec un numéro) ou sont
+    nouveaux. Deux mesures :
+        - classement seul (rank_titles), sur les titres distincts, sans base
+        - match_user complet sur une base SQLite en mémoire (--full)
+    ainsi que l'accord entre les deux méthodes (même meilleur template, même
+    décision MATCHED / ORPHAN).
+
+    Usage (depuis app/) :
+        python -m Bench.bench_matching --templates 3000 --instances 30000 --full
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import random
+import time
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from Salva.models import User, TaskTemplate, TaskOrigin, normalize_title
+from Salva.Repository.Instances import InstancesRepository
+from Salva.Services.Matcher import Matcher
+from Salva.Services.BatchMatcher import BatchMatcher
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_titles(templates: int, instances: int, seed: int = 1) -> tuple[list[str], list[str]]:
+    """(titres des templates, titres des instances)."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijlmnoprstuv") for _ in range(rng.randrange(4, 10))) for _ in range(3000)]
+
+    template_titles = set()
+    while len(template_titles) < templates:
+        template_titles.add(" ".join(rng.sample(words, rng.randrange(1, 4))))
+    template_titles = sorted(template_titles)
+
+    instance_titles = []
+    for i in range(instances):
+        # Trois sur quatre reprennent un template, le reste est nouveau
+        title = rng.choice(template_titles) if i % 4 else " ".join(rng.sample(words, 2))
+        if i % 7 == 0:
+            title += "s"
+        if i % 11 == 0:
+            title += f" {i % 50}"
+        instance_titles.append(title)
+    return template_titles, instance_titles
+
+
+def seed(engine, template_titles: list[str], instance_titles: list[str]) -> int:
+    with Session(engine) as session:
+        user = User(email="bench-matching@example.com")
+        session.add(user)
+        session.commit()
+
+        for title in template_titles:
+            session.add(TaskTemplate(user_id=user.id, title=title, normalized_title=normalize_title(title)))
+        session.commit()
+
+        InstancesRepository(session).create_instances([
+            {
+                "user_id": user.id,
+                "title": title,
+                "scheduled_start": START + timedelta(minutes=i),
+                "scheduled_end": START + timedelta(minutes=i + 30),
+                "origin": TaskOrigin.CALENDAR,
+                "calendar_event_id": f"bench-{i}",
+            }
+            for i, title in enumerate(instance_titles)
+        ])
+        return user.id
+
+
+def memory_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def bench_ranking(template_titles: list[str], instance_titles: list[str]) -> None:
+    templates = [
+        TaskTemplate(id=i + 1, user_id=1, title=title, normalized_title=normalize_title(title))
+        for i, title in enumerate(template_titles)
+    ]
+    titles = sorted({normalize_title(title) for title in instance_titles})
+
+    with Session(memory_engine()) as session:
+        matchers = {"par paire": Matcher(session), "vectorisé": BatchMatcher(session)}
+        ranked = {}
+        for name, matcher in matchers.items():
+            t0 = time.perf_counter()
+            ranked[name] = matcher.rank_titles(templates, titles)
+            print(f"  {'classement ' + name:22s} : {time.perf_counter() - t0:8.2f}s  ({len(titles)} titres distincts)")
+
+    pair, batch = ranked["par paire"], ranked["vectorisé"]
+    same_best = same_decision = 0
+    for title in titles:
+        best_pair = pair[title][0] if pair[title] else None
+        best_batch = batch[title][0] if batch[title] else None
+        if best_pair and best_batch and best_pair[0] == best_batch[0]:
+            same_best += 1
+        accepted_pair = best_pair is not None and best_pair[1] >= matchers["par paire"].threshold
+        accepted_batch = best_batch is not None and best_batch[1] >= matchers["vectorisé"].threshold
+        if accepted_pair == accepted_batch and (not accepted_pair or best_pair[0] == best_batch[0]):
+            same_decision += 1
+
+    print(f"  {'même meilleur':22s} : {same_best / len(titles):8.1%}")
+    print(f"  {'même décision':22s} : {same_decision / len(titles):8.1%}")
+
+
+def bench_full(template_titles: list[str], instance_titles: list[str]) -> None:
+    for name, matcher_class in (("par paire", Matcher), ("vectorisé", BatchMatcher)):
+        engine = memory_engine()
+        user_id = seed(engine, template_titles, instance_titles)
+        with Session(engine) as session:
+            t0 = time.perf_counter()
+            stats = matcher_class(session).match_user(user_id)
+            elapsed = time.perf_counter() - t0
+        print(f"  {'match_user ' + name:22s} : {elapsed:8.2f}s  ({stats['matched']} liées, {stats['orphan']} orphelines)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Matching par paire vs matching vectorisé")
+    parser.add_argument("--templates", type=int, default=3000, help="Nombre de templates")
+    parser.add_argument("--instances", type=int, default=30000, help="Nombre d'instances PENDING")
+    parser.add_argument("--full", action="store_true", help="Mesure aussi match_user complet (écritures comprises)")
+
+    args = parser.parse_args()
+
+    template_titles, instance_titles = make_titles(args.templates, args.instances)
+    print(f"\n=== {args.templates} templates, {args.instances} instances ===")
+    bench_ranking(template_titles, instance_titles)
+    if args.full:
+        bench_full(template_titles, instance_titles)
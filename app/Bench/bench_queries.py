@@ -0,0 +1,195 @@
+"""
+    Benchmark des requêtes de InstancesRepository sur une grosse table task_instances.
+
+    La base est remplie avec N instances (1M par défaut) réparties sur plusieurs
+    utilisateurs et templates, puis chaque requête du repository est exécutée
+    plusieurs fois. Pour chacune on affiche le plan d'exécution (EXPLAIN de la
+    requête SQL réellement émise) et la latence p50 / p95.
+
+    Usage (depuis app/) :
+        python -m Bench.bench_queries --rows 1000000
+        python -m Bench.bench_queries --env test --skip-seed
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, select, func
+
+from Salva.models import User, TaskInstance, TaskTemplate, TaskOrigin, TaskStatus, MatchingStatus
+from Salva.Repository.Instances import InstancesRepository
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+DAYS = 3 * 365
+CALENDAR_TITLES = ["Réunion équipe", "Dentiste", "Appel client", "Déjeuner", "Revue de code", "Coiffeur"]
+
+
+def seed(engine, rows: int, users: int, templates_per_user: int, chunk: int = 20000) -> None:
+    """Remplit la base : un tiers d'instances issues du calendrier, le reste des templates."""
+    rng = random.Random(42)
+
+    with Session(engine) as session:
+        for u in range(users):
+            session.add(User(email=f"bench{u}@example.com"))
+        session.commit()
+        user_ids = [u.id for u in session.exec(select(User)).all()]
+
+        for user_id in user_ids:
+            for t in range(templates_per_user):
+                session.add(TaskTemplate(user_id=user_id, title=f"Habitude {t}", normalized_title=f"habitude {t}"))
+        session.commit()
+        templates = {}
+        for template in session.exec(select(TaskTemplate)).all():
+            templates.setdefault(template.user_id, []).append(template.id)
+
+        repo = InstancesRepository(session)
+        batch = []
+        for i in range(rows):
+            user_id = user_ids[i % len(user_ids)]
+            start = START + timedelta(minutes=rng.randrange(DAYS * 24 * 4) * 15)
+            row = {
+                "user_id": user_id,
+                "scheduled_start": start,
+                "scheduled_end": start + timedelta(hours=1),
+                "status": rng.choices(
+                    [TaskStatus.COMPLETED, TaskStatus.SCHEDULED, TaskStatus.CANCELLED], [70, 20, 10]
+                )[0],
+            }
+            if i % 3 == 0:
+                row.update(
+                    title=rng.choice(CALENDAR_TITLES),
+                    origin=TaskOrigin.CALENDAR,
+                    calendar_event_id=f"bench-{i:08d}",
+                    calendar_name="Travail",
+                    matching_status=rng.choices(
+                        [MatchingStatus.PENDING, MatchingStatus.ORPHAN, MatchingStatus.MATCHED], [5, 5, 90]
+                    )[0],
+                )
+            else:
+                template_id = rng.choice(templates[user_id])
+                row.update(title=f"Habitude {template_id % templates_per_user}", template_id=template_id)
+            batch.append(row)
+
+            if len(batch) >= chunk:
+                repo.create_instances(batch)
+                batch = []
+                print(f"  {i + 1} instances insérées", end="\r")
+
+        repo.create_instances(batch)
+        print(f"  {rows} instances insérées")
+
+
+def build_cases(session: Session) -> list:
+    """Une entrée par requête du repository : (nom, appel)."""
+    repo = InstancesRepository(session)
+    user_id = session.exec(select(User.id).order_by(User.id)).first()
+    template_id = session.exec(select(TaskTemplate.id).where(TaskTemplate.user_id == user_id)).first()
+    sample = session.exec(
+        select(TaskInstance)
+        .where(TaskInstance.user_id == user_id)
+        .where(TaskInstance.calendar_event_id.is_not(None))
+        .limit(1)
+    ).first()
+    template_ids = session.exec(select(TaskTemplate.id).where(TaskTemplate.user_id == user_id)).all()
+    uids = session.exec(
+        select(TaskInstance.calendar_event_id)
+        .where(TaskInstance.user_id == user_id)
+        .where(TaskInstance.calendar_event_id.is_not(None))
+        .limit(500)
+    ).all()
+    week_start = START + timedelta(days=400)
+    week_end = week_start + timedelta(days=7)
+
+    return [
+        ("get_instance", lambda: repo.get_instance(sample.id)),
+        ("get_instance_by_calendar_event", lambda: repo.get_instance_by_calendar_event(sample.calendar_event_id)),
+        ("get_user_instances (semaine)", lambda: repo.get_user_instances(user_id, start=week_start, end=week_end)),
+        ("get_user_instances (semaine, statut)", lambda: repo.get_user_instances(user_id, start=week_start, end=week_end, status=TaskStatus.SCHEDULED)),
+        ("get_user_instances_active (semaine)", lambda: repo.get_user_instances_active(user_id, start=week_start, end=week_end)),
+        ("get_pending_instances", lambda: repo.get_pending_instances(user_id)),
+        ("get_orphan_instances", lambda: repo.get_orphan_instances(user_id)),
+        ("get_last_instance_by_template", lambda: repo.get_last_instance_by_template(template_id)),
+        ("get_last_instance_start", lambda: repo.get_last_instance_start(template_id)),
+        ("get_last_instance_starts", lambda: repo.get_last_instance_starts(template_ids)),
+        ("get_calendar_snapshots (500 uids)", lambda: repo.get_calendar_snapshots(user_id, uids)),
+        ("iter_instance_refs (semaine)", lambda: list(repo.iter_instance_refs(user_id, start=week_start, end=week_end))),
+        ("find_duplicate", lambda: repo.find_duplicate(user_id, sample.title, sample.scheduled_start)),
+        ("find_duplicates (semaine)", lambda: repo.find_duplicates(user_id, [(f"Habitude {d}", week_start + timedelta(days=d)) for d in range(7)])),
+    ]
+
+
+def explain(engine, statement: str, parameters) -> list[str]:
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        result = conn.exec_driver_sql(prefix + statement, parameters)
+        return [" | ".join(str(v) for v in row) for row in result]
+
+
+def run_cases(engine, repeat: int) -> None:
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    with Session(engine) as session:
+        for name, call in build_cases(session):
+            session.expunge_all()
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            result = call()
+            event.remove(engine, "before_cursor_execute", capture)
+
+            timings = []
+            for _ in range(repeat):
+                session.expunge_all()
+                t0 = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - t0) * 1000)
+
+            size = len(result) if isinstance(result, (list, set, dict)) else int(result is not None)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"\n=== {name} ===")
+            print(f"  {size} ligne(s)   p50 = {statistics.median(timings):.2f} ms   p95 = {p95:.2f} ms")
+            if captured:
+                statement, parameters = captured[-1]
+                for line in explain(engine, statement, parameters):
+                    print(f"    {line}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plans d'exécution et latences des requêtes de InstancesRepository")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Nombre d'instances à générer")
+    parser.add_argument("--users", type=int, default=10, help="Nombre d'utilisateurs")
+    parser.add_argument("--templates", type=int, default=20, help="Nombre de templates par utilisateur")
+    parser.add_argument("--repeat", type=int, default=20, help="Nombre d'exécutions par requête")
+    parser.add_argument("--url", default=None, help="URL SQLAlchemy (défaut : fichier SQLite temporaire)")
+    parser.add_argument("--env", default=None, help="Utiliser la base d'un environnement de Salva.database (test/prod)")
+    parser.add_argument("--skip-seed", action="store_true", help="Réutiliser les données déjà présentes")
+
+    args = parser.parse_args()
+
+    if args.env:
+        from Salva.database import get_engine
+        engine = get_engine(args.env)
+    else:
+        url = args.url or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'salva_bench_queries.db')}"
+        engine = create_engine(url)
+
+    if not args.skip_seed:
+        SQLModel.metadata.drop_all(engine)
+        SQLModel.metadata.create_all(engine)
+        t0 = time.perf_counter()
+        seed(engine, args.rows, args.users, args.templates)
+        print(f"Remplissage : {time.perf_counter() - t0:.1f}s")
+
+    with Session(engine) as session:
+        total = session.exec(select(func.count()).select_from(TaskInstance)).one()
+    print(f"{total} instances en base ({engine.dialect.name})")
+
+    run_cases(engine, args.repeat)
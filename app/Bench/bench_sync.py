@@ -0,0 +1,120 @@
+"""
+    Benchmark de bout en bout de CalendarSync.sync, sans compte iCloud.
+
+    Un serveur CalDAVStub local est rempli avec N events, puis la synchronisation
+    est lancée deux fois sur une base vide :
+        - cold : tous les events sont importés
+        - warm : rien n'a changé, seule la comparaison est faite
+
+    Usage (depuis app/) :
+        python -m Bench.bench_sync --events 1000 10000 --latency 0.02
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import logging
+import time
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select, func
+
+from Bench.CalDAVStub import CalDAVStub
+from Salva import Instrumentation
+from Salva.Calendars import Calendars
+from Salva.CalendarSync import CalendarSync
+from Salva.models import User, TaskInstance
+
+CALENDAR_NAME = "Travail"
+
+
+def make_events(count: int, start: datetime, days: int) -> list[dict]:
+    """Répartit `count` events d'une heure sur `days` jours."""
+    step = timedelta(days=days) / count
+    events = []
+    for i in range(count):
+        event_start = start + step * i
+        events.append({
+            "uid": f"bench-{i:06d}",
+            "summary": f"Tâche benchmark {i % 50}",
+            "start": event_start,
+            "end": event_start + timedelta(hours=1),
+            "description": f"Event {i}",
+            "location": "Bureau" if i % 3 == 0 else None,
+        })
+    return events
+
+
+def make_engine(db_url: str):
+    if db_url in ("sqlite://", "sqlite:///:memory:"):
+        return create_engine(db_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    return create_engine(db_url)
+
+
+def run_case(count: int, opt, engine=None) -> dict:
+    """Sync cold puis warm de `count` events. Sans `engine`, la base est opt.db_url."""
+    start = datetime(2026, 1, 5, 8, 0, tzinfo=timezone.utc)
+    end = start + timedelta(days=opt.days)
+
+    owns_engine = engine is None
+    if owns_engine:
+        engine = make_engine(opt.db_url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+
+    with CalDAVStub([CALENDAR_NAME], latency=opt.latency) as stub:
+        stub.seed(CALENDAR_NAME, make_events(count, start, opt.days))
+
+        with Session(engine) as session:
+            user = User(email="bench@example.com")
+            session.add(user)
+            session.commit()
+            user_id = user.id
+
+            cal = Calendars(url=stub.url, username="bench", password="bench")
+            sync = CalendarSync(session, cal)
+
+            timings = {}
+            requests = {}
+            for phase in ("cold", "warm"):
+                stub.reset_counts()
+                t0 = time.perf_counter()
+                with Instrumentation.operation(f"sync {phase}"):
+                    sync.sync(user_id, CALENDAR_NAME, start, end)
+                timings[phase] = time.perf_counter() - t0
+                requests[phase] = dict(stub.request_counts)
+
+            rows = session.exec(select(func.count()).select_from(TaskInstance)).one()
+
+    if owns_engine:
+        engine.dispose()
+    return {"events": count, "rows": rows, "timings": timings, "requests": requests}
+
+
+def print_result(result: dict) -> None:
+    print(f"\n=== {result['events']} events ({result['rows']} instances en base) ===")
+    for phase, elapsed in result["timings"].items():
+        rate = result["events"] / elapsed if elapsed else float("inf")
+        reqs = result["requests"][phase]
+        total = sum(reqs.values())
+        detail = ", ".join(f"{k}={v}" for k, v in sorted(reqs.items()))
+        print(f"  {phase:5s} : {elapsed:8.2f}s  {rate:9.1f} events/s  {total} requêtes ({detail})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de CalendarSync.sync contre un serveur CalDAV local")
+    parser.add_argument("--events", type=int, nargs="+", default=[1000, 10000], help="Nombre d'events à générer (un cas par valeur)")
+    parser.add_argument("--days", type=int, default=90, help="Période couverte par les events")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence ajoutée à chaque requête CalDAV (secondes)")
+    parser.add_argument("--db-url", default="sqlite://", help="URL SQLAlchemy de la base utilisée (défaut : SQLite en mémoire)")
+    parser.add_argument("--verbose", action="store_true", help="Afficher les logs de synchronisation")
+    parser.add_argument("--profile-sql", action="store_true", help="Afficher les requêtes SQL par phase et les N+1")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if args.profile_sql:
+        Instrumentation.enable()
+
+    for count in args.events:
+        print_result(run_case(count, args))
+        if args.profile_sql:
+            print(Instrumentation.format_summary())
+            Instrumentation.reset()
@@ -25,6 +25,9 @@ class CalendarSync:
         self.InstancesRepo = InstancesRepository(session)
         self.cal = calendars
 
+    # Nombre d'events comparés puis écrits par requête
+    IMPORT_BATCH_SIZE = 500
+
     ICAL_TO_DB_FIELDS = {
         "summary": "title",
         "start": "scheduled_start",
@@ -47,60 +50,95 @@ class CalendarSync:
         calendar_name: str,
         start_date: datetime,
         end_date: datetime,
-    ) -> List[TaskInstance]:
-        """Importe les events iCloud absents en base comme instances PENDING."""
+    ) -> List[str]:
+        """Importe les events iCloud absents en base comme instances PENDING.
 
-        raw_events = self.cal.get_apple_calendar_events(calendar_name, start_date, end_date)
-        if not raw_events:
-            logger.info(f"Aucun event dans '{calendar_name}' pour cette période.")
-            return []
+        Returns:
+            Les UID des events importés.
+        """
 
         created = []
-        updated = []
+        seen = 0
+        buffer = {}
+
+        # Tout l'import est écrit en un seul commit
+        with self.InstancesRepo.batch():
+            # Les events arrivent fenêtre par fenêtre : rien n'est gardé en mémoire au-delà d'un paquet
+            for raw_event in self.cal.iter_calendar_events(calendar_name, start_date, end_date):
+                seen += 1
+                parsed = self._parse_ical_event(raw_event)
+                if not parsed:
+                    continue
+
+                # Un même UID vu deux fois dans le paquet : la première occurrence suffit
+                buffer.setdefault(parsed["uid"], parsed)
+                if len(buffer) >= self.IMPORT_BATCH_SIZE:
+                    created += self._import_chunk(user_id, calendar_name, buffer)
+                    buffer = {}
+
+            created += self._import_chunk(user_id, calendar_name, buffer)
+
+        if not seen:
+            logger.info(f"Aucun event dans '{calendar_name}' pour cette période.")
 
-        for raw_event in raw_events:
-            parsed = self._parse_ical_event(raw_event)
-            if not parsed:
-                continue
+        logger.info(f"{len(created)} events importés depuis '{calendar_name}'.")
+        return created
+    
+    def _import_chunk(self, user_id: int, calendar_name: str, parsed_by_uid: dict) -> List[str]:
+        """Compare un paquet d'events à la base (une requête) puis écrit les
+        events nouveaux ou modifiés en un seul upsert.
 
-            uid = parsed["uid"]
-            existant = self.InstancesRepo.get_instance_by_calendar_event(uid)
+        Les instances créées par les paquets précédents sont déjà écrites dans
+        la transaction : un event revu dans une autre fenêtre est simplement comparé.
+
+        Returns:
+            Les UID des events créés.
+        """
+        if not parsed_by_uid:
+            return []
+
+        snapshots = self.InstancesRepo.get_calendar_snapshots(user_id, list(parsed_by_uid))
+
+        rows = []
+        created = []
+        for uid, parsed in parsed_by_uid.items():
+            existant = snapshots.get(uid)
             if existant:
-                changes = self._diff(existant, parsed)
-                if changes:
-                    self.InstancesRepo.update_instance(existant.calendar_event_id, **changes)
-                    logger.info(f"Mis à jour : '{parsed['summary']}' → instance #{existant.id}")
-                    updated.append(existant)
+                if not self._diff(existant, parsed):
+                    continue
+                logger.info(f"Mis à jour : '{parsed['summary']}' → instance #{existant.id}")
             else:
-                instance = self._create_from_parsed(user_id, calendar_name, parsed)
-                logger.info(f"Importé : '{parsed['summary']}' → instance #{instance.id}")
-                created.append(instance)
+                logger.info(f"Importé : '{parsed['summary']}' (uid={uid})")
+                created.append(uid)
+            rows.append(self._row_from_parsed(user_id, calendar_name, parsed))
 
-        logger.info(f"{len(created)} events importés depuis '{calendar_name}'.")
+        # Un autre worker qui importe le même event entre-temps ne provoque pas
+        # d'erreur d'unicité : la ligne est mise à jour
+        self.InstancesRepo.upsert_calendar_instances(rows)
         return created
-    
-    def _create_from_parsed(self, user_id: int, calendar_name: str, parsed: dict) -> TaskInstance:
-        """Crée une instance à partir des données iCal parsées."""
+
+    def _row_from_parsed(self, user_id: int, calendar_name: str, parsed: dict) -> dict:
+        """Prépare une ligne d'instance à partir des données iCal parsées."""
         start = parsed["start"]
         end = parsed["end"]
-        return self.InstancesRepo.create_instance(
-            user_id=user_id,
-            title=parsed["summary"],
-            scheduled_start=start,
-            scheduled_end=end or start + timedelta(hours=1),
-            origin=TaskOrigin.CALENDAR,
-            calendar_event_id=parsed["uid"],
-            calendar_name=calendar_name,
-            description=parsed["description"],
-            location=parsed["location"],
-            location_lat=parsed["location_lat"],
-            location_lon=parsed["location_lon"],
-            url=parsed["url"],
-            alerts_minutes=parsed["alerts_minutes"],
-        )
+        return {
+            "user_id": user_id,
+            "title": parsed["summary"],
+            "scheduled_start": start,
+            "scheduled_end": end or start + timedelta(hours=1),
+            "origin": TaskOrigin.CALENDAR,
+            "calendar_event_id": parsed["uid"],
+            "calendar_name": calendar_name,
+            "description": parsed["description"],
+            "location": parsed["location"],
+            "location_lat": parsed["location_lat"],
+            "location_lon": parsed["location_lon"],
+            "url": parsed["url"],
+            "alerts_minutes": parsed["alerts_minutes"],
+        }
     
-    def _diff(self, instance: TaskInstance, parsed: dict) -> dict:
-        """Compare une instance DB avec les données iCal parsées.
+    def _diff(self, instance, parsed: dict) -> dict:
+        """Compare une instance DB (entité ou InstanceSnapshot) avec les données iCal parsées.
 
         Returns:
             dict des champs DB à mettre à jour (vide si rien n'a changé)
@@ -120,7 +158,7 @@ class CalendarSync:
 
         # Si le titre change, recalculer le normalized_title
         if "title" in changes:
-            from models import normalize_title
+            from Salva.models import normalize_title
             changes["normalized_title"] = normalize_title(changes["title"])
 
         return changes
@@ -134,7 +172,12 @@ class CalendarSync:
             return False
 
         # Comparer les datetimes en ignorant les microsecondes
+        # (la base rend des dates naïves, stockées en UTC)
         if isinstance(current, datetime) and isinstance(new, datetime):
+            if current.tzinfo is None:
+                current = current.replace(tzinfo=timezone.utc)
+            if new.tzinfo is None:
+                new = new.replace(tzinfo=timezone.utc)
             return current.replace(microsecond=0) == new.replace(microsecond=0)
 
         # Comparer les floats avec tolérance (coordonnées GPS)
@@ -241,14 +284,12 @@ class CalendarSync:
         self.check_instances_in_icloud(user_id, calendar_name, start_date, end_date)
 
         # 2. Push — seulement les instances créées par le système, pas encore dans iCloud
-        all_instances = self.InstancesRepo.get_user_instances(
+        to_push = self.InstancesRepo.iter_instances_to_push(
             user_id, start=start_date, end=end_date
         )
-        to_push = [
-            inst for inst in all_instances
-            if inst.calendar_event_id is None and inst.origin != TaskOrigin.CALENDAR
-        ]
 
+        # Pas de batch ici : chaque event créé dans iCloud doit être enregistré
+        # en base aussitôt, sinon un échec en cours de route créerait des doublons
         pushed = []
         for instance in to_push:
             if self.push_instance(
@@ -274,17 +315,35 @@ class CalendarSync:
 
         Si un event iCloud a été supprimé manuellement, l'instance correspondante est annulée en base.
         """
-        instances = self.InstancesRepo.get_user_instances(
-            user_id, start=start_date, end=end_date, status=TaskStatus.SCHEDULED
-        )
-        for inst in instances:
-            if inst.calendar_event_id and inst.calendar_name:
-                exists = self.cal.check_event_exists(inst.calendar_name, inst.calendar_event_id, start_date, end_date)
+        # Transaction de lecture close en sortie de bloc : la connexion retourne au pool
+        with self.InstancesRepo.batch():
+            instances = [
+                inst for inst in self.InstancesRepo.iter_instance_refs(
+                    user_id, start=start_date, end=end_date, status=TaskStatus.SCHEDULED
+                )
+                if inst.calendar_event_id and inst.calendar_name
+            ]
+
+        # Une seule lecture de la période par calendrier, au lieu d'une recherche par instance,
+        # hors transaction : aucune connexion n'est gardée pendant les appels CalDAV
+        remote_uids = {
+            calendar_name: self.cal.get_event_uids(calendar_name, start_date, end_date)
+            for calendar_name in dict.fromkeys(inst.calendar_name for inst in instances)
+        }
+
+        with self.InstancesRepo.batch():
+            for inst in instances:
+                uids = remote_uids[inst.calendar_name]
+                if uids is None:
+                    # Calendrier introuvable : ne rien annuler
+                    continue
+
+                exists = inst.calendar_event_id in uids
                 if not exists:
                     self.InstancesRepo.cancel_instance(inst.id)
-                    print(f"Instance #{inst.id} annulée car event iCloud (uid={inst.calendar_event_id}) introuvable.")
+                    logger.info(f"Instance #{inst.id} annulée car event iCloud (uid={inst.calendar_event_id}) introuvable.")
                 else :
-                    print(f"Instance #{inst.id} exist toujours dans iCloud.")
+                    logger.debug(f"Instance #{inst.id} exist toujours dans iCloud.")
 
     # ============================================
     # PARSING iCal
@@ -5,13 +5,31 @@ import uuid
 from caldav import DAVClient
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
-from typing import Optional, List
+from typing import Callable, Optional, List, Iterator, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 load_dotenv()
 
 ICLOUD_URL = os.getenv("ICLOUD_URL")
 ICLOUD_USERNAME = os.getenv("ICLOUD_USERNAME")
 ICLOUD_APP_PASSWORD = os.getenv("ICLOUD_PW")
 
+# Découpage des recherches CalDAV : iCloud ralentit (et tronque parfois) sur de longues périodes
+SEARCH_WINDOW_DAYS = int(os.getenv("CALDAV_WINDOW_DAYS", 7))
+SEARCH_MAX_WORKERS = int(os.getenv("CALDAV_MAX_WORKERS", 4))
+
+def parse_urls_before_sharing(calendar) -> None:
+    """Force l'analyse des URL du calendrier et de son client.
+
+    caldav analyse une URL à sa première lecture, sans verrou : deux recherches
+    lancées en même temps sur le même calendrier peuvent lire une URL à moitié
+    initialisée (AttributeError). On la déclenche donc une fois, avant de
+    partager le calendrier entre les threads de recherche.
+    """
+    for url in (calendar.url, calendar.client.url):
+        getattr(url, "path")
+
+
 class EventNew() :
     def __init__(self, uid, summary, start, end):
         self.uid = uid
@@ -44,7 +62,23 @@ class Calendars() :
 
     tasks = []
 
-    def __init__(self):
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        timeout: Optional[float] = None,
+        check_budget: Optional[Callable[[], None]] = None,
+    ):
+        # Identifiants propres à l'utilisateur, sinon ceux du .env
+        self.url = url or ICLOUD_URL
+        self.username = username or ICLOUD_USERNAME
+        self.password = password or ICLOUD_APP_PASSWORD
+        # Délai de chaque requête CalDAV (secondes)
+        self.timeout = timeout
+        # Appelé avant chaque fenêtre de recherche ; lève une exception pour interrompre
+        self.check_budget = check_budget
+
         self.client = self.get_caldav_client()
 
         self.principal = self.client.principal()
@@ -52,9 +86,10 @@ class Calendars() :
 
     def get_caldav_client(self):
         return DAVClient(
-            url=ICLOUD_URL,
-            username=ICLOUD_USERNAME,
-            password=ICLOUD_APP_PASSWORD
+            url=self.url,
+            username=self.username,
+            password=self.password,
+            timeout=self.timeout,
         )
 
     def discover_caldav_calendars(self):
@@ -66,7 +101,7 @@ class Calendars() :
             else:
                 print("No calendars found.")
             
-            return ICLOUD_URL
+            return self.url
     
         except caldav.lib.error.AuthorizationError as e:
             print(f"Authorization failed: {e}")
@@ -89,16 +124,101 @@ class Calendars() :
                         end=component.get("DTEND").dt if component.get("DTEND") else None
                     ))
 
+    def get_calendar(self, calendar_name):
+        return next((cal for cal in self.calendars if cal.name == calendar_name), None)
+
     def get_apple_calendar_events(self, calendar_name, start_date, end_date):        
-        calendar = next((cal for cal in self.calendars if cal.name == calendar_name), None)
-        
-        if calendar:
-            events = calendar.search(start=start_date, end=end_date)
-            return events
-        else:
+        if not self.get_calendar(calendar_name):
             print(f"Calendar '{calendar_name}' not found.")
             return None
 
+        return list(self.iter_calendar_events(calendar_name, start_date, end_date))
+
+    @staticmethod
+    def split_range(start_date, end_date, window_days: int) -> List[Tuple[datetime, datetime]]:
+        """Découpe [start_date, end_date[ en fenêtres de `window_days` jours."""
+        window = timedelta(days=window_days)
+        windows = []
+        cursor = start_date
+        while cursor < end_date:
+            windows.append((cursor, min(cursor + window, end_date)))
+            cursor += window
+        return windows
+
+    def iter_calendar_events(
+        self,
+        calendar_name,
+        start_date,
+        end_date,
+        window_days: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ) -> Iterator:
+        """Récupère les events par fenêtres, en parallèle, et les restitue au fil de l'eau.
+
+        Les fenêtres sont rendues dans l'ordre chronologique. Au plus `max_workers`
+        réponses sont gardées en mémoire en même temps, et les events à cheval sur
+        deux fenêtres ne sont rendus qu'une fois.
+
+        `check_budget` est appelé avant chaque fenêtre : s'il lève, les recherches
+        pas encore parties sont annulées et seules celles en cours sont attendues
+        (au plus `timeout` secondes chacune).
+        """
+        calendar = self.get_calendar(calendar_name)
+        if not calendar:
+            print(f"Calendar '{calendar_name}' not found.")
+            return
+
+        parse_urls_before_sharing(calendar)
+
+        windows = iter(self.split_range(start_date, end_date, window_days or SEARCH_WINDOW_DAYS))
+        max_workers = max_workers or SEARCH_MAX_WORKERS
+        seen = set()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = deque()
+
+            def submit_next():
+                window = next(windows, None)
+                if window:
+                    in_flight.append(executor.submit(calendar.search, start=window[0], end=window[1]))
+
+            for _ in range(max_workers):
+                submit_next()
+
+            try:
+                while in_flight:
+                    if self.check_budget:
+                        self.check_budget()
+                    events = in_flight.popleft().result()
+                    submit_next()
+
+                    for event in events:
+                        key = str(event.url)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        yield event
+            finally:
+                # Interruption (budget, erreur, générateur fermé) : rien de plus à lancer
+                for future in in_flight:
+                    future.cancel()
+
+    def get_event_uids(self, calendar_name, start_date, end_date) -> Optional[set]:
+        """Retourne les UID des events de la période, ou None si le calendrier est introuvable."""
+        if not self.get_calendar(calendar_name):
+            print(f"Calendar '{calendar_name}' not found.")
+            return None
+
+        # Parsé comme au pull : une ligne UID longue est repliée (RFC 5545), une regex la tronquerait
+        uids = set()
+        for event in self.iter_calendar_events(calendar_name, start_date, end_date):
+            ics_data = event.data if hasattr(event, "data") else event._get_data()
+            for component in Calendar.from_ical(ics_data).walk("VEVENT"):
+                uid = component.get("UID")
+                if uid:
+                    uids.add(str(uid).strip())
+        return uids
+
     def update_event_in_calendar(self, calendar_name, event_uid, summary, start_time, end_time):
         # TODO
         pass
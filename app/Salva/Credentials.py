@@ -0,0 +1,40 @@
+import os
+
+from cryptography.fernet import Fernet, InvalidToken
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Clé Fernet (base64, 32 octets) ; générée avec `python -m Salva.Credentials`
+SALVA_SECRET_KEY = os.getenv("SALVA_SECRET_KEY")
+
+
+class CredentialsError(ValueError):
+    """Mot de passe iCloud impossible à chiffrer ou déchiffrer (clé absente, invalide ou différente)."""
+
+
+def _fernet(key: str = None) -> Fernet:
+    key = key or SALVA_SECRET_KEY
+    if not key:
+        raise CredentialsError("SALVA_SECRET_KEY n'est pas définie : mots de passe iCloud indéchiffrables")
+    try:
+        return Fernet(key)
+    except ValueError as e:
+        raise CredentialsError(f"SALVA_SECRET_KEY invalide : {e}") from e
+
+
+def encrypt_password(password: str, key: str = None) -> str:
+    """Chiffre un mot de passe pour User.icloud_encrypted_password."""
+    return _fernet(key).encrypt(password.encode("utf-8")).decode("ascii")
+
+
+def decrypt_password(token: str, key: str = None) -> str:
+    """Déchiffre User.icloud_encrypted_password."""
+    try:
+        return _fernet(key).decrypt(token.encode("ascii")).decode("utf-8")
+    except (InvalidToken, UnicodeError) as e:
+        raise CredentialsError("mot de passe iCloud chiffré avec une autre clé, ou corrompu") from e
+
+
+if __name__ == "__main__":
+    print(Fernet.generate_key().decode("ascii"))
@@ -0,0 +1,307 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Une même requête exécutée au moins autant de fois dans une opération est signalée (N+1)
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 20))
+
+NO_OPERATION = "(hors opération)"
+NO_METHOD = "(hors repository)"
+
+# Opération et méthode de repository en cours, propres à chaque thread
+_operation = ContextVar("sql_operation", default=None)
+_method = ContextVar("sql_method", default=None)
+
+_PLACEHOLDERS = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_IN_LIST = re.compile(rf"\(\s*{_PLACEHOLDERS}(?:\s*,\s*{_PLACEHOLDERS})+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Forme d'une requête : listes de paramètres regroupées, espaces normalisés.
+
+    "... WHERE id IN (?, ?, ?)" et "... WHERE id IN (?, ?)" ont la même forme.
+    """
+    return _SPACES.sub(" ", _IN_LIST.sub("(?)", statement)).strip()
+
+
+def _bucket() -> dict:
+    return {"calls": 0, "statements": 0, "round_trips": 0, "commits": 0, "sql_ms": 0.0, "elapsed_ms": 0.0}
+
+
+# ============================================
+# COLLECTE
+# ============================================
+
+class _OperationRun:
+    """Une exécution d'opération : compte les requêtes par (forme, méthode)."""
+
+    __slots__ = ("name", "shapes")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.shapes = Counter()
+
+
+class SQLStats:
+    """Agrégats partagés par tous les threads du process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.operations = defaultdict(_bucket)
+            self.methods = defaultdict(_bucket)
+            # (opération, méthode, forme) → {"count": max par exécution, "runs": exécutions concernées}
+            self.suspects = {}
+
+    def record_statement(self, run: Optional[_OperationRun], method: Optional[str], shape: str, seconds: float, count: int) -> None:
+        operation = run.name if run else NO_OPERATION
+        method = method or NO_METHOD
+        with self._lock:
+            for bucket in (self.operations[operation], self.methods[method]):
+                bucket["statements"] += count
+                bucket["round_trips"] += 1
+                bucket["sql_ms"] += seconds * 1000
+        if run is not None:
+            # Un seul thread par exécution d'opération : pas besoin du verrou
+            run.shapes[(shape, method)] += 1
+
+    def record_commit(self, run: Optional[_OperationRun], method: Optional[str]) -> None:
+        with self._lock:
+            self.operations[run.name if run else NO_OPERATION]["commits"] += 1
+            self.methods[method or NO_METHOD]["commits"] += 1
+
+    def record_call(self, table: str, name: str, seconds: float) -> None:
+        with self._lock:
+            bucket = getattr(self, table)[name]
+            bucket["calls"] += 1
+            bucket["elapsed_ms"] += seconds * 1000
+
+    def finish_run(self, run: _OperationRun) -> None:
+        repeated = [(key, count) for key, count in run.shapes.items() if count >= N_PLUS_ONE_THRESHOLD]
+        if not repeated:
+            return
+        with self._lock:
+            for (shape, method), count in repeated:
+                suspect = self.suspects.setdefault((run.name, method, shape), {"count": 0, "runs": 0})
+                suspect["count"] = max(suspect["count"], count)
+                suspect["runs"] += 1
+
+
+STATS = SQLStats()
+_sinks: List[Callable[[dict], None]] = []
+_enabled = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Sur le contexte d'exécution (propre à la requête) : une requête en échec,
+    # sans after_cursor_execute, ne laisse rien derrière elle
+    context._salva_sql_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._salva_sql_started
+    count = len(parameters) if executemany and parameters else 1
+    STATS.record_statement(_operation.get(), _method.get(), statement_shape(statement), time.perf_counter() - started, count)
+
+
+def _commit(conn):
+    STATS.record_commit(_operation.get(), _method.get())
+
+
+def enable() -> None:
+    """Active la collecte sur tous les moteurs SQLAlchemy du process."""
+    global _enabled
+    if _enabled:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "commit", _commit)
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    if not _enabled:
+        return
+    event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.remove(Engine, "commit", _commit)
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+# ============================================
+# PORTÉES : opérations et méthodes de repository
+# ============================================
+
+@contextmanager
+def operation(name: str):
+    """Regroupe les requêtes d'une opération de haut niveau (sync, planification...).
+
+    Les opérations imbriquées sont comptées séparément ; la détection N+1 se
+    fait par exécution d'opération.
+    """
+    if not _enabled:
+        yield
+        return
+
+    run = _OperationRun(name)
+    token = _operation.set(run)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+        STATS.record_call("operations", name, time.perf_counter() - started)
+        STATS.finish_run(run)
+
+
+def instrumented(name: str, fn: Callable) -> Callable:
+    """Attribue à `name` les requêtes émises par `fn` (voir UnitOfWork.__init_subclass__).
+
+    Pour un générateur, la méthode n'est active que pendant le calcul de chaque
+    élément : le code de l'appelant entre deux éléments ne lui est pas attribué.
+    """
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            if not _enabled:
+                yield from fn(*args, **kwargs)
+                return
+
+            generator = fn(*args, **kwargs)
+            elapsed = 0.0
+            try:
+                while True:
+                    token = _method.set(name)
+                    step = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - step
+                        _method.reset(token)
+                    yield item
+            finally:
+                generator.close()
+                STATS.record_call("methods", name, elapsed)
+
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+
+        token = _method.set(name)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _method.reset(token)
+            STATS.record_call("methods", name, time.perf_counter() - started)
+
+    return wrapper
+
+
+# ============================================
+# RÉSUMÉ ET SINKS
+# ============================================
+
+def reset() -> None:
+    STATS.reset()
+
+
+def summary() -> dict:
+    """Instantané des compteurs.
+
+    Returns:
+        {"at": "...", "operations": {"sync": {"calls": 2, "statements": 310, ...}},
+         "methods": {"InstancesRepository.get_instance": {...}},
+         "n_plus_one": [{"operation": "sync", "method": "...", "statement": "SELECT ...",
+                         "count": 120, "runs": 3}]}
+        Pour un N+1, "count" est le maximum observé sur une exécution de l'opération.
+    """
+    with STATS._lock:
+        return {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "operations": {name: dict(bucket) for name, bucket in STATS.operations.items()},
+            "methods": {name: dict(bucket) for name, bucket in STATS.methods.items()},
+            "n_plus_one": [
+                {"operation": operation, "method": method, "statement": shape, **suspect}
+                for (operation, method, shape), suspect in STATS.suspects.items()
+            ],
+        }
+
+
+def format_summary(data: Optional[dict] = None) -> str:
+    data = data or summary()
+    lines = []
+
+    for title, table in (("Opérations", data["operations"]), ("Méthodes", data["methods"])):
+        lines.append(f"{title} :")
+        lines.append(f"  {'nom':48s} {'appels':>7s} {'requêtes':>9s} {'allers':>7s} {'commits':>8s} {'SQL ms':>9s} {'total ms':>9s}")
+        for name, b in sorted(table.items(), key=lambda item: -item[1]["sql_ms"]):
+            lines.append(
+                f"  {name[:48]:48s} {b['calls']:7d} {b['statements']:9d} {b['round_trips']:7d}"
+                f" {b['commits']:8d} {b['sql_ms']:9.1f} {b['elapsed_ms']:9.1f}"
+            )
+
+    if data["n_plus_one"]:
+        lines.append(f"N+1 suspects (≥ {N_PLUS_ONE_THRESHOLD} exécutions de la même requête dans une opération) :")
+        for suspect in sorted(data["n_plus_one"], key=lambda s: -s["count"]):
+            lines.append(f"  {suspect['count']:6d}x  {suspect['operation']} / {suspect['method']} ({suspect['runs']} exécution(s))")
+            lines.append(f"           {suspect['statement'][:160]}")
+
+    return "\n".join(lines)
+
+
+def add_sink(sink: Callable[[dict], None]) -> None:
+    """Enregistre une fonction appelée avec le résumé à chaque emit()."""
+    _sinks.append(sink)
+
+
+def emit() -> dict:
+    """Journalise le résumé et l'envoie aux sinks enregistrés."""
+    data = summary()
+    logger.info("Requêtes SQL :\n" + format_summary(data))
+    for sink in _sinks:
+        try:
+            sink(data)
+        except Exception as e:
+            logger.error(f"Échec de l'envoi des métriques SQL : {e}")
+    return data
+
+
+class JsonLinesSink:
+    """Ajoute chaque résumé comme une ligne JSON dans un fichier."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, data: dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False) + "\n")
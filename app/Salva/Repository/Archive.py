@@ -0,0 +1,152 @@
+from typing import Optional, List, Tuple
+from datetime import datetime, timezone
+from sqlmodel import Session, select, col
+from sqlalchemy import func, insert, delete, literal, exists, text, DateTime
+from Salva.Repository.UnitOfWork import UnitOfWork
+
+from Salva.models import (
+    TaskInstance,
+    MatchAttempt,
+    ClusterInstance,
+    MatchingStatus,
+    TaskInstanceArchive,
+    MatchAttemptArchive,
+)
+
+
+def now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+class ArchiveRepository(UnitOfWork):
+    """Déplace les lignes anciennes de task_instances / match_attempts vers leurs tables d'archive.
+
+    Chaque déplacement est un INSERT ... SELECT suivi d'un DELETE sur une liste
+    d'id : les lignes ne sont jamais chargées en objets ORM.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    # ============================================
+    # SÉLECTION
+    # ============================================
+
+    def _archivable_instances(self, cutoff: datetime):
+        """Instances antérieures à `cutoff` qui peuvent quitter la table chaude.
+
+        Restent en place :
+            - les instances PENDING, que le matching n'a pas encore traitées
+            - les instances liées à un cluster (cluster_instances pointe dessus)
+        """
+        linked = exists().where(ClusterInstance.instance_id == TaskInstance.id)
+        return (
+            select(TaskInstance.id)
+            .where(TaskInstance.scheduled_start < cutoff)
+            .where(TaskInstance.matching_status != MatchingStatus.PENDING)
+            .where(~linked)
+        )
+
+    def get_archivable_instance_ids(self, cutoff: datetime, limit: int) -> List[int]:
+        statement = self._archivable_instances(cutoff).order_by(TaskInstance.id).limit(limit)
+        return list(self.session.exec(statement).all())
+
+    def get_old_match_attempt_ids(self, cutoff: datetime, limit: int) -> List[int]:
+        """Tentatives de matching antérieures à `cutoff`, quelle que soit leur instance."""
+        statement = (
+            select(MatchAttempt.id)
+            .where(MatchAttempt.created_at < cutoff)
+            .order_by(MatchAttempt.id)
+            .limit(limit)
+        )
+        return list(self.session.exec(statement).all())
+
+    # ============================================
+    # DÉPLACEMENT
+    # ============================================
+
+    def archive_instances(self, instance_ids: List[int]) -> Tuple[int, int]:
+        """Archive des instances et leurs tentatives de matching, en une transaction.
+
+        Les tentatives sont copiées avant la suppression des instances : le
+        ON DELETE CASCADE de match_attempts les effacerait sinon sans copie.
+
+        Returns:
+            (instances archivées, tentatives archivées)
+        """
+        if not instance_ids:
+            return 0, 0
+
+        archived_at = now_utc()
+        with self.batch():
+            attempts = self._move(
+                MatchAttempt.__table__,
+                MatchAttemptArchive,
+                col(MatchAttempt.instance_id).in_(instance_ids),
+                archived_at,
+            )
+            instances = self._move(
+                TaskInstance.__table__,
+                TaskInstanceArchive,
+                col(TaskInstance.id).in_(instance_ids),
+                archived_at,
+            )
+        return instances, attempts
+
+    def archive_match_attempts(self, attempt_ids: List[int]) -> int:
+        """Archive des tentatives de matching seules (traces anciennes)."""
+        if not attempt_ids:
+            return 0
+
+        with self.batch():
+            return self._move(
+                MatchAttempt.__table__,
+                MatchAttemptArchive,
+                col(MatchAttempt.id).in_(attempt_ids),
+                now_utc(),
+            )
+
+    def _move(self, source, archive, condition, archived_at: datetime) -> int:
+        columns = [c.name for c in source.columns]
+        self.session.execute(
+            insert(archive).from_select(
+                columns + ["archived_at"],
+                select(*source.columns, literal(archived_at, DateTime(timezone=True))).where(condition),
+            )
+        )
+        result = self.session.execute(
+            delete(source).where(condition).execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    # ============================================
+    # RAPPORT (dry-run)
+    # ============================================
+
+    def count_archivable_instances(self, cutoff: datetime) -> int:
+        statement = select(func.count()).select_from(self._archivable_instances(cutoff).subquery())
+        return self.session.exec(statement).one()
+
+    def count_archivable_match_attempts(self, cutoff: datetime) -> int:
+        """Tentatives qui partiraient : anciennes, ou rattachées à une instance archivable."""
+        statement = select(func.count()).select_from(MatchAttempt).where(
+            (MatchAttempt.created_at < cutoff)
+            | col(MatchAttempt.instance_id).in_(self._archivable_instances(cutoff))
+        )
+        return self.session.exec(statement).one()
+
+    def count_rows(self, table) -> int:
+        return self.session.exec(select(func.count()).select_from(table)).one()
+
+    def get_avg_row_length(self, table_name: str) -> Optional[int]:
+        """Taille moyenne d'une ligne (octets) d'après MySQL, None sur les autres bases."""
+        if self.session.get_bind().dialect.name != "mysql":
+            return None
+
+        result = self.session.execute(
+            text(
+                "SELECT AVG_ROW_LENGTH FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"
+            ),
+            {"name": table_name},
+        ).first()
+        return result[0] if result else None
@@ -1,8 +1,17 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple, Set, Iterable, Iterator, Dict, NamedTuple
 from datetime import datetime, timezone
+from collections import Counter
+from itertools import islice
 from sqlmodel import Session, select, col
-from sqlalchemy import func
+from sqlalchemy import func, insert, update, or_, and_, bindparam, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from pydantic_core import PydanticUndefined
+from Salva.Repository.UnitOfWork import UnitOfWork
 from Salva.Repository.Templates import TemplatesRepository
+from Salva.Repository.Patterns import PatternsRepository
 
 from Salva.models import (
     TaskTemplate,
@@ -19,15 +28,80 @@ from Salva.models import (
 )
 
 
+# Index unique sur lequel s'appuient les upserts iCloud (voir models.TaskInstance)
+UPSERT_KEY_INDEX = "uq_instances_user_event"
+
+# Présence de UPSERT_KEY_INDEX, vérifiée une fois par moteur
+_upsert_key_checked: Dict[Engine, bool] = {}
+
+
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
-class InstancesRepository :
+
+def naive_utc(value: datetime) -> datetime:
+    """Date en UTC sans fuseau, comme la base la renvoie."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def chunked(rows: Iterable, size: int) -> Iterator[list]:
+    """Regroupe un itérateur en listes de `size` éléments, lues au fur et à mesure."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class InstanceRef(NamedTuple):
+    """Vue légère d'une instance pour la synchronisation (sans objet ORM)."""
+    id: int
+    calendar_event_id: Optional[str]
+    calendar_name: Optional[str]
+    scheduled_start: datetime
+    updated_at: Optional[datetime]
+
+
+class InstanceSnapshot(NamedTuple):
+    """Champs comparés à iCloud lors d'un pull (voir CalendarSync.ICAL_TO_DB_FIELDS)."""
+    id: int
+    calendar_event_id: str
+    title: str
+    scheduled_start: datetime
+    scheduled_end: datetime
+    description: Optional[str]
+    location: Optional[str]
+    location_lat: Optional[float]
+    location_lon: Optional[float]
+    url: Optional[str]
+    alerts_minutes: Optional[List[int]]
+    updated_at: Optional[datetime]
+
+
+class InstanceTitle(NamedTuple):
+    """Ce dont le matching a besoin d'une instance."""
+    id: int
+    title: str
+    normalized_title: Optional[str]
+    scheduled_start: datetime
+
+
+def _columns(record) -> list:
+    return [getattr(TaskInstance, name) for name in record._fields]
+
+
+class InstancesRepository(UnitOfWork):
+
+    # Taille des pages pour les lectures en flux (iter_*)
+    STREAM_BATCH_SIZE = 500
 
     def __init__(self, session: Session):
         self.session = session
 
         self.TemplatesRepo = TemplatesRepository(session)
+        self.PatternsRepo = PatternsRepository(session)
 
     def create_instance(
         self,
@@ -57,15 +131,238 @@ class InstancesRepository :
             **kwargs,
         )
 
-        self.session.add(instance)
-        self.session.commit()
-        self.session.refresh(instance)
+        # Instance + compteur du template en un seul commit
+        with self.batch():
+            self.session.add(instance)
 
-        if template_id:
-            self.TemplatesRepo.increment_template_instance_count(template_id)
+            if template_id:
+                self.TemplatesRepo.increment_template_instance_count(template_id)
 
+        self._refresh(instance)
         return instance
 
+    def create_instances(self, rows: List[dict]) -> int:
+        """Crée plusieurs instances en un seul INSERT multi-lignes.
+
+        Chaque ligne accepte les mêmes champs que create_instance. Les compteurs
+        des templates sont mis à jour avec un seul UPDATE par template.
+
+        Returns:
+            Le nombre d'instances insérées.
+        """
+        if not rows:
+            return 0
+
+        values, counts = self._prepare_rows(rows)
+
+        with self.batch():
+            self.session.execute(insert(TaskInstance.__table__), values)
+            self.TemplatesRepo.increment_template_instance_counts(counts)
+
+        return len(values)
+
+    # Colonnes réécrites par un upsert calendrier : celles qui viennent d'iCloud.
+    # status, matching_status, template_id... appartiennent à Salva et ne sont pas touchés.
+    UPSERT_COLUMNS = (
+        "title",
+        "normalized_title",
+        "scheduled_start",
+        "scheduled_end",
+        "calendar_name",
+        "description",
+        "location",
+        "location_lat",
+        "location_lon",
+        "url",
+        "alerts_minutes",
+        "updated_at",
+    )
+
+    def upsert_calendar_instances(self, rows: List[dict]) -> int:
+        """Crée ou met à jour des instances iCloud en une seule requête.
+
+        La clé est la contrainte unique (user_id, calendar_event_id) : une ligne
+        déjà présente (y compris insérée entre-temps par un autre worker) voit
+        ses champs iCloud mis à jour au lieu de lever une erreur d'unicité.
+        Hors MySQL / SQLite, ou si l'index unique manque (base créée avant lui et
+        `db.py indexes` pas encore passé), repli sur une lecture des lignes
+        existantes puis un UPDATE groupé et un INSERT : sans la garantie face aux
+        autres workers. Sans l'index, MySQL insérerait des doublons en silence et
+        SQLite lèverait une erreur.
+
+        Chaque ligne accepte les mêmes champs que create_instance et doit avoir
+        un calendar_event_id. Les compteurs des templates ne sont pas mis à jour :
+        les imports calendrier n'ont pas de template.
+
+        Returns:
+            Le nombre de lignes envoyées.
+        """
+        if not rows:
+            return 0
+
+        values, counts = self._prepare_rows(rows)
+        if counts:
+            raise ValueError("upsert_calendar_instances n'accepte pas de lignes liées à un template")
+        if any(not value["calendar_event_id"] for value in values):
+            raise ValueError("upsert_calendar_instances exige un calendar_event_id sur chaque ligne")
+
+        now = now_utc()
+        for value in values:
+            value["updated_at"] = now
+
+        dialect = self.session.get_bind().dialect.name
+        table = TaskInstance.__table__
+
+        if dialect in ("mysql", "sqlite") and not self._has_upsert_key():
+            dialect = None
+
+        if dialect == "mysql":
+            statement = mysql_insert(table).values(values)
+            statement = statement.on_duplicate_key_update(
+                {name: statement.inserted[name] for name in self.UPSERT_COLUMNS}
+            )
+        elif dialect == "sqlite":
+            statement = sqlite_insert(table).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=["user_id", "calendar_event_id"],
+                set_={name: statement.excluded[name] for name in self.UPSERT_COLUMNS},
+            )
+        else:
+            with self.batch():
+                self._update_or_insert_calendar_instances(values)
+            return len(values)
+
+        with self.batch():
+            self.session.execute(statement)
+            self._expire_calendar_instances(values)
+
+        return len(values)
+
+    def _has_upsert_key(self) -> bool:
+        """Vrai si l'index unique (user_id, calendar_event_id) existe en base."""
+        engine = self.session.get_bind().engine
+        if engine not in _upsert_key_checked:
+            indexes = inspect(engine).get_indexes(TaskInstance.__tablename__)
+            present = any(index["name"] == UPSERT_KEY_INDEX and index["unique"] for index in indexes)
+            if not present:
+                print(f"⚠️  Index {UPSERT_KEY_INDEX} absent : upserts iCloud sans ON CONFLICT (lancer `db.py indexes`)")
+            _upsert_key_checked[engine] = present
+        return _upsert_key_checked[engine]
+
+    def _calendar_instance_ids(self, values: List[dict]) -> Dict[Tuple[int, str], int]:
+        """{(user_id, calendar_event_id): id} des lignes déjà en base."""
+        found = {}
+        for user_id in {value["user_id"] for value in values}:
+            uids = [value["calendar_event_id"] for value in values if value["user_id"] == user_id]
+            statement = (
+                select(TaskInstance.id, TaskInstance.calendar_event_id)
+                .where(TaskInstance.user_id == user_id)
+                .where(col(TaskInstance.calendar_event_id).in_(uids))
+            )
+            for instance_id, uid in self.session.exec(statement).all():
+                found[(user_id, uid)] = instance_id
+        return found
+
+    def _update_or_insert_calendar_instances(self, values: List[dict]) -> None:
+        """Upsert sans support du dialecte : lecture des clés, UPDATE groupé, INSERT."""
+        existing = self._calendar_instance_ids(values)
+        to_update = [value for value in values if (value["user_id"], value["calendar_event_id"]) in existing]
+        to_insert = [value for value in values if (value["user_id"], value["calendar_event_id"]) not in existing]
+
+        if to_update:
+            table = TaskInstance.__table__
+            statement = (
+                update(table)
+                .where(table.c.id == bindparam("b_instance_id"))
+                .values({name: bindparam(f"b_{name}") for name in self.UPSERT_COLUMNS})
+            )
+            self.session.execute(statement, [
+                {
+                    "b_instance_id": existing[(value["user_id"], value["calendar_event_id"])],
+                    **{f"b_{name}": value[name] for name in self.UPSERT_COLUMNS},
+                }
+                for value in to_update
+            ])
+            self._expire_instances(existing.values(), list(self.UPSERT_COLUMNS))
+        if to_insert:
+            self.session.execute(insert(TaskInstance.__table__), to_insert)
+
+    def _expire_calendar_instances(self, values: List[dict]) -> None:
+        """Force le rechargement des instances upsertées déjà présentes en session.
+
+        Les ids sont relus par la contrainte unique, seulement si la session
+        contient des objets : l'identity map n'est pas parcourue.
+        """
+        if not len(self.session.identity_map):
+            return
+        self._expire_instances(self._calendar_instance_ids(values).values(), list(self.UPSERT_COLUMNS))
+
+    def _prepare_rows(self, rows: List[dict]) -> Tuple[List[dict], Counter]:
+        """Complète les lignes pour un INSERT multi-lignes.
+
+        Returns:
+            (valeurs complètes, nombre d'instances par template_id)
+        """
+        defaults = self._column_defaults()
+        normalized = {}
+        counts = Counter()
+        values = []
+
+        for row in rows:
+            value = {**defaults, **row}
+            title = value["title"]
+            if title not in normalized:
+                normalized[title] = normalize_title(title)
+            value["normalized_title"] = normalized[title]
+
+            if "matching_status" not in row:
+                value["matching_status"] = MatchingStatus.MATCHED if value["template_id"] else MatchingStatus.PENDING
+            if value["template_id"]:
+                counts[value["template_id"]] += 1
+
+            values.append(value)
+
+        return values, counts
+
+    @staticmethod
+    def _column_defaults() -> dict:
+        """Valeurs par défaut de toutes les colonnes (un INSERT multi-lignes exige les mêmes clés partout)."""
+        defaults = {}
+        for column in TaskInstance.__table__.columns:
+            if column.primary_key:
+                continue
+            field = TaskInstance.model_fields.get(column.name)
+            default = field.get_default(call_default_factory=True) if field else None
+            defaults[column.name] = None if default is PydanticUndefined else default
+        defaults["origin"] = TaskOrigin.SYSTEM
+        return defaults
+
+    def find_duplicates(
+        self,
+        user_id: int,
+        keys: List[Tuple[str, datetime]],
+    ) -> Set[Tuple[str, datetime]]:
+        """Version groupée de find_duplicate : une seule requête pour plusieurs (titre, début).
+
+        Returns:
+            Les clés (titre, début en UTC naïf) qui existent déjà.
+        """
+        if not keys:
+            return set()
+
+        wanted = {(title, naive_utc(start)) for title, start in keys}
+        starts = [start for _, start in wanted]
+        statement = (
+            select(TaskInstance.title, TaskInstance.scheduled_start)
+            .where(TaskInstance.user_id == user_id)
+            .where(col(TaskInstance.title).in_({title for title, _ in wanted}))
+            .where(TaskInstance.scheduled_start >= min(starts))
+            .where(TaskInstance.scheduled_start <= max(starts))
+            .where(TaskInstance.status != TaskStatus.CANCELLED)
+        )
+        existing = {(title, naive_utc(start)) for title, start in self.session.exec(statement).all()}
+        return wanted & existing
+
     def get_instance(self, instance_id: int) -> Optional[TaskInstance]:
         return self.session.get(TaskInstance, instance_id)
 
@@ -122,6 +419,200 @@ class InstancesRepository :
         )
         return list(self.session.exec(statement).all())
     
+    # ============================================
+    # LECTURES EN FLUX (pagination par clé)
+    # ============================================
+
+    def iter_user_instances(
+        self,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[TaskStatus] = None,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[TaskInstance]:
+        """Comme get_user_instances, mais page par page : mémoire bornée quel que soit l'historique."""
+        statement = select(TaskInstance).where(TaskInstance.user_id == user_id)
+
+        if start:
+            statement = statement.where(TaskInstance.scheduled_start >= start)
+        if end:
+            statement = statement.where(TaskInstance.scheduled_end <= end)
+        if status:
+            statement = statement.where(TaskInstance.status == status)
+
+        yield from self._iter_keyset(statement, batch_size)
+
+    def iter_pending_instances(self, user_id: int, batch_size: Optional[int] = None) -> Iterator[TaskInstance]:
+        """Instances en attente de matching, en flux."""
+        statement = (
+            select(TaskInstance)
+            .where(TaskInstance.user_id == user_id)
+            .where(TaskInstance.matching_status == MatchingStatus.PENDING)
+        )
+        yield from self._iter_keyset(statement, batch_size)
+
+    def iter_orphan_instances(self, user_id: int, batch_size: Optional[int] = None) -> Iterator[TaskInstance]:
+        """Instances orphelines pas encore clusterisées, en flux."""
+        statement = (
+            select(TaskInstance)
+            .where(TaskInstance.user_id == user_id)
+            .where(TaskInstance.matching_status == MatchingStatus.ORPHAN)
+        )
+        yield from self._iter_keyset(statement, batch_size)
+
+    def iter_instances_to_push(
+        self,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[TaskInstance]:
+        """Instances créées par Salva qui n'ont pas encore d'event iCloud, en flux."""
+        statement = (
+            select(TaskInstance)
+            .where(TaskInstance.user_id == user_id)
+            .where(TaskInstance.calendar_event_id.is_(None))
+            .where(TaskInstance.origin != TaskOrigin.CALENDAR)
+        )
+        if start:
+            statement = statement.where(TaskInstance.scheduled_start >= start)
+        if end:
+            statement = statement.where(TaskInstance.scheduled_end <= end)
+
+        yield from self._iter_keyset(statement, batch_size)
+
+    # ============================================
+    # PROJECTIONS (colonnes seulement, sans hydratation ORM)
+    # ============================================
+
+    def iter_instance_refs(
+        self,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[TaskStatus] = None,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[InstanceRef]:
+        """Comme iter_user_instances, mais ne lit que les colonnes de InstanceRef."""
+        statement = select(*_columns(InstanceRef)).where(TaskInstance.user_id == user_id)
+
+        if start:
+            statement = statement.where(TaskInstance.scheduled_start >= start)
+        if end:
+            statement = statement.where(TaskInstance.scheduled_end <= end)
+        if status:
+            statement = statement.where(TaskInstance.status == status)
+
+        for row in self._iter_keyset(statement, batch_size):
+            yield InstanceRef._make(row)
+
+    def iter_pending_titles(self, user_id: int, batch_size: Optional[int] = None) -> Iterator[InstanceTitle]:
+        """Comme iter_pending_instances, mais ne lit que les colonnes de InstanceTitle."""
+        statement = (
+            select(*_columns(InstanceTitle))
+            .where(TaskInstance.user_id == user_id)
+            .where(TaskInstance.matching_status == MatchingStatus.PENDING)
+        )
+        for row in self._iter_keyset(statement, batch_size):
+            yield InstanceTitle._make(row)
+
+    def iter_orphan_titles(self, user_id: int, batch_size: Optional[int] = None) -> Iterator[InstanceTitle]:
+        """Comme iter_orphan_instances, mais ne lit que les colonnes de InstanceTitle."""
+        statement = (
+            select(*_columns(InstanceTitle))
+            .where(TaskInstance.user_id == user_id)
+            .where(TaskInstance.matching_status == MatchingStatus.ORPHAN)
+        )
+        for row in self._iter_keyset(statement, batch_size):
+            yield InstanceTitle._make(row)
+
+    def get_calendar_snapshots(self, user_id: int, calendar_event_ids: List[str]) -> Dict[str, InstanceSnapshot]:
+        """Lit en une requête les instances de plusieurs events iCloud.
+
+        Returns:
+            {calendar_event_id: InstanceSnapshot} pour les events déjà en base.
+        """
+        if not calendar_event_ids:
+            return {}
+
+        statement = (
+            select(*_columns(InstanceSnapshot))
+            .where(TaskInstance.user_id == user_id)
+            .where(col(TaskInstance.calendar_event_id).in_(calendar_event_ids))
+        )
+        return {
+            row.calendar_event_id: InstanceSnapshot._make(row)
+            for row in self.session.exec(statement).all()
+        }
+
+    def get_last_instance_start(self, template_id: int) -> Optional[datetime]:
+        """Date de la dernière instance non annulée d'un template."""
+        statement = (
+            select(func.max(TaskInstance.scheduled_start))
+            .where(TaskInstance.template_id == template_id)
+            .where(TaskInstance.status != TaskStatus.CANCELLED)
+        )
+        return self.session.exec(statement).first()
+
+    def get_last_instance_starts(self, template_ids: List[int]) -> Dict[int, datetime]:
+        """Comme get_last_instance_start, pour plusieurs templates en une requête."""
+        if not template_ids:
+            return {}
+
+        statement = (
+            select(TaskInstance.template_id, func.max(TaskInstance.scheduled_start))
+            .where(col(TaskInstance.template_id).in_(template_ids))
+            .where(TaskInstance.status != TaskStatus.CANCELLED)
+            .group_by(TaskInstance.template_id)
+        )
+        return {template_id: start for template_id, start in self.session.exec(statement).all()}
+
+    def update_instance_values(self, instance_id: int, **values) -> None:
+        """Met à jour une instance par son id, sans la charger."""
+        self._update_many([instance_id], **values)
+        self._commit()
+
+    def _iter_keyset(self, statement, batch_size: Optional[int] = None) -> Iterator:
+        """Parcourt une requête par pages ordonnées sur (scheduled_start, id).
+
+        La requête peut sélectionner des entités ou des colonnes, du moment
+        que scheduled_start et id en font partie.
+
+        Chaque page reprend après la dernière clé vue (pas d'OFFSET) : le coût
+        d'une page est constant, même loin dans l'historique. La page est lue
+        entièrement avant d'être rendue, le curseur est donc fermé quand
+        l'appelant écrit ou commit pendant le parcours.
+        """
+        batch_size = batch_size or self.STREAM_BATCH_SIZE
+        last = None
+
+        while True:
+            page = statement
+            if last:
+                last_start, last_id = last
+                page = page.where(
+                    or_(
+                        TaskInstance.scheduled_start > last_start,
+                        and_(TaskInstance.scheduled_start == last_start, TaskInstance.id > last_id),
+                    )
+                )
+            page = (
+                page.order_by(TaskInstance.scheduled_start, TaskInstance.id)
+                .limit(batch_size)
+                .execution_options(yield_per=batch_size)
+            )
+
+            rows = self.session.exec(page).all()
+            if not rows:
+                return
+
+            last = (rows[-1].scheduled_start, rows[-1].id)
+            yield from rows
+
+            if len(rows) < batch_size:
+                return
+
     def get_last_instance_by_template(self, template_id: int) -> Optional[TaskInstance]:
         """Récupère la dernière instance créée pour un template donné."""
         statement = (
@@ -145,51 +636,163 @@ class InstancesRepository :
     def mark_instance_matched(self, instance_id: int, template_id: int) -> None:
         instance = self.get_instance(instance_id)
         if instance:
-            instance.template_id = template_id
-            instance.matching_status = MatchingStatus.MATCHED
-            instance.updated_at = now_utc()
-            self.session.commit()
-            self.TemplatesRepo.increment_template_instance_count(template_id)
+            with self.batch():
+                instance.template_id = template_id
+                instance.matching_status = MatchingStatus.MATCHED
+                instance.updated_at = now_utc()
+                self.TemplatesRepo.increment_template_instance_count(template_id)
+
+    def mark_instances_matched(self, matches: Dict[int, int]) -> None:
+        """Lie plusieurs instances à leur template en un seul executemany.
+
+        Args:
+            matches: {instance_id: template_id}
+        """
+        if not matches:
+            return
+
+        table = TaskInstance.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_instance_id"))
+            .values(
+                template_id=bindparam("b_template_id"),
+                matching_status=MatchingStatus.MATCHED,
+                updated_at=now_utc(),
+            )
+        )
+
+        with self.batch():
+            self.session.execute(
+                statement,
+                [{"b_instance_id": i, "b_template_id": t} for i, t in matches.items()],
+            )
+            self.TemplatesRepo.increment_template_instance_counts(Counter(matches.values()))
+            self._expire_instances(matches, ["template_id", "matching_status", "updated_at"])
+
+    def mark_cluster_instances_matched(self, cluster_id: int, template_id: int) -> int:
+        """Lie au template toutes les instances d'un cluster, sans les charger.
+
+        Trois requêtes quelle que soit la taille du cluster : les ids des
+        membres, un UPDATE et le compteur du template.
+
+        Returns:
+            Le nombre d'instances liées.
+        """
+        members = self.session.exec(
+            select(ClusterInstance.instance_id).where(ClusterInstance.cluster_id == cluster_id)
+        ).all()
+        if not members:
+            return 0
+
+        values = {"template_id": template_id, "matching_status": MatchingStatus.MATCHED, "updated_at": now_utc()}
+        with self.batch():
+            result = self.session.execute(
+                update(TaskInstance)
+                .where(col(TaskInstance.id).in_(members))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                self.TemplatesRepo.increment_template_instance_count(template_id, result.rowcount)
+            self._expire_instances(members, list(values))
+        return result.rowcount
+
+    def mark_instances_orphan(self, instance_ids: List[int]) -> None:
+        """Passe plusieurs instances en ORPHAN en un seul UPDATE."""
+        if not instance_ids:
+            return
+
+        self._update_many(instance_ids, matching_status=MatchingStatus.ORPHAN)
+        self._commit()
+
+    def _update_many(self, instance_ids: List[int], **values) -> None:
+        values["updated_at"] = now_utc()
+        self.session.execute(
+            update(TaskInstance)
+            .where(col(TaskInstance.id).in_(instance_ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        self._expire_instances(instance_ids, list(values))
+
+    def _expire_instances(self, instance_ids, attributes: List[str]) -> None:
+        """Une instance déjà chargée dans la session serait sinon périmée."""
+        for instance_id in instance_ids:
+            instance = self.session.identity_map.get(identity_key(TaskInstance, instance_id))
+            if instance is not None:
+                self.session.expire(instance, attributes)
 
     def mark_instance_orphan(self, instance_id: int) -> None:
         instance = self.get_instance(instance_id)
         if instance:
             instance.matching_status = MatchingStatus.ORPHAN
             instance.updated_at = now_utc()
-            self.session.commit()
+            self._commit()
 
     def mark_instance_clustered(self, instance_id: int) -> None:
         instance = self.get_instance(instance_id)
         if instance:
             instance.matching_status = MatchingStatus.CLUSTERED
             instance.updated_at = now_utc()
-            self.session.commit()
+            self._commit()
+
+    def mark_instances_clustered(self, instance_ids: List[int]) -> None:
+        """Passe plusieurs instances en CLUSTERED en un seul UPDATE."""
+        if not instance_ids:
+            return
+
+        self._update_many(instance_ids, matching_status=MatchingStatus.CLUSTERED)
+        self._commit()
+
+    # Statuts finaux : une instance qui en sort ou passe de l'un à l'autre n'est plus comptée
+    OUTCOME_STATUSES = (TaskStatus.COMPLETED, TaskStatus.CANCELLED)
 
     def mark_instance_deleted(self, event_uid: str) -> None:
         instance = self.get_instance_by_calendar_event(event_uid)
-        if instance:
-            instance.status = TaskStatus.CANCELLED
-            instance.updated_at = now_utc()
-            self.session.commit()
+        if instance and instance.status != TaskStatus.CANCELLED:
+            previous = instance.status
+            with self.batch():
+                instance.status = TaskStatus.CANCELLED
+                instance.updated_at = now_utc()
+                self._record_outcome(instance, previous)
 
     def complete_instance(self, instance_id: int) -> bool:
         instance = self.get_instance(instance_id)
         if not instance:
             return False
-        instance.status = TaskStatus.COMPLETED
-        instance.completed_at = now_utc()
-        instance.updated_at = now_utc()
-        self.session.commit()
+        if instance.status != TaskStatus.COMPLETED:
+            previous = instance.status
+            with self.batch():
+                instance.status = TaskStatus.COMPLETED
+                instance.completed_at = now_utc()
+                instance.updated_at = now_utc()
+                self._record_outcome(instance, previous)
         return True
 
     def cancel_instance(self, instance_id: int) -> bool:
         instance = self.get_instance(instance_id)
         if not instance:
             return False
-        instance.status = TaskStatus.CANCELLED
-        instance.updated_at = now_utc()
-        self.session.commit()
+        if instance.status != TaskStatus.CANCELLED:
+            previous = instance.status
+            with self.batch():
+                instance.status = TaskStatus.CANCELLED
+                instance.updated_at = now_utc()
+                self._record_outcome(instance, previous)
         return True
+
+    def _record_outcome(self, instance: TaskInstance, previous: TaskStatus) -> None:
+        """Met à jour les LearnedPattern du template, dans la même transaction que le statut.
+
+        Seule la première issue compte : une instance complétée puis annulée (ou
+        l'inverse) reste comptée comme complétée. Le backfill (PatternBackfill),
+        qui lit le statut final, corrige ces écarts.
+        """
+        if instance.template_id is None or previous in self.OUTCOME_STATUSES:
+            return
+        template = self.TemplatesRepo.get_template(instance.template_id)
+        self.PatternsRepo.record_instance_outcome(instance, template.estimated_duration if template else None)
     
     def find_duplicate(
         self,
@@ -219,8 +822,8 @@ class InstancesRepository :
                 setattr(instance, key, value)
 
         instance.updated_at = now_utc()
-        self.session.commit()
-        self.session.refresh(instance)
+        self._commit()
+        self._refresh(instance)
 
         return instance
     
@@ -235,8 +838,8 @@ class InstancesRepository :
                 setattr(instance, key, value)
 
         instance.updated_at = now_utc()
-        self.session.commit()
-        self.session.refresh(instance)
+        self._commit()
+        self._refresh(instance)
 
         return instance
     
@@ -247,7 +850,7 @@ class InstancesRepository :
             raise ValueError(f"Instance with uid : {uid} not found")
         
         self.session.delete(instance)
-        self.session.commit()
+        self._commit()
 
         return True
 
@@ -1,7 +1,8 @@
 from typing import Optional, List
 from datetime import datetime, timezone
 from sqlmodel import Session, select, col
-from sqlalchemy import func
+from sqlalchemy import func, insert
+from Salva.Repository.UnitOfWork import UnitOfWork
 
 from Salva.models import (
     TaskTemplate,
@@ -21,7 +22,7 @@ from Salva.models import (
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
-class MatchRepository :
+class MatchRepository(UnitOfWork):
 
     def __init__(self, session: Session):
         self.session = session
@@ -35,6 +36,7 @@ class MatchRepository :
         accepted: bool = False,
         details: Optional[dict] = None,
     ) -> MatchAttempt:
+        """Une tentative, un commit : pour un run de matching, passer par MatchTraceWriter."""
         attempt = MatchAttempt(
             instance_id=instance_id,
             template_id=template_id,
@@ -44,10 +46,36 @@ class MatchRepository :
             details=details,
         )
         self.session.add(attempt)
-        self.session.commit()
-        self.session.refresh(attempt)
+        self._commit()
+        self._refresh(attempt)
         return attempt
 
+    def record_match_attempts(self, rows: List[dict]) -> int:
+        """Enregistre plusieurs tentatives en un seul INSERT multi-lignes.
+
+        Chaque ligne accepte les champs de record_match_attempt.
+
+        Returns:
+            Le nombre de tentatives enregistrées.
+        """
+        if not rows:
+            return 0
+
+        created_at = now_utc()
+        values = [
+            {
+                "method": MatchMethod.FUZZY,
+                "accepted": False,
+                "details": None,
+                "created_at": created_at,
+                **row,
+            }
+            for row in rows
+        ]
+        self.session.execute(insert(MatchAttempt.__table__), values)
+        self._commit()
+        return len(values)
+
     def get_match_attempts_for_instance(self, instance_id: int) -> List[MatchAttempt]:
         statement = (
             select(MatchAttempt)
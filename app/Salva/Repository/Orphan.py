@@ -1,7 +1,9 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime, timezone
 from sqlmodel import Session, select, col
-from sqlalchemy import func
+from sqlalchemy import func, insert, update, bindparam
+from sqlalchemy.orm.util import identity_key
+from Salva.Repository.UnitOfWork import UnitOfWork
 
 from Salva.Repository.Templates import TemplatesRepository
 from Salva.Repository.Instances import InstancesRepository
@@ -24,7 +26,7 @@ from Salva.models import (
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
-class OrphanRepository :
+class OrphanRepository(UnitOfWork):
 
     def __init__(self, session: Session):
         self.session = session
@@ -46,22 +48,17 @@ class OrphanRepository :
             representative_title=representative_title,
             confidence=confidence,
         )
-        self.session.add(cluster)
-        self.session.commit()
-        self.session.refresh(cluster)
-
-        # Lier les instances au cluster
-        for iid in instance_ids:
-            link = ClusterInstance(
-                cluster_id=cluster.id,
-                instance_id=iid,
-                similarity_score=confidence,
-            )
-            self.session.add(link)
-            self.instanceRepo.mark_instance_clustered(iid)
+        with self.batch():
+            self.session.add(cluster)
+            self._ensure_id(cluster)
 
-        self.session.commit()
-        self.session.refresh(cluster)
+            # Lier les instances au cluster : un INSERT et un UPDATE
+            self.add_instances_to_clusters([
+                {"cluster_id": cluster.id, "instance_id": iid, "similarity_score": confidence}
+                for iid in instance_ids
+            ])
+
+        self._refresh(cluster)
         return cluster
 
     def add_instance_to_cluster(
@@ -75,9 +72,117 @@ class OrphanRepository :
             instance_id=instance_id,
             similarity_score=similarity_score,
         )
-        self.session.add(link)
-        self.instanceRepo.mark_instance_clustered(instance_id)
-        self.session.commit()
+        with self.batch():
+            self.session.add(link)
+            self.instanceRepo.mark_instance_clustered(instance_id)
+
+    def create_clusters(self, user_id: int, clusters: List[dict]) -> List[OrphanCluster]:
+        """Crée plusieurs clusters (un seul flush pour obtenir leurs id).
+
+        Args:
+            clusters: [{"cluster_label": "dentiste", "representative_title": "Dentiste"}, ...]
+        """
+        created = [OrphanCluster(user_id=user_id, **values) for values in clusters]
+        if not created:
+            return created
+
+        with self.batch():
+            self.session.add_all(created)
+            self.session.flush()
+        return created
+
+    def add_instances_to_clusters(self, links: List[dict]) -> int:
+        """Lie des instances à des clusters en un seul INSERT, et les passe en CLUSTERED.
+
+        Args:
+            links: [{"cluster_id": 1, "instance_id": 42, "similarity_score": 0.8}, ...]
+        """
+        if not links:
+            return 0
+
+        added_at = now_utc()
+        with self.batch():
+            self.session.execute(insert(ClusterInstance.__table__), [{"added_at": added_at, **link} for link in links])
+            self.instanceRepo.mark_instances_clustered([link["instance_id"] for link in links])
+        return len(links)
+
+    def get_active_cluster_ids(self, user_id: int) -> List[int]:
+        statement = (
+            select(OrphanCluster.id)
+            .where(OrphanCluster.user_id == user_id)
+            .where(OrphanCluster.status == ClusterStatus.ACTIVE)
+        )
+        return list(self.session.exec(statement).all())
+
+    def get_cluster_member_titles(self, cluster_ids: List[int]) -> List[Tuple[int, str, Optional[str]]]:
+        """Titres des instances de plusieurs clusters, en une requête.
+
+        Returns:
+            [(cluster_id, title, normalized_title), ...]
+        """
+        if not cluster_ids:
+            return []
+
+        statement = (
+            select(ClusterInstance.cluster_id, TaskInstance.title, TaskInstance.normalized_title)
+            .join(TaskInstance, TaskInstance.id == ClusterInstance.instance_id)
+            .where(col(ClusterInstance.cluster_id).in_(cluster_ids))
+        )
+        return [tuple(row) for row in self.session.exec(statement).all()]
+
+    def get_cluster_starts(self, user_id: int) -> List[Tuple[int, datetime]]:
+        """Dates de toutes les instances des clusters actifs de l'utilisateur, en une requête.
+
+        Returns:
+            [(cluster_id, scheduled_start), ...] triés par cluster puis par date
+        """
+        statement = (
+            select(ClusterInstance.cluster_id, TaskInstance.scheduled_start)
+            .join(TaskInstance, TaskInstance.id == ClusterInstance.instance_id)
+            .join(OrphanCluster, OrphanCluster.id == ClusterInstance.cluster_id)
+            .where(OrphanCluster.user_id == user_id)
+            .where(OrphanCluster.status == ClusterStatus.ACTIVE)
+            .order_by(ClusterInstance.cluster_id, TaskInstance.scheduled_start)
+        )
+        return [tuple(row) for row in self.session.exec(statement).all()]
+
+    def update_cluster_patterns(self, patterns: List[dict]) -> None:
+        """Enregistre les récurrences détectées de plusieurs clusters en un seul UPDATE (executemany).
+
+        Args:
+            patterns: [{"cluster_id": 1, "detected_frequency_days": 7.0,
+                        "detected_pattern": "weekly", "confidence": 0.8}, ...]
+        """
+        if not patterns:
+            return
+
+        table = OrphanCluster.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_cluster_id"))
+            .values(
+                detected_frequency_days=bindparam("b_frequency"),
+                detected_pattern=bindparam("b_pattern"),
+                confidence=bindparam("b_confidence"),
+                updated_at=now_utc(),
+            )
+        )
+        self.session.execute(statement, [
+            {
+                "b_cluster_id": pattern["cluster_id"],
+                "b_frequency": pattern["detected_frequency_days"],
+                "b_pattern": pattern["detected_pattern"],
+                "b_confidence": pattern["confidence"],
+            }
+            for pattern in patterns
+        ])
+
+        # Un cluster déjà chargé dans la session serait sinon périmé
+        for pattern in patterns:
+            cluster = self.session.identity_map.get(identity_key(OrphanCluster, pattern["cluster_id"]))
+            if cluster is not None:
+                self.session.expire(cluster, ["detected_frequency_days", "detected_pattern", "confidence", "updated_at"])
+        self._commit()
 
     def get_active_clusters(self, user_id: int) -> List[OrphanCluster]:
         statement = (
@@ -92,33 +197,33 @@ class OrphanRepository :
         cluster_id: int,
         **template_kwargs,
     ) -> Optional[TaskTemplate]:
-        """Promeut un cluster en template et relie toutes ses instances."""
+        """Promeut un cluster en template et relie toutes ses instances.
+
+        Nombre de requêtes constant, quelle que soit la taille du cluster.
+        """
         cluster = self.session.get(OrphanCluster, cluster_id)
         if not cluster:
             return None
 
-        # Créer le template
-        template = self.templateRepo.create_template(
-            user_id=cluster.user_id,
-            title=cluster.representative_title,
-            origin=TaskOrigin.DETECTED,
-            confidence=cluster.confidence,
-            **template_kwargs,
-        )
-
-        # Mettre à jour le cluster
-        cluster.status = ClusterStatus.PROMOTED
-        cluster.promoted_to_template_id = template.id
-        cluster.promoted_at = now_utc()
-        cluster.updated_at = now_utc()
+        with self.batch():
+            # Créer le template
+            template = self.templateRepo.create_template(
+                user_id=cluster.user_id,
+                title=cluster.representative_title,
+                origin=TaskOrigin.DETECTED,
+                confidence=cluster.confidence,
+                **template_kwargs,
+            )
+            self._ensure_id(template)
 
-        # Rattacher les instances orphelines au nouveau template
-        statement = select(ClusterInstance).where(ClusterInstance.cluster_id == cluster_id)
-        links = list(self.session.exec(statement).all())
+            # Mettre à jour le cluster
+            cluster.status = ClusterStatus.PROMOTED
+            cluster.promoted_to_template_id = template.id
+            cluster.promoted_at = now_utc()
+            cluster.updated_at = now_utc()
 
-        for link in links:
-            self.instanceRepo.mark_instance_matched(link.instance_id, template.id)
+            # Rattacher les instances orphelines au nouveau template, sans charger les liens
+            self.instanceRepo.mark_cluster_instances_matched(cluster_id, template.id)
 
-        self.session.commit()
-        self.session.refresh(template)
+        self._refresh(template)
         return template
\ No newline at end of file
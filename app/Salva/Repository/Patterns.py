@@ -0,0 +1,225 @@
+from typing import Optional, List, Dict, Tuple
+from datetime import datetime, timezone
+import copy
+import math
+from sqlmodel import Session, select, col
+from sqlalchemy import insert, delete, union_all
+from Salva.Repository.UnitOfWork import UnitOfWork
+
+from Salva.models import (
+    TaskTemplate,
+    TaskInstance,
+    TaskInstanceArchive,
+    LearnedPattern,
+    TaskStatus,
+)
+
+# Types de LearnedPattern tenus à jour, un par (utilisateur, template)
+COMPLETION_TIME = "completion_time"
+PREFERRED_DAY = "preferred_day"
+DURATION = "duration"
+FREQUENCY = "frequency"
+PATTERN_TYPES = (COMPLETION_TIME, PREFERRED_DAY, DURATION, FREQUENCY)
+
+# Au-delà, l'écart entre début prévu et complétion n'est plus une durée de tâche
+MAX_DURATION_MINUTES = 12 * 60
+
+
+def now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def aware_utc(value: datetime) -> datetime:
+    """La base renvoie des dates sans fuseau : elles sont en UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def template_category(template_id: int) -> str:
+    return f"template:{template_id}"
+
+
+# ============================================
+# STATISTIQUES EN LIGNE (Welford)
+# ============================================
+
+def moments(name: str, n: int, mean: float, m2: float) -> dict:
+    """État d'une moyenne / variance en ligne : n, moyenne, M2 (somme des carrés des écarts)."""
+    return {
+        f"{name}_n": n,
+        f"{name}_mean": mean,
+        f"{name}_m2": m2,
+        f"{name}_std": math.sqrt(m2 / (n - 1)) if n > 1 else 0.0,
+    }
+
+
+def welford_update(data: dict, name: str, value: float) -> None:
+    """Ajoute une observation à l'état `name` de `data` (algorithme de Welford)."""
+    n = data.get(f"{name}_n", 0) + 1
+    mean = data.get(f"{name}_mean", 0.0)
+    m2 = data.get(f"{name}_m2", 0.0)
+    delta = value - mean
+    mean += delta / n
+    m2 += delta * (value - mean)
+    data.update(moments(name, n, mean, m2))
+
+
+def summarize(pattern_type: str, data: dict) -> Tuple[dict, int, float]:
+    """Ajoute les valeurs lisibles (preferred_hour, avg_frequency_days...) à l'état brut.
+
+    Returns:
+        (pattern_data, observations_count, confidence)
+    """
+    if pattern_type == COMPLETION_TIME:
+        completed, cancelled = data.get("completed", 0), data.get("cancelled", 0)
+        observations = completed + cancelled
+        data["completion_rate"] = round(completed / observations, 4) if observations else None
+        data["preferred_hour"] = round(data["hour_mean"]) % 24 if data.get("hour_n") else None
+    elif pattern_type == PREFERRED_DAY:
+        counts = data.setdefault("counts", [0] * 7)
+        observations = sum(counts)
+        top = max(range(7), key=counts.__getitem__)
+        data["preferred_weekday"] = top if observations else None
+        data["share"] = round(counts[top] / observations, 4) if observations else None
+    elif pattern_type == DURATION:
+        observations = data.get("minutes_n", 0)
+    else:
+        observations = data.get("days_n", 0)
+        data["avg_frequency_days"] = round(data["days_mean"], 2) if observations else None
+        data["std_deviation"] = round(data["days_std"], 2) if observations else None
+
+    # Plus d'observations, plus de confiance (0.5 à 5 observations)
+    return data, observations, round(observations / (observations + 5), 4)
+
+
+class PatternsRepository(UnitOfWork):
+    """Tient à jour les LearnedPattern (par template) au fil des complétions et annulations.
+
+    Chaque pattern garde dans pattern_data l'état de ses statistiques (n,
+    moyenne, M2) : une observation le met à jour sans relire l'historique.
+
+    Seule la première issue d'une instance est comptée (voir
+    InstancesRepository._record_outcome) ; PatternBackfill, qui repart du
+    statut final de chaque instance, fait référence.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get_patterns(self, user_id: int, category: str) -> Dict[str, LearnedPattern]:
+        statement = (
+            select(LearnedPattern)
+            .where(LearnedPattern.user_id == user_id)
+            .where(LearnedPattern.category == category)
+        )
+        return {pattern.pattern_type: pattern for pattern in self.session.exec(statement).all()}
+
+    # ============================================
+    # MISE À JOUR INCRÉMENTALE
+    # ============================================
+
+    def record_instance_outcome(self, instance: TaskInstance, estimated_duration: Optional[int] = None) -> None:
+        """Ajoute aux patterns du template une instance COMPLETED ou CANCELLED."""
+        if instance.template_id is None or instance.status not in (TaskStatus.COMPLETED, TaskStatus.CANCELLED):
+            return
+
+        patterns = self.get_patterns(instance.user_id, template_category(instance.template_id))
+        # Copie profonde : modifier en place la valeur chargée (counts...) la rendrait
+        # égale à la nouvelle, et l'UPDATE serait omis
+        data = {pattern_type: copy.deepcopy(patterns[pattern_type].pattern_data) if pattern_type in patterns else {}
+                for pattern_type in PATTERN_TYPES}
+        touched = {COMPLETION_TIME}
+
+        if instance.status == TaskStatus.CANCELLED:
+            data[COMPLETION_TIME]["cancelled"] = data[COMPLETION_TIME].get("cancelled", 0) + 1
+        else:
+            completed_at = aware_utc(instance.completed_at or now_utc())
+            start = aware_utc(instance.scheduled_start)
+            current = data[COMPLETION_TIME]
+            current["completed"] = current.get("completed", 0) + 1
+            welford_update(current, "hour", completed_at.hour + completed_at.minute / 60)
+
+            counts = data[PREFERRED_DAY].setdefault("counts", [0] * 7)
+            counts[start.weekday()] += 1
+            touched.add(PREFERRED_DAY)
+
+            minutes = (completed_at - start).total_seconds() / 60
+            if 0 < minutes <= MAX_DURATION_MINUTES:
+                welford_update(data[DURATION], "minutes", minutes)
+                if estimated_duration:
+                    data[DURATION]["estimated_minutes"] = estimated_duration
+                    welford_update(data[DURATION], "ratio", minutes / estimated_duration)
+                touched.add(DURATION)
+
+            last = data[FREQUENCY].get("last_completed_at")
+            if last:
+                days = (completed_at - datetime.fromisoformat(last)).total_seconds() / 86400
+                if days > 0:
+                    welford_update(data[FREQUENCY], "days", days)
+            if not last or completed_at.isoformat() > last:
+                data[FREQUENCY]["last_completed_at"] = completed_at.isoformat()
+            touched.add(FREQUENCY)
+
+        for pattern_type in touched:
+            pattern_data, observations, confidence = summarize(pattern_type, data[pattern_type])
+            pattern = patterns.get(pattern_type)
+            if pattern is None:
+                pattern = LearnedPattern(
+                    user_id=instance.user_id,
+                    pattern_type=pattern_type,
+                    category=template_category(instance.template_id),
+                    pattern_data=pattern_data,
+                )
+                self.session.add(pattern)
+            # Nouveau dict : la colonne JSON n'est pas suivie en profondeur
+            pattern.pattern_data = pattern_data
+            pattern.observations_count = max(observations, 1)
+            pattern.confidence = confidence
+            pattern.last_updated = now_utc()
+        self._commit()
+
+    # ============================================
+    # RECALCUL COMPLET (backfill)
+    # ============================================
+
+    def get_outcomes(self, user_id: Optional[int] = None) -> List[tuple]:
+        """Instances COMPLETED / CANCELLED liées à un template, tables chaudes et archives.
+
+        Returns:
+            [(user_id, template_id, status, scheduled_start, completed_at, estimated_duration), ...]
+        """
+        archive = TaskInstanceArchive.c
+        selects = []
+        for source in (TaskInstance.__table__.c, archive):
+            statement = (
+                select(
+                    source.user_id,
+                    source.template_id,
+                    source.status,
+                    source.scheduled_start,
+                    source.completed_at,
+                    TaskTemplate.estimated_duration,
+                )
+                .join(TaskTemplate, TaskTemplate.id == source.template_id)
+                .where(col(source.status).in_([TaskStatus.COMPLETED, TaskStatus.CANCELLED]))
+            )
+            if user_id is not None:
+                statement = statement.where(source.user_id == user_id)
+            selects.append(statement)
+        return [tuple(row) for row in self.session.execute(union_all(*selects)).all()]
+
+    def replace_patterns(self, rows: List[dict], user_id: Optional[int] = None) -> int:
+        """Remplace les patterns par template (de l'utilisateur, ou de tous) en une transaction.
+
+        Args:
+            rows: [{"user_id", "pattern_type", "category", "pattern_data", "observations_count", "confidence"}, ...]
+        """
+        statement = delete(LearnedPattern).where(col(LearnedPattern.category).like("template:%"))
+        if user_id is not None:
+            statement = statement.where(LearnedPattern.user_id == user_id)
+
+        last_updated = now_utc()
+        with self.batch():
+            self.session.execute(statement.execution_options(synchronize_session=False))
+            if rows:
+                self.session.execute(insert(LearnedPattern.__table__), [{"last_updated": last_updated, **row} for row in rows])
+        return len(rows)
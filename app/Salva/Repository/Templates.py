@@ -1,7 +1,9 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, NamedTuple
 from datetime import datetime, timezone
 from sqlmodel import Session, select, col
-from sqlalchemy import func
+from sqlalchemy import func, update, case, or_, bindparam
+from sqlalchemy.orm.util import identity_key
+from Salva.Repository.UnitOfWork import UnitOfWork
 
 from Salva.models import (
     TaskTemplate,
@@ -21,7 +23,14 @@ from Salva.models import (
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
-class TemplatesRepository :
+
+class TemplateTitle(NamedTuple):
+    """Ce dont le matching a besoin d'un template (copie, sans objet ORM)."""
+    id: int
+    title: str
+    normalized_title: str
+
+class TemplatesRepository(UnitOfWork):
 
     def __init__(self, session: Session):
         self.session = session
@@ -41,8 +50,8 @@ class TemplatesRepository :
             **kwargs,
         )
         self.session.add(template)
-        self.session.commit()
-        self.session.refresh(template)
+        self._commit()
+        self._refresh(template)
         return template
 
     def get_template(self, template_id: int) -> Optional[TaskTemplate]:
@@ -54,21 +63,68 @@ class TemplatesRepository :
             statement = statement.where(TaskTemplate.active == True)
         return list(self.session.exec(statement).all())
 
+    def get_user_template_titles(self, user_id: int) -> List[TemplateTitle]:
+        """Templates actifs de l'utilisateur, en tuples : un commit ne les expire pas."""
+        statement = (
+            select(TaskTemplate.id, TaskTemplate.title, TaskTemplate.normalized_title)
+            .where(TaskTemplate.user_id == user_id)
+            .where(TaskTemplate.active == True)
+        )
+        return [
+            TemplateTitle(template_id, title, normalized or normalize_title(title))
+            for template_id, title, normalized in self.session.exec(statement).all()
+        ]
+
     def deactivate_template(self, template_id: int) -> bool:
         template = self.get_template(template_id)
         if not template:
             return False
         template.active = False
         template.updated_at = now_utc()
-        self.session.commit()
+        self._commit()
         return True
 
-    def increment_template_instance_count(self, template_id: int) -> None:
-        template = self.get_template(template_id)
-        if template:
-            template.instance_count += 1
-            template.last_instance_created_at = now_utc()
-            self.session.commit()
+    def increment_template_instance_count(self, template_id: int, n: int = 1) -> None:
+        """Incrémente le compteur d'un template en un seul UPDATE atomique."""
+        self.increment_template_instance_counts({template_id: n})
+
+    def increment_template_instance_counts(self, counts: Dict[int, int]) -> None:
+        """Incrémente plusieurs compteurs : un UPDATE atomique par template, côté SQL.
+
+        Pas de lecture préalable : deux workers qui synchronisent le même
+        utilisateur ne peuvent pas perdre d'incrément, et
+        last_instance_created_at ne recule jamais. Les UPDATE sont envoyés
+        ensemble (executemany).
+        """
+        if not counts:
+            return
+        now = now_utc()
+        table = TaskTemplate.__table__
+        last_created = table.c.last_instance_created_at
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_template_id"))
+            .values(
+                instance_count=table.c.instance_count + bindparam("b_n"),
+                last_instance_created_at=case(
+                    (or_(last_created.is_(None), last_created < now), now),
+                    else_=last_created,
+                ),
+            )
+        )
+        self.session.execute(
+            statement,
+            [{"b_template_id": template_id, "b_n": n} for template_id, n in counts.items()],
+        )
+        for template_id in counts:
+            self._expire_counters(template_id)
+        self._commit()
+
+    def _expire_counters(self, template_id: int) -> None:
+        """Force le rechargement des compteurs si le template est déjà en session."""
+        template = self.session.identity_map.get(identity_key(TaskTemplate, template_id))
+        if template is not None:
+            self.session.expire(template, ["instance_count", "last_instance_created_at"])
 
     def update_template(
             self,
@@ -89,8 +145,8 @@ class TemplatesRepository :
                 setattr(template, key, value)
 
         template.updated_at = now_utc()
-        self.session.commit()
-        self.session.refresh(template)
+        self._commit()
+        self._refresh(template)
         return template
     
     def delete_template(self, template_id: int) -> bool:
@@ -98,5 +154,5 @@ class TemplatesRepository :
         if not template :
             return None
         self.session.delete(template)
-        self.session.commit()
+        self._commit()
         return True
\ No newline at end of file
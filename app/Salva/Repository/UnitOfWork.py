@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+import inspect
+
+from sqlmodel import Session
+
+from Salva.Instrumentation import instrumented
+
+
+class UnitOfWork:
+    """Base commune des repositories : regroupe les écritures en une transaction.
+
+    Hors batch, chaque méthode d'écriture commit immédiatement (comportement
+    historique). Dans un bloc `with repo.batch():`, les commits et refresh sont
+    différés jusqu'à la sortie du bloc le plus externe, qui fait un seul commit
+    (ou un rollback en cas d'exception).
+
+    L'état est stocké dans `session.info` : tous les repositories qui partagent
+    la session participent au même batch, et les batchs peuvent s'imbriquer.
+    """
+
+    session: Session
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Chaque méthode publique est une portée d'instrumentation SQL (voir Salva.Instrumentation)
+        for name, attr in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.isfunction(attr):
+                setattr(cls, name, instrumented(f"{cls.__name__}.{name}", attr))
+
+    @property
+    def in_batch(self) -> bool:
+        return self.session.info.get("uow_depth", 0) > 0
+
+    @contextmanager
+    def batch(self):
+        info = self.session.info
+        info["uow_depth"] = info.get("uow_depth", 0) + 1
+        try:
+            yield self
+        except Exception:
+            info["uow_depth"] -= 1
+            if info["uow_depth"] == 0:
+                self.session.rollback()
+            raise
+        info["uow_depth"] -= 1
+        if info["uow_depth"] == 0:
+            self.session.commit()
+
+    def _commit(self) -> None:
+        if not self.in_batch:
+            self.session.commit()
+
+    def _refresh(self, obj) -> None:
+        if not self.in_batch:
+            self.session.refresh(obj)
+
+    def _ensure_id(self, obj) -> None:
+        """Envoie les INSERT en attente quand l'id d'un objet est nécessaire dans un batch."""
+        if obj.id is None:
+            self.session.flush()
@@ -2,13 +2,15 @@ from typing import Optional, List
 from datetime import datetime, timezone
 from sqlmodel import Session, select, col
 from sqlalchemy import func
+from Salva.Repository.UnitOfWork import UnitOfWork
+from Salva.Credentials import encrypt_password
 
 from Salva.models import (
     User,
     UserPreferences
 )
 
-class UserRepository:
+class UserRepository(UnitOfWork):
 
     def __init__(self, session: Session):
         self.session = session
@@ -17,10 +19,24 @@ class UserRepository:
         """Récupère un utilisateur par son email."""
         return self.session.exec(select(User).where(User.email == email)).first()
 
+    def get_users(self, emails: Optional[List[str]] = None) -> List[User]:
+        """Récupère tous les utilisateurs, ou seulement ceux dont l'email est listé."""
+        statement = select(User)
+        if emails:
+            statement = statement.where(col(User.email).in_(emails))
+        statement = statement.order_by(User.id)
+        return list(self.session.exec(statement).all())
+
     def create_user(self, 
                     email: str,
+                    icloud_password: Optional[str] = None,
                     **kwargs) -> User:
-        """Crée un nouvel utilisateur avec les préférences par défaut."""
+        """Crée un nouvel utilisateur avec les préférences par défaut.
+
+        `icloud_password` (en clair) est stocké chiffré (voir Salva.Credentials).
+        """
+        if icloud_password:
+            kwargs["icloud_encrypted_password"] = encrypt_password(icloud_password)
         user = User(email=email, **kwargs)
 
         exist_user = self.get_user_by_email(email)
@@ -28,8 +44,8 @@ class UserRepository:
             raise ValueError(f"Cette utilisateur existe déjà : {email}")
         
         self.session.add(user)
-        self.session.commit()
-        self.session.refresh(user)
+        self._commit()
+        self._refresh(user)
 
         return user
 
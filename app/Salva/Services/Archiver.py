@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import logging
+import os
+
+from sqlmodel import Session
+
+from Salva.models import TaskInstance, MatchAttempt
+from Salva.Repository.Archive import ArchiveRepository
+
+logger = logging.getLogger(__name__)
+
+# Âge (en jours) à partir duquel une ligne quitte les tables chaudes
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", 365))
+# Nombre d'instances déplacées par transaction
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 1000))
+
+
+class Archiver:
+    """Archive les instances et tentatives de matching plus anciennes que l'horizon.
+
+    Le travail est fait par paquets, un commit par paquet : les verrous restent
+    courts et un arrêt en cours de route ne laisse rien à moitié déplacé.
+
+    Les statistiques dérivées ne sont pas recalculées : instance_count des
+    templates et LearnedPattern comptent toujours les instances archivées.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        horizon_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.ArchiveRepo = ArchiveRepository(session)
+        self.horizon_days = horizon_days or ARCHIVE_HORIZON_DAYS
+        self.batch_size = batch_size or ARCHIVE_BATCH_SIZE
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        return (now or datetime.now(timezone.utc)) - timedelta(days=self.horizon_days)
+
+    # ============================================
+    # ARCHIVAGE
+    # ============================================
+
+    def run(self, now: Optional[datetime] = None) -> dict:
+        """Archive tout ce qui dépasse l'horizon.
+
+        Returns:
+            {"cutoff": ..., "instances": 1200, "match_attempts": 5300}
+        """
+        cutoff = self.cutoff(now)
+        instances = 0
+        attempts = 0
+
+        # 1. Instances (et leurs tentatives) par paquets
+        while True:
+            ids = self.ArchiveRepo.get_archivable_instance_ids(cutoff, self.batch_size)
+            if not ids:
+                break
+            moved, moved_attempts = self.ArchiveRepo.archive_instances(ids)
+            instances += moved
+            attempts += moved_attempts
+            logger.info(f"Archivage : {instances} instances déplacées...")
+
+        # 2. Tentatives anciennes dont l'instance reste en place
+        while True:
+            ids = self.ArchiveRepo.get_old_match_attempt_ids(cutoff, self.batch_size)
+            if not ids:
+                break
+            attempts += self.ArchiveRepo.archive_match_attempts(ids)
+
+        logger.info(f"Archivage avant {cutoff:%Y-%m-%d} : {instances} instances, {attempts} tentatives.")
+        return {"cutoff": cutoff, "instances": instances, "match_attempts": attempts}
+
+    # ============================================
+    # DRY-RUN
+    # ============================================
+
+    def report(self, now: Optional[datetime] = None) -> dict:
+        """Ce que run() déplacerait, sans rien modifier.
+
+        Returns:
+            {"cutoff": ..., "task_instances": {"total": 1000000, "archivable": 420000,
+             "bytes": 98000000}, "match_attempts": {...}}
+            "bytes" n'est estimé que sur MySQL (None ailleurs).
+        """
+        cutoff = self.cutoff(now)
+        repo = self.ArchiveRepo
+
+        report = {"cutoff": cutoff}
+        for table, archivable in (
+            (TaskInstance.__table__, repo.count_archivable_instances(cutoff)),
+            (MatchAttempt.__table__, repo.count_archivable_match_attempts(cutoff)),
+        ):
+            row_length = repo.get_avg_row_length(table.name)
+            report[table.name] = {
+                "total": repo.count_rows(table),
+                "archivable": archivable,
+                "bytes": archivable * row_length if row_length is not None else None,
+            }
+        return report
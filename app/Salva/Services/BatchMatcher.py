@@ -0,0 +1,205 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import math
+import os
+
+import numpy as np
+from scipy import sparse
+from sqlmodel import Session
+
+from Salva.models import normalize_title
+from Salva.Repository.Templates import TemplateTitle
+from Salva.Services.Matcher import Matcher
+
+logger = logging.getLogger(__name__)
+
+# Score (cosinus TF-IDF) à partir duquel une instance est liée à un template.
+# Plus bas que MATCH_THRESHOLD : le cosinus pénalise davantage un mot en plus
+BATCH_MATCH_THRESHOLD = float(os.getenv("BATCH_MATCH_THRESHOLD", 0.75))
+# Events importés par une sync à partir desquels SyncPool passe au matching vectorisé
+BATCH_MATCH_MIN_IMPORTED = int(os.getenv("BATCH_MATCH_MIN_IMPORTED", 1000))
+# Taille des n-grammes de caractères
+NGRAM_SIZE = int(os.getenv("BATCH_MATCH_NGRAM", 3))
+# Cellules (titres × templates) de la matrice dense calculée à la fois
+BATCH_MATCH_BLOCK = int(os.getenv("BATCH_MATCH_BLOCK", 4_000_000))
+
+
+def char_ngrams(normalized: str, n: int = NGRAM_SIZE) -> List[str]:
+    """N-grammes de caractères d'un titre, bornes de mots comprises (" yoga " → " yo", "yog", ...)."""
+    padded = f" {normalized} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+# ============================================
+# VECTORISATION
+# ============================================
+
+class NgramVectorizer:
+    """Vecteurs TF-IDF creux des n-grammes de caractères, normalisés (L2).
+
+    Le vocabulaire et les IDF sont appris une fois sur les templates (fit) ;
+    les titres des instances sont ensuite encodés sur ce vocabulaire
+    (transform) : le vecteur d'un titre ne dépend pas du paquet où il tombe,
+    et le produit d'une instance par un template est leur cosinus.
+    """
+
+    def __init__(self, n: int = NGRAM_SIZE):
+        self.n = n
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+        # IDF d'un n-gramme absent des templates (df = 0)
+        self.unknown_idf = 1.0
+
+    def fit(self, titles: List[str]) -> sparse.csr_matrix:
+        """Apprend vocabulaire et IDF sur `titles` et renvoie leurs vecteurs."""
+        self.vocabulary = {}
+        size, rows, cols, values = self._count(titles, grow=True)
+        width = len(self.vocabulary)
+        matrix = sparse.csr_matrix((values, (rows, cols)), shape=(size, width), dtype=np.float32)
+
+        # IDF lissé, comme scikit-learn : log((1 + N) / (1 + df)) + 1
+        df = np.bincount(matrix.indices, minlength=width)
+        self.idf = (np.log((1 + size) / (1 + df)) + 1).astype(np.float32)
+        self.unknown_idf = float(np.log(1 + size) + 1)
+        return self._weight(matrix, np.zeros(size, dtype=np.float32))
+
+    def transform(self, titles: List[str]) -> sparse.csr_matrix:
+        """Vecteurs de `titles` sur le vocabulaire appris.
+
+        Les n-grammes inconnus n'ont pas de colonne (ils ne changent aucun
+        produit) mais comptent dans la norme : un titre fait surtout de
+        n-grammes absents des templates garde un cosinus bas.
+        """
+        size, rows, cols, values = self._count(titles, grow=False)
+        unknown = np.zeros(size, dtype=np.float32)
+        kept = [position for position, col in enumerate(cols) if col is not None]
+        for position, col in enumerate(cols):
+            if col is None:
+                unknown[rows[position]] += (values[position] * self.unknown_idf) ** 2
+        matrix = sparse.csr_matrix(
+            ([values[p] for p in kept], ([rows[p] for p in kept], [cols[p] for p in kept])),
+            shape=(size, len(self.vocabulary)),
+            dtype=np.float32,
+        )
+        return self._weight(matrix, unknown)
+
+    def _count(self, titles: List[str], grow: bool) -> Tuple[int, list, list, list]:
+        rows, cols, values = [], [], []
+        for row, title in enumerate(titles):
+            for gram, count in Counter(char_ngrams(title, self.n)).items():
+                rows.append(row)
+                if grow:
+                    cols.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                else:
+                    cols.append(self.vocabulary.get(gram))
+                # TF sous-linéaire : un n-gramme répété ne domine pas le titre
+                values.append(1 + math.log(count))
+        return len(titles), rows, cols, values
+
+    def _weight(self, matrix: sparse.csr_matrix, unknown: np.ndarray) -> sparse.csr_matrix:
+        """Pondère par l'IDF et normalise ; `unknown` : carré de la norme hors vocabulaire, par ligne."""
+        matrix.data *= self.idf[matrix.indices]
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel() + unknown)
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Les k meilleures colonnes de chaque ligne, par score décroissant.
+
+    Returns:
+        (positions, scores), deux tableaux (lignes × k)
+    """
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        positions = np.broadcast_to(np.arange(k), scores.shape).copy()
+    best = np.take_along_axis(scores, positions, axis=1)
+    order = np.argsort(-best, axis=1, kind="stable")
+    return np.take_along_axis(positions, order, axis=1), np.take_along_axis(best, order, axis=1)
+
+
+class TemplateMatrix:
+    """Templates d'un run encodés une fois : vocabulaire, IDF et matrice (n-grammes × templates)."""
+
+    def __init__(self, templates: List[TemplateTitle]):
+        self.ids = [template.id for template in templates]
+        titles = [template.normalized_title or normalize_title(template.title) for template in templates]
+        self.exact: Dict[str, int] = {}
+        for position, normalized in enumerate(titles):
+            self.exact.setdefault(normalized, position)
+
+        self.vectorizer = NgramVectorizer()
+        self.matrix = self.vectorizer.fit(titles).T.tocsc()
+
+
+# ============================================
+# MATCHING PAR LOT
+# ============================================
+
+class BatchMatcher(Matcher):
+    """Matching FUZZY vectorisé, pour les gros volumes (rattrapage après un import).
+
+    Les templates sont encodés une fois par run en vecteurs TF-IDF de n-grammes
+    de caractères (TemplateMatrix) ; chaque paquet n'encode que ses titres
+    distincts, et les similarités sortent d'un produit matriciel creux (par
+    blocs de lignes), avec un top-k par ligne.
+    L'écriture (tentatives, MATCHED / ORPHAN) est celle de Matcher.
+
+    Le score est un cosinus, pas le score de Matcher : seuil propre
+    (BATCH_MATCH_THRESHOLD).
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        super().__init__(
+            session,
+            threshold=threshold if threshold is not None else BATCH_MATCH_THRESHOLD,
+            top_k=top_k,
+            batch_size=batch_size,
+        )
+        # (templates, TemplateMatrix) du dernier appel à rank_titles
+        self._reference: Optional[Tuple[List[TemplateTitle], TemplateMatrix]] = None
+
+    def rank_titles(self, templates: List[TemplateTitle], titles: Iterable[str]) -> Dict[str, List[Tuple[int, float, dict]]]:
+        titles = list(titles)
+        if not templates or not titles:
+            return {normalized: [] for normalized in titles}
+
+        # Appelé à chaque paquet avec la même liste : templates encodés une fois par run
+        if self._reference is None or self._reference[0] is not templates:
+            self._reference = (templates, TemplateMatrix(templates))
+        reference = self._reference[1]
+
+        pending = reference.vectorizer.transform(titles)
+        ranked = {}
+        rows_per_block = max(1, BATCH_MATCH_BLOCK // len(templates))
+        for start in range(0, len(titles), rows_per_block):
+            block = titles[start:start + rows_per_block]
+            scores = pending[start:start + rows_per_block].dot(reference.matrix).toarray()
+            positions, best = top_k(scores, self.top_k)
+
+            for row, normalized in enumerate(block):
+                # Titre identique à un template : même raccourci que Matcher.rank
+                position = reference.exact.get(normalized)
+                if position is not None:
+                    ranked[normalized] = [(reference.ids[position], 1.0, {"exact": True})]
+                    continue
+
+                ranked[normalized] = [
+                    (reference.ids[p], float(score), {"tfidf": round(float(score), 4)})
+                    for p, score in zip(positions[row], best[row])
+                    if score > 0
+                ]
+
+        logger.debug(f"Matching vectorisé : {len(titles)} titres × {len(templates)} templates.")
+        return ranked
@@ -0,0 +1,323 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import logging
+import os
+import time
+
+import requests
+
+from Salva.models import TaskTemplate, TimePreference, UserPreferences
+from Salva.Services.Ollama import Ollama
+from Salva.Services.TimeSlot import TimeSlot
+
+logger = logging.getLogger(__name__)
+
+# Fenêtres (minutes depuis minuit) de chaque préférence horaire
+PREFERENCE_WINDOWS: Dict[TimePreference, Tuple[int, int]] = {
+    TimePreference.MORNING: (6 * 60, 12 * 60),
+    TimePreference.AFTERNOON: (12 * 60, 18 * 60),
+    TimePreference.EVENING: (18 * 60, 23 * 60),
+    TimePreference.ANYTIME: (0, 24 * 60),
+}
+# Pas des horaires proposés (minutes) : 15 → 9:00, 9:15, 9:30...
+PLANNER_STEP_MINUTES = int(os.getenv("PLANNER_STEP_MINUTES", 15))
+# Positions essayées au plus par recherche avant d'abandonner (borne le backtracking)
+PLANNER_MAX_NODES = int(os.getenv("PLANNER_MAX_NODES", 20000))
+
+Interval = Tuple[int, int]
+
+
+def parse_minutes(value: str) -> int:
+    """'9:30', '9h30', '9h' ou '9' → minutes depuis minuit (formats de TimeSlot)."""
+    value = str(value).strip().lower()
+    separator = ":" if ":" in value else "h" if "h" in value else None
+    if separator is None:
+        return int(value) * 60
+    hours, _, minutes = value.partition(separator)
+    return int(hours) * 60 + (int(minutes) if minutes else 0)
+
+
+def format_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def subtract(intervals: List[Interval], blocks: List[Interval]) -> List[Interval]:
+    """Parties des intervalles (triés, disjoints) qui ne touchent aucun bloc."""
+    result = []
+    for start, end in intervals:
+        pieces = [(start, end)]
+        for block_start, block_end in blocks:
+            pieces = [
+                piece
+                for piece_start, piece_end in pieces
+                for piece in ((piece_start, min(piece_end, block_start)), (max(piece_start, block_end), piece_end))
+                if piece[1] > piece[0]
+            ]
+        result.extend(pieces)
+    return sorted(result)
+
+
+class _Task(NamedTuple):
+    position: int
+    template: TaskTemplate
+    duration: int
+    priority: int
+    # Débuts possibles (minutes), du plus tôt au plus tard
+    starts: List[int]
+
+
+class DayPlanner:
+    """Place les tâches d'une journée dans les créneaux libres, sans LLM.
+
+    Contraintes, tirées de UserPreferences et des templates :
+        - créneaux libres de TimeSlot, moins les heures de travail les jours travaillés
+        - buffer_between_tasks_minutes autour des events existants et entre tâches
+        - fenêtre de time_preference (matin, après-midi, soir, n'importe quand)
+        - au plus max_tasks_per_day tâches, par priorité décroissante (5 d'abord)
+
+    Les tâches sont ajoutées une à une par priorité ; à chaque ajout, une
+    recherche en profondeur (la tâche la plus contrainte d'abord, retour
+    arrière si une position bloque la suite) peut redéplacer celles déjà
+    placées. Le résultat est déterministe : mêmes entrées, même planning.
+
+    Le LLM (Ollama.generate_schedule) n'est sollicité, par plan_with_llm, que
+    pour les tâches sans solution ici.
+    """
+
+    def __init__(
+        self,
+        preferences: Optional[UserPreferences] = None,
+        step: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+    ):
+        self.preferences = preferences or UserPreferences()
+        self.step = step or PLANNER_STEP_MINUTES
+        self.max_nodes = max_nodes or PLANNER_MAX_NODES
+
+    # ============================================
+    # PLANIFICATION
+    # ============================================
+
+    def plan(self, day: date, slots: TimeSlot, templates: List[TaskTemplate], already_planned: int = 0) -> dict:
+        """Planifie les templates sur la journée `day` (horaires en UTC, comme ScheduleEvent).
+
+        Args:
+            slots: TimeSlot dont calcul_time_unable a déjà été appelé
+            already_planned: tâches déjà au planning du jour (comptent dans max_tasks_per_day)
+
+        Returns:
+            {"tasks": [...] (format de generate_schedule), "reasoning": "...",
+             "unresolved": [templates sans créneau], "skipped": [templates au-delà du quota],
+             "free_slots": [{"Début": "20:15", "Fin": "23:00"}, ...] (créneaux encore utilisables)}
+        """
+        started = time.perf_counter()
+        free = self.free_intervals(day, slots)
+        buffer = self.preferences.buffer_between_tasks_minutes
+
+        # Quota : les plus prioritaires d'abord, l'ordre d'entrée départage
+        by_priority = sorted(enumerate(templates), key=lambda item: (-(item[1].priority or 3), item[0]))
+        quota = max(0, self.preferences.max_tasks_per_day - already_planned)
+        candidates, skipped = by_priority[:quota], [template for _, template in by_priority[quota:]]
+
+        accepted: List[_Task] = []
+        assignment: Dict[int, int] = {}
+        unresolved = []
+        for position, template in candidates:
+            task = self._task(position, template, free)
+            solution = self._search(accepted + [task], buffer) if task.starts else None
+            if solution is None:
+                unresolved.append(template)
+                continue
+            accepted.append(task)
+            assignment = solution
+
+        placed = sorted(accepted, key=lambda task: assignment[task.position])
+        tasks = [self._task_row(day, task.template, assignment[task.position], task.duration) for task in placed]
+        used = [(assignment[task.position] - buffer, assignment[task.position] + task.duration + buffer) for task in placed]
+        remaining = subtract(free, used)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Planificateur {day} : {len(tasks)} placées, {len(unresolved)} sans créneau, "
+            f"{len(skipped)} hors quota ({elapsed:.1f} ms)."
+        )
+        return {
+            "tasks": tasks,
+            "reasoning": (
+                f"{len(tasks)} tâche(s) placée(s) par le planificateur ; {len(unresolved)} sans créneau compatible ; "
+                f"{len(skipped)} au-delà de max_tasks_per_day."
+            ),
+            "unresolved": unresolved,
+            "skipped": skipped,
+            "free_slots": [{"Début": format_minutes(start), "Fin": format_minutes(end)} for start, end in remaining],
+        }
+
+    def free_intervals(self, day: date, slots: TimeSlot) -> List[Interval]:
+        """Créneaux libres (minutes), heures de travail retirées, buffer appliqué côté events."""
+        if not hasattr(slots, "available_slots"):
+            raise ValueError("TimeSlot.calcul_time_unable doit être appelé avant la planification")
+
+        try:
+            day_start = parse_minutes(slots.start_day)
+        except (TypeError, ValueError):
+            day_start = 0
+        try:
+            day_end = parse_minutes(slots.end_day)
+        except (TypeError, ValueError):
+            day_end = 24 * 60
+
+        free = sorted((parse_minutes(slot["Début"]), parse_minutes(slot["Fin"])) for slot in slots.available_slots)
+        if day.isoweekday() in self.preferences.work_days:
+            work = (parse_minutes(self.preferences.work_hours_start), parse_minutes(self.preferences.work_hours_end))
+            free = subtract(free, [work])
+
+        # Un bord de créneau qui n'est pas une borne de la journée touche un event (ou le travail)
+        buffer = self.preferences.buffer_between_tasks_minutes
+        shrunk = []
+        for start, end in free:
+            start = start if start <= day_start else start + buffer
+            end = end if end >= day_end else end - buffer
+            if end > start:
+                shrunk.append((start, end))
+        return shrunk
+
+    def _task(self, position: int, template: TaskTemplate, free: List[Interval]) -> _Task:
+        duration = template.estimated_duration or self.preferences.default_task_duration_minutes
+        window_start, window_end = PREFERENCE_WINDOWS[template.time_preference or TimePreference.ANYTIME]
+
+        starts = []
+        for start, end in free:
+            start, end = max(start, window_start), min(end, window_end)
+            # Premier horaire « rond » du créneau
+            first = -(-start // self.step) * self.step
+            starts.extend(range(first, end - duration + 1, self.step))
+        return _Task(position, template, duration, template.priority or 3, starts)
+
+    def _search(self, tasks: List[_Task], buffer: int) -> Optional[Dict[int, int]]:
+        """Une position par tâche, sans chevauchement (buffer compris), ou None.
+
+        Returns:
+            {position du template: début en minutes}
+        """
+        # La tâche qui a le moins de positions possibles d'abord : les impasses apparaissent tôt
+        order = sorted(tasks, key=lambda task: (len(task.starts), -task.priority, task.position))
+        placed: List[Interval] = []
+        assignment: Dict[int, int] = {}
+        nodes = 0
+
+        def place(depth: int) -> bool:
+            nonlocal nodes
+            if depth == len(order):
+                return True
+            task = order[depth]
+            for start in task.starts:
+                nodes += 1
+                if nodes > self.max_nodes:
+                    return False
+                end = start + task.duration
+                if any(start < other_end + buffer and other_start < end + buffer for other_start, other_end in placed):
+                    continue
+                placed.append((start, end))
+                assignment[task.position] = start
+                if place(depth + 1):
+                    return True
+                placed.pop()
+            return False
+
+        return dict(assignment) if place(0) else None
+
+    @staticmethod
+    def _task_row(day: date, template: TaskTemplate, start: int, duration: int) -> dict:
+        scheduled_start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc) + timedelta(minutes=start)
+        return {
+            "title": template.title,
+            "template_id": template.id,
+            "scheduled_start": scheduled_start.isoformat(),
+            "scheduled_end": (scheduled_start + timedelta(minutes=duration)).isoformat(),
+            "description": template.description,
+            "priority": template.priority,
+        }
+
+    # ============================================
+    # REPLI SUR LE LLM
+    # ============================================
+
+    def plan_with_llm(
+        self,
+        day: date,
+        slots: TimeSlot,
+        templates: List[TaskTemplate],
+        context: dict,
+        llm: Optional[Ollama] = None,
+        already_planned: int = 0,
+    ) -> dict:
+        """plan, puis generate_schedule seulement pour les tâches restées sans créneau.
+
+        Le LLM ne voit que les créneaux encore libres ; ses propositions sont
+        vérifiées (template attendu, durée du template dans un créneau libre)
+        avant d'être ajoutées, sinon la tâche reste dans "unresolved".
+
+        Args:
+            context: contexte de generate_schedule (Day_date, week_day, existing_events...)
+        """
+        result = self.plan(day, slots, templates, already_planned)
+        if not result["unresolved"]:
+            return result
+
+        llm_context = {
+            **context,
+            "time_unabled": result["free_slots"],
+            "tasks_to_place": [
+                {
+                    "template_id": template.id,
+                    "title": template.title,
+                    "duration": template.estimated_duration or self.preferences.default_task_duration_minutes,
+                    "time_preference": (template.time_preference or TimePreference.ANYTIME).value,
+                    "priority": template.priority,
+                }
+                for template in result["unresolved"]
+            ],
+        }
+        try:
+            proposal = (llm or Ollama()).generate_schedule(llm_context, mode="day")
+        except requests.RequestException as e:
+            logger.warning(f"Planificateur : LLM indisponible ({e}), {len(result['unresolved'])} tâches non placées.")
+            return result
+
+        free = [(parse_minutes(slot["Début"]), parse_minutes(slot["Fin"])) for slot in result["free_slots"]]
+        pending = {template.id: template for template in result["unresolved"]}
+        buffer = self.preferences.buffer_between_tasks_minutes
+        added = []
+        for row in (proposal or {}).get("tasks", []):
+            template = pending.get(row.get("template_id")) if isinstance(row, dict) else None
+            start = self._proposed_start(day, row) if template is not None else None
+            if start is None:
+                continue
+            # La durée reste celle du template, quelle que soit la fin proposée
+            end = start + (template.estimated_duration or self.preferences.default_task_duration_minutes)
+            if not any(free_start <= start and end <= free_end for free_start, free_end in free):
+                continue
+            added.append(self._task_row(day, template, start, end - start))
+            free = subtract(free, [(start - buffer, end + buffer)])
+            del pending[template.id]
+
+        logger.info(f"Planificateur {day} : {len(added)}/{len(result['unresolved'])} tâches placées par le LLM.")
+        result["tasks"] = sorted(result["tasks"] + added, key=lambda task: task["scheduled_start"])
+        result["unresolved"] = list(pending.values())
+        result["free_slots"] = [{"Début": format_minutes(start), "Fin": format_minutes(end)} for start, end in free]
+        if added and proposal.get("reasoning"):
+            result["reasoning"] += f" LLM : {proposal['reasoning']}"
+        return result
+
+    @staticmethod
+    def _proposed_start(day: date, row: dict) -> Optional[int]:
+        """Début (minutes) d'une tâche proposée par le LLM, s'il tombe bien le jour `day`."""
+        try:
+            start = datetime.fromisoformat(row["scheduled_start"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        # Sans fuseau : UTC, comme le reste du planning
+        start = start.replace(tzinfo=timezone.utc) if start.tzinfo is None else start.astimezone(timezone.utc)
+        if start.date() != day:
+            return None
+        return start.hour * 60 + start.minute
@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import os
+
+from sqlmodel import Session
+
+from Salva.models import MatchMethod, normalize_title
+from Salva.Repository.Templates import TemplateTitle
+from Salva.Services.Matcher import Matcher
+from Salva.Services.BatchMatcher import top_k, BATCH_MATCH_BLOCK
+from Salva.Services.Embeddings import OllamaEmbedder, EmbeddingStore, embed_missing
+
+logger = logging.getLogger(__name__)
+
+# Cosinus à partir duquel une instance est liée à un template
+EMBEDDING_MATCH_THRESHOLD = float(os.getenv("EMBEDDING_MATCH_THRESHOLD", 0.80))
+
+
+class EmbeddingMatcher(Matcher):
+    """Matching sémantique (méthode EMBEDDING) : cosinus entre embeddings Ollama.
+
+    Chaque titre normalisé distinct n'est envoyé qu'une fois à Ollama : les
+    vecteurs sont gardés dans un EmbeddingStore sur disque, et un nouveau
+    passage sur des titres déjà vus n'émet aucune requête. La recherche est
+    exhaustive (produit matriciel titres × templates, top-k par ligne).
+    """
+
+    method = MatchMethod.EMBEDDING
+
+    def __init__(
+        self,
+        session: Session,
+        store: Optional[EmbeddingStore] = None,
+        embedder: Optional[OllamaEmbedder] = None,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        super().__init__(
+            session,
+            threshold=threshold if threshold is not None else EMBEDDING_MATCH_THRESHOLD,
+            top_k=top_k,
+            batch_size=batch_size,
+        )
+        self.embedder = embedder or OllamaEmbedder()
+        # Un store vide est faux (__len__) : test explicite
+        self.store = store if store is not None else EmbeddingStore(self.embedder.model)
+        # (templates, ids, {titre: position}, vecteurs transposés) du run en cours
+        self._reference: Optional[tuple] = None
+
+    def embed_missing(self, titles: Iterable[str]) -> int:
+        return embed_missing(self.store, self.embedder, titles)
+
+    def rank_titles(self, templates: List[TemplateTitle], titles: Iterable[str]) -> Dict[str, List[Tuple[int, float, dict]]]:
+        titles = list(titles)
+        if not templates or not titles:
+            return {normalized: [] for normalized in titles}
+
+        # Appelé à chaque paquet avec la même liste : templates vectorisés une fois par run
+        if self._reference is None or self._reference[0] is not templates:
+            self._reference = (templates, *self._encode_templates(templates))
+        _, template_ids, exact, reference = self._reference
+
+        self.embed_missing(titles)
+
+        ranked = {}
+        rows_per_block = max(1, BATCH_MATCH_BLOCK // len(templates))
+        for start in range(0, len(titles), rows_per_block):
+            block = titles[start:start + rows_per_block]
+            positions, best = top_k(self.store.vectors(block) @ reference, self.top_k)
+
+            for row, normalized in enumerate(block):
+                position = exact.get(normalized)
+                if position is not None:
+                    ranked[normalized] = [(template_ids[position], 1.0, {"exact": True})]
+                    continue
+
+                # Le cosinus peut être négatif ; MatchAttempt.score est dans [0, 1]
+                ranked[normalized] = [
+                    (template_ids[p], min(1.0, max(0.0, float(score))), {"cosine": round(float(score), 4), "model": self.store.model})
+                    for p, score in zip(positions[row], best[row])
+                ]
+
+        return ranked
+
+    def _encode_templates(self, templates: List[TemplateTitle]) -> tuple:
+        """(ids, {titre normalisé: position}, vecteurs transposés) des templates."""
+        template_ids = [template.id for template in templates]
+        template_titles = [template.normalized_title or normalize_title(template.title) for template in templates]
+        exact = {}
+        for position, normalized in enumerate(template_titles):
+            exact.setdefault(normalized, position)
+
+        self.embed_missing(template_titles)
+        return template_ids, exact, self.store.vectors(template_titles).T
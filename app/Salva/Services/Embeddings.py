@@ -0,0 +1,233 @@
+from typing import Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+import requests
+
+from Salva.Services.Ollama import OLLAMA_URL
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+# Titres envoyés par requête /api/embed
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+# Dossier des vecteurs (un fichier par modèle)
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "embeddings")
+
+# Un verrou par fichier : les threads de SyncPool partagent le même store
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Vecteurs de norme 1 : le produit scalaire devient le cosinus."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def embed_missing(store: "EmbeddingStore", embedder: "OllamaEmbedder", titles: Iterable[str]) -> int:
+    """Calcule et stocke les embeddings des titres encore inconnus du store.
+
+    Returns:
+        nombre de titres envoyés à Ollama
+    """
+    missing = store.missing(titles)
+    if missing:
+        store.add(missing, embedder.embed(missing))
+        logger.info(f"Embeddings : {len(missing)} nouveaux titres ({len(store)} en cache).")
+    return len(missing)
+
+
+# ============================================
+# CLIENT OLLAMA
+# ============================================
+
+class OllamaEmbedder:
+    """Calcule des embeddings avec le serveur Ollama local, par lots.
+
+    Utilise /api/embed (plusieurs textes par requête) ; un serveur trop ancien
+    qui ne le connaît pas est interrogé texte par texte sur /api/embeddings.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE, url: str = OLLAMA_URL):
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.model = model
+        self.batch_size = batch_size
+        self.url = url.rstrip("/")
+        # Requêtes HTTP envoyées depuis la création
+        self.requests = 0
+        self._legacy = False
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embeddings de `texts`, dans l'ordre (tableau float32 textes × dimension)."""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            vectors.extend(self._embed_legacy(batch) if self._legacy else self._embed_batch(batch))
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        resp = self.session.post(f"{self.url}/api/embed", json={"model": self.model, "input": texts}, timeout=120)
+        if resp.status_code == 404 and "model" not in resp.text.lower():
+            logger.warning("Ollama sans /api/embed : repli sur /api/embeddings (un titre par requête).")
+            self._legacy = True
+            return self._embed_legacy(texts)
+        resp.raise_for_status()
+        return resp.json()["embeddings"]
+
+    def _embed_legacy(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            self.requests += 1
+            resp = self.session.post(f"{self.url}/api/embeddings", json={"model": self.model, "prompt": text}, timeout=120)
+            resp.raise_for_status()
+            vectors.append(resp.json()["embedding"])
+        return vectors
+
+
+# ============================================
+# STOCKAGE SUR DISQUE
+# ============================================
+
+class EmbeddingStore:
+    """Vecteurs d'embedding persistés, indexés par (modèle, titre normalisé).
+
+    Trois fichiers par modèle dans `directory` :
+        - <modèle>.f32   : vecteurs float32 (normés) bout à bout, lus en memmap
+        - <modèle>.keys  : un titre par ligne (JSON), la ligne i ↔ le vecteur i
+        - <modèle>.json  : {"model": ..., "dim": ...}
+    Les fichiers ne font que grandir : un titre n'est jamais calculé deux fois.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL, directory: str = EMBEDDING_STORE_DIR):
+        self.model = model
+        slug = re.sub(r"[^\w.-]+", "_", model)
+        self.vectors_path = os.path.join(directory, f"{slug}.f32")
+        self.keys_path = os.path.join(directory, f"{slug}.keys")
+        self.meta_path = os.path.join(directory, f"{slug}.json")
+        self.directory = directory
+        self._lock = _lock_for(self.vectors_path)
+
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        # (taille, mtime) des fichiers au dernier chargement ou à notre dernière écriture
+        self._signature: Optional[tuple] = None
+        # Fichiers de même longueur au dernier chargement (pas de reste à tronquer)
+        self._consistent = True
+        with self._lock:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, title: str) -> bool:
+        return title in self.rows
+
+    def _file_signature(self) -> tuple:
+        signature = []
+        for path in (self.meta_path, self.keys_path, self.vectors_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh(self) -> None:
+        """Relit les fichiers seulement si un autre store les a modifiés."""
+        if self._file_signature() != self._signature:
+            self._load()
+
+    def _load(self) -> None:
+        self._signature = self._file_signature()
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, encoding="utf-8") as f:
+                keys = [json.loads(line) for line in f if line.strip()]
+
+        # Une écriture interrompue peut laisser un fichier plus long que l'autre
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        count = min(len(keys), size // (4 * self.dim))
+        self._consistent = len(keys) == count and size == count * 4 * self.dim
+        self.rows = {key: row for row, key in enumerate(keys[:count])}
+        self._map(count)
+
+    def _map(self, count: int) -> None:
+        self._vectors = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim)) if count else None
+        )
+
+    def missing(self, titles: Iterable[str]) -> List[str]:
+        """Titres distincts sans vecteur, dans l'ordre de première apparition."""
+        return [title for title in dict.fromkeys(titles) if title not in self.rows]
+
+    def vectors(self, titles: List[str]) -> np.ndarray:
+        """Vecteurs (normés) de titres déjà présents, dans l'ordre."""
+        if not titles:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self._vectors[[self.rows[title] for title in titles]])
+
+    def add(self, titles: List[str], vectors: np.ndarray) -> None:
+        """Ajoute des vecteurs à la fin des fichiers (les titres déjà connus sont ignorés)."""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            # Un autre store sur les mêmes fichiers a pu écrire entre-temps
+            self._refresh()
+            if self.dim is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Dimension {vectors.shape[1]} ≠ {self.dim} pour le modèle {self.model}")
+
+            new = {}
+            for row, title in enumerate(titles):
+                if title not in self.rows and title not in new:
+                    new[title] = row
+            if not new:
+                return
+
+            if not self._consistent:
+                self._truncate(len(self.rows))
+                self._consistent = True
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors[list(new.values())].tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(title, ensure_ascii=False) + "\n" for title in new)
+
+            # Nos propres lignes : ajoutées en place, sans relire les fichiers
+            for title in new:
+                self.rows[title] = len(self.rows)
+            self._map(len(self.rows))
+            self._signature = self._file_signature()
+
+    def _truncate(self, count: int) -> None:
+        """Ramène les deux fichiers à `count` lignes (reste d'une écriture interrompue)."""
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != count * 4 * self.dim:
+            os.truncate(self.vectors_path, count * 4 * self.dim)
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+            if len(lines) != count:
+                with open(self.keys_path, "w", encoding="utf-8") as f:
+                    f.writelines(lines[:count])
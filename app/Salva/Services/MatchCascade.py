@@ -0,0 +1,280 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+import math
+import os
+import time
+
+import requests
+from pydantic import BaseModel, Field, model_validator
+from sqlmodel import Session
+
+from Salva.models import MatchMethod, normalize_title
+from Salva.Repository.Templates import TemplateTitle
+from Salva.Services.Matcher import Matcher, MATCH_THRESHOLD
+from Salva.Services.Embeddings import OllamaEmbedder, EmbeddingStore, embed_missing
+from Salva.Services.Ollama import Ollama
+
+logger = logging.getLogger(__name__)
+
+# SyncPool passe par la cascade (nécessite Ollama) plutôt que par le seul fuzzy
+MATCH_CASCADE = os.getenv("MATCH_CASCADE", "0") == "1"
+
+TIERS = ("fuzzy", "embedding", "llm")
+
+
+class CascadeThresholds(BaseModel):
+    """Seuils de la cascade (validation Pydantic), surchargeables par l'environnement.
+
+    Pour chaque palier, un score au-dessus de *_accept lie l'instance, un score
+    sous *_reject la laisse ORPHAN ; entre les deux, le palier suivant tranche.
+    """
+
+    fuzzy_accept: float = Field(default=float(os.getenv("CASCADE_FUZZY_ACCEPT", MATCH_THRESHOLD)), ge=0, le=1)
+    fuzzy_reject: float = Field(default=float(os.getenv("CASCADE_FUZZY_REJECT", 0.55)), ge=0, le=1)
+    embedding_accept: float = Field(default=float(os.getenv("CASCADE_EMBEDDING_ACCEPT", 0.88)), ge=0, le=1)
+    embedding_reject: float = Field(default=float(os.getenv("CASCADE_EMBEDDING_REJECT", 0.60)), ge=0, le=1)
+    # Confiance minimale d'une décision du LLM
+    llm_min_confidence: float = Field(default=float(os.getenv("CASCADE_LLM_MIN_CONFIDENCE", 0.5)), ge=0, le=1)
+    # Instances ambiguës envoyées par prompt
+    llm_batch_size: int = Field(default=int(os.getenv("CASCADE_LLM_BATCH_SIZE", 20)), ge=1)
+
+    @model_validator(mode="after")
+    def validate_bands(self) -> "CascadeThresholds":
+        if self.fuzzy_reject > self.fuzzy_accept:
+            raise ValueError("fuzzy_reject doit être inférieur ou égal à fuzzy_accept")
+        if self.embedding_reject > self.embedding_accept:
+            raise ValueError("embedding_reject doit être inférieur ou égal à embedding_accept")
+        return self
+
+
+def _tier_stats() -> dict:
+    return {"in": 0, "accepted": 0, "rejected": 0, "ms": 0.0}
+
+
+def _parse_confidence(value) -> Optional[float]:
+    """Confiance renvoyée par le LLM, ramenée dans [0, 1] ; None si illisible."""
+    if value is None:
+        return 0.0
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(confidence):
+        return None
+    return min(1.0, max(0.0, confidence))
+
+
+class MatchCascade(Matcher):
+    """Matching en cascade, du moins cher au plus cher.
+
+        1. fuzzy (Matcher) sur tous les titres
+        2. embeddings, seulement pour les titres dans la bande d'incertitude du
+           fuzzy, et seulement contre leurs candidats fuzzy
+        3. LLM, pour ce qui reste ambigu : un prompt par lot de
+           llm_batch_size instances, réponse JSON structurée
+
+    Chaque MatchAttempt garde dans `details` le palier qui a tranché ("tier"),
+    les scores de chaque palier traversé et leur latence par titre (ms).
+    match_user renvoie en plus, par palier, les entrées, acceptations, rejets
+    et le temps total.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        thresholds: Optional[CascadeThresholds] = None,
+        store: Optional[EmbeddingStore] = None,
+        embedder: Optional[OllamaEmbedder] = None,
+        llm: Optional[Ollama] = None,
+        top_k: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.thresholds = thresholds or CascadeThresholds()
+        super().__init__(session, threshold=self.thresholds.fuzzy_accept, top_k=top_k, batch_size=batch_size)
+        self.embedder = embedder or OllamaEmbedder()
+        self.store = store if store is not None else EmbeddingStore(self.embedder.model)
+        self._llm = llm
+
+        # Titre normalisé → (accepté, méthode) ; rempli par rank_titles
+        self.decisions: Dict[str, Tuple[bool, MatchMethod]] = {}
+        self.tiers = {tier: _tier_stats() for tier in TIERS}
+        # (templates, {id: titre normalisé}, {id: titre affiché}) du run en cours
+        self._template_titles: Optional[Tuple[List[TemplateTitle], Dict[int, str], Dict[int, str]]] = None
+
+    @property
+    def llm(self) -> Ollama:
+        # Créé au premier lot ambigu seulement (pas de warm-up du modèle)
+        if self._llm is None:
+            self._llm = Ollama(warm=False)
+        return self._llm
+
+    def match_user(self, user_id: int, check_budget: Optional[Callable[[], None]] = None) -> dict:
+        """Comme Matcher.match_user, avec les statistiques par palier.
+
+        Returns:
+            {"matched": 120, "orphan": 30, "attempts": 410,
+             "tiers": {"fuzzy": {"in": 150, "accepted": 100, "rejected": 20, "ms": 85.2}, ...}}
+        """
+        self.decisions = {}
+        self.tiers = {tier: _tier_stats() for tier in TIERS}
+
+        stats = super().match_user(user_id, check_budget)
+        stats["tiers"] = self.tiers
+
+        for tier, tier_stats in self.tiers.items():
+            if tier_stats["in"]:
+                logger.info(
+                    f"Cascade {tier} : {tier_stats['accepted']}/{tier_stats['in']} liés, "
+                    f"{tier_stats['rejected']} rejetés, {tier_stats['ms']:.0f} ms."
+                )
+        return stats
+
+    def decide(self, normalized: str, ranked: List[Tuple[int, float, dict]]) -> Tuple[bool, MatchMethod]:
+        return self.decisions.get(normalized, (False, MatchMethod.FUZZY))
+
+    def rank_titles(self, templates: List[TemplateTitle], titles: Iterable[str]) -> Dict[str, List[Tuple[int, float, dict]]]:
+        titles = list(titles)
+        # Appelé à chaque paquet avec la même liste : dictionnaires construits une fois par run
+        if self._template_titles is None or self._template_titles[0] is not templates:
+            self._template_titles = (
+                templates,
+                {t.id: t.normalized_title or normalize_title(t.title) for t in templates},
+                {t.id: t.title for t in templates},
+            )
+        _, normalized_titles, display_titles = self._template_titles
+
+        # 1. Fuzzy sur tous les titres
+        started = time.perf_counter()
+        ranked = super().rank_titles(templates, titles)
+        elapsed = self._elapsed("fuzzy", len(titles), started)
+
+        uncertain = []
+        for normalized in titles:
+            ranked[normalized] = [
+                (template_id, score, {"tier": "fuzzy", "fuzzy": {**details, "ms": elapsed}})
+                for template_id, score, details in ranked[normalized]
+            ]
+            best = ranked[normalized][0][1] if ranked[normalized] else 0.0
+            if best >= self.thresholds.fuzzy_accept:
+                self._decide(normalized, "fuzzy", True, MatchMethod.FUZZY)
+            elif best < self.thresholds.fuzzy_reject:
+                self._decide(normalized, "fuzzy", False, MatchMethod.FUZZY)
+            else:
+                uncertain.append(normalized)
+
+        # 2. Embeddings sur la bande d'incertitude
+        ambiguous = self._embedding_tier(uncertain, ranked, normalized_titles) if uncertain else []
+
+        # 3. LLM sur ce qui reste, par lots
+        for start in range(0, len(ambiguous), self.thresholds.llm_batch_size):
+            self._llm_tier(ambiguous[start:start + self.thresholds.llm_batch_size], ranked, display_titles)
+
+        return ranked
+
+    # ============================================
+    # PALIERS
+    # ============================================
+
+    def _embedding_tier(self, uncertain: List[str], ranked: dict, normalized_titles: Dict[int, str]) -> List[str]:
+        """Re-score les candidats fuzzy par cosinus ; renvoie les titres encore ambigus."""
+        started = time.perf_counter()
+        needed = uncertain + [normalized_titles[template_id] for title in uncertain for template_id, _, _ in ranked[title]]
+        try:
+            embed_missing(self.store, self.embedder, needed)
+        except requests.RequestException as e:
+            logger.warning(f"Cascade : embeddings indisponibles ({e}), {len(uncertain)} titres laissés orphelins.")
+            for normalized in uncertain:
+                for _, _, details in ranked[normalized]:
+                    details["embedding"] = {"error": str(e)}
+                self._decide(normalized, "embedding", False, MatchMethod.FUZZY)
+            self._elapsed("embedding", len(uncertain), started)
+            return []
+
+        vectors = self.store.vectors(uncertain)
+        cosines_by_title = {}
+        for row, normalized in enumerate(uncertain):
+            candidates = ranked[normalized]
+            cosines = self.store.vectors([normalized_titles[template_id] for template_id, _, _ in candidates]) @ vectors[row]
+            cosines_by_title[normalized] = sorted(zip(candidates, cosines.tolist()), key=lambda item: item[1], reverse=True)
+        elapsed = self._elapsed("embedding", len(uncertain), started)
+
+        ambiguous = []
+        for normalized, rescored in cosines_by_title.items():
+            ranked[normalized] = [
+                (template_id, min(1.0, max(0.0, cosine)),
+                 {**details, "tier": "embedding", "embedding": {"cosine": round(cosine, 4), "ms": elapsed}})
+                for (template_id, _, details), cosine in rescored
+            ]
+            best = rescored[0][1]
+            if best >= self.thresholds.embedding_accept:
+                self._decide(normalized, "embedding", True, MatchMethod.EMBEDDING)
+            elif best < self.thresholds.embedding_reject:
+                self._decide(normalized, "embedding", False, MatchMethod.EMBEDDING)
+            else:
+                ambiguous.append(normalized)
+        return ambiguous
+
+    def _llm_tier(self, batch: List[str], ranked: dict, display_titles: Dict[int, str]) -> None:
+        """Un prompt pour tout le lot ; chaque titre est lié au candidat choisi ou laissé orphelin."""
+        items = [
+            {
+                "id": position,
+                "title": normalized,
+                "candidates": [{"template_id": template_id, "title": display_titles[template_id]} for template_id, _, _ in ranked[normalized]],
+            }
+            for position, normalized in enumerate(batch)
+        ]
+
+        started = time.perf_counter()
+        try:
+            response = self.llm.adjudicate_matches(items)
+        except requests.RequestException as e:
+            logger.warning(f"Cascade : LLM indisponible ({e}).")
+            response = None
+        elapsed = self._elapsed("llm", len(batch), started)
+
+        # Le JSON du modèle n'a pas forcément la forme demandée
+        listed = response.get("decisions") if isinstance(response, dict) else None
+        decisions = {}
+        for decision in listed if isinstance(listed, list) else []:
+            if isinstance(decision, dict) and isinstance(decision.get("id"), int):
+                confidence = _parse_confidence(decision.get("confidence"))
+                if confidence is not None:
+                    decisions[decision["id"]] = (decision.get("template_id"), confidence)
+
+        for position, normalized in enumerate(batch):
+            decision = decisions.get(position)
+            candidates = ranked[normalized]
+            if decision is None:
+                # Réponse absente ou illisible : l'instance reste orpheline
+                for _, _, details in candidates:
+                    details["llm"] = {"error": "pas de décision", "ms": elapsed, "batch": len(batch)}
+                self._decide(normalized, "llm", False, MatchMethod.LLM)
+                continue
+
+            chosen, confidence = decision
+            llm = {"template_id": chosen, "confidence": round(confidence, 4), "ms": elapsed, "batch": len(batch)}
+
+            # Le candidat retenu passe en tête, avec la confiance du LLM pour score
+            ordered = sorted(candidates, key=lambda candidate: candidate[0] != chosen)
+            ranked[normalized] = [
+                (template_id, confidence if template_id == chosen else score, {**details, "tier": "llm", "llm": llm})
+                for template_id, score, details in ordered
+            ]
+            accepted = any(template_id == chosen for template_id, _, _ in candidates) and confidence >= self.thresholds.llm_min_confidence
+            self._decide(normalized, "llm", accepted, MatchMethod.LLM)
+
+    # ============================================
+    # STATISTIQUES
+    # ============================================
+
+    def _decide(self, normalized: str, tier: str, accepted: bool, method: MatchMethod) -> None:
+        self.decisions[normalized] = (accepted, method)
+        self.tiers[tier]["accepted" if accepted else "rejected"] += 1
+
+    def _elapsed(self, tier: str, count: int, started: float) -> float:
+        """Ajoute le temps du palier à ses statistiques ; renvoie la latence par titre (ms)."""
+        ms = (time.perf_counter() - started) * 1000
+        self.tiers[tier]["in"] += count
+        self.tiers[tier]["ms"] += ms
+        return round(ms / count, 3) if count else 0.0
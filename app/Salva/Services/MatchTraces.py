@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional
+import logging
+import os
+import time
+
+from sqlmodel import Session
+
+from Salva.Repository.Match import MatchRepository
+
+logger = logging.getLogger(__name__)
+
+# Tentatives gardées en mémoire avant un INSERT groupé
+MATCH_TRACE_BUFFER_SIZE = int(os.getenv("MATCH_TRACE_BUFFER_SIZE", 5000))
+# Délai maximal (secondes) entre deux écritures, même tampon incomplet
+MATCH_TRACE_FLUSH_SECONDS = float(os.getenv("MATCH_TRACE_FLUSH_SECONDS", 10))
+
+
+class MatchTraceWriter:
+    """Tampon d'écriture des MatchAttempt.
+
+    Les tentatives s'accumulent en mémoire et partent en un INSERT multi-lignes
+    (MatchRepository.record_match_attempts) quand le tampon atteint
+    `buffer_size` lignes, quand `flush_seconds` se sont écoulées depuis la
+    dernière écriture, ou à la fin du run (flush / sortie du bloc `with`).
+
+    Avec `top_k`, seules les k meilleures tentatives de chaque instance
+    présentes dans le tampon sont gardées (la tentative acceptée d'abord).
+
+    Les traces sont écrites dans leur propre transaction, pas dans celle des
+    statuts : un run interrompu peut perdre le contenu du tampon, jamais une
+    décision de matching.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        top_k: Optional[int] = None,
+        buffer_size: Optional[int] = None,
+        flush_seconds: Optional[float] = None,
+    ):
+        self.MatchRepo = MatchRepository(session)
+        self.top_k = top_k
+        self.buffer_size = buffer_size or MATCH_TRACE_BUFFER_SIZE
+        self.flush_seconds = flush_seconds if flush_seconds is not None else MATCH_TRACE_FLUSH_SECONDS
+
+        # instance_id → tentatives en attente, de la meilleure à la moins bonne
+        self._pending: Dict[int, List[dict]] = {}
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        # Tentatives reçues / écrites / écartées par l'échantillonnage depuis la création
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._buffered
+
+    @property
+    def kept(self) -> int:
+        """Tentatives reçues et non écartées (écrites ou encore en tampon)."""
+        return self.received - self.dropped
+
+    def __enter__(self) -> "MatchTraceWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.flush()
+
+    def add(self, rows: List[dict]) -> None:
+        """Ajoute des tentatives (champs de MatchRepository.record_match_attempt)."""
+        for row in rows:
+            self.received += 1
+            kept = self._pending.setdefault(row["instance_id"], [])
+            kept.append(row)
+            self._buffered += 1
+
+            if self.top_k is not None and len(kept) > self.top_k:
+                kept.sort(key=lambda attempt: (attempt.get("accepted", False), attempt["score"]), reverse=True)
+                removed = len(kept) - self.top_k
+                del kept[self.top_k:]
+                self._buffered -= removed
+                self.dropped += removed
+
+        if self._buffered >= self.buffer_size or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> int:
+        """Écrit tout le tampon en un INSERT ; renvoie le nombre de lignes écrites."""
+        self._last_flush = time.monotonic()
+        if not self._buffered:
+            return 0
+
+        rows = [row for attempts in self._pending.values() for row in attempts]
+        self._pending = {}
+        self._buffered = 0
+
+        written = self.MatchRepo.record_match_attempts(rows)
+        self.written += written
+        logger.debug(f"Traces de matching : {written} tentatives écrites.")
+        return written
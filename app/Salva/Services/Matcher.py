@@ -0,0 +1,278 @@
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+import os
+
+from sqlmodel import Session
+
+from Salva.models import MatchMethod, normalize_title
+from Salva.Repository.Instances import InstancesRepository, chunked
+from Salva.Repository.Templates import TemplatesRepository, TemplateTitle
+from Salva.Services.MatchTraces import MatchTraceWriter
+
+logger = logging.getLogger(__name__)
+
+# Score à partir duquel une instance est liée à un template
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", 0.85))
+# Candidats scorés par instance, après élagage par l'index
+MATCH_MAX_CANDIDATES = int(os.getenv("MATCH_MAX_CANDIDATES", 30))
+# Tentatives enregistrées par instance (les meilleures)
+MATCH_ATTEMPTS_TOP_K = int(os.getenv("MATCH_ATTEMPTS_TOP_K", 3))
+# Instances traitées par transaction
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", 500))
+
+# Longueur du préfixe indexé en plus du token entier ("dentiste" → "dent"),
+# pour rapprocher pluriels et fautes de frappe en fin de mot
+PREFIX_LENGTH = 4
+
+
+def title_keys(normalized: str) -> set:
+    """Clés d'index d'un titre normalisé : ses tokens et leurs préfixes."""
+    keys = set()
+    for token in normalized.split():
+        keys.add(token)
+        if len(token) > PREFIX_LENGTH:
+            keys.add(token[:PREFIX_LENGTH] + "*")
+    return keys
+
+
+def token_set_ratio(a: str, b: str) -> float:
+    """Similarité insensible à l'ordre et aux mots en plus (à la thefuzz)."""
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    common = " ".join(sorted(tokens_a & tokens_b))
+    only_a = " ".join(sorted(tokens_a - tokens_b))
+    only_b = " ".join(sorted(tokens_b - tokens_a))
+
+    with_a = f"{common} {only_a}".strip()
+    with_b = f"{common} {only_b}".strip()
+    return max(
+        SequenceMatcher(None, common, with_a).ratio() if common else 0.0,
+        SequenceMatcher(None, common, with_b).ratio() if common else 0.0,
+        SequenceMatcher(None, with_a, with_b).ratio(),
+    )
+
+
+def similarity(a: str, b: str, matcher: Optional[SequenceMatcher] = None) -> Tuple[float, dict]:
+    """Score entre deux titres normalisés : moyenne du token-set et du ratio de caractères.
+
+    Le token-set seul vaut 1.0 dès qu'un titre est inclus dans l'autre
+    ("réunion" / "réunion budget") ; le ratio de caractères compense.
+    `matcher` peut déjà contenir `b` en seq2 (difflib y met son analyse en cache).
+
+    Returns:
+        (score, détails)
+    """
+    if matcher is None:
+        matcher = SequenceMatcher(None, a, b)
+    else:
+        matcher.set_seq1(a)
+    ratio = matcher.ratio()
+    token_set = token_set_ratio(a, b)
+    return (token_set + ratio) / 2, {"token_set": round(token_set, 4), "ratio": round(ratio, 4)}
+
+
+# ============================================
+# INDEX INVERSÉ DES TEMPLATES
+# ============================================
+
+class TemplateIndex:
+    """Index inversé des templates d'un utilisateur sur les tokens de normalized_title.
+
+    Seuls les templates qui partagent au moins une clé avec l'instance sont
+    scorés, les plus proches d'abord (clés rares pondérées plus fort).
+    """
+
+    def __init__(self, templates: List[TemplateTitle]):
+        self.ids: List[int] = []
+        self.titles: List[str] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        # Titre normalisé → position du premier template qui le porte
+        self.exact: Dict[str, int] = {}
+
+        for template in templates:
+            normalized = template.normalized_title or normalize_title(template.title)
+            position = len(self.ids)
+            self.ids.append(template.id)
+            self.titles.append(normalized)
+            self.exact.setdefault(normalized, position)
+            for key in title_keys(normalized):
+                self.postings[key].append(position)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def candidates(self, normalized: str, limit: int = MATCH_MAX_CANDIDATES) -> List[int]:
+        """Positions des templates à scorer pour ce titre, au plus `limit`."""
+        weights = Counter()
+        for key in title_keys(normalized):
+            posting = self.postings.get(key)
+            if posting:
+                # Une clé présente dans peu de templates départage mieux
+                weight = 1.0 / len(posting)
+                for position in posting:
+                    weights[position] += weight
+        return [position for position, _ in weights.most_common(limit)]
+
+
+# ============================================
+# MATCHING
+# ============================================
+
+class Matcher:
+    """Relie les instances PENDING d'un utilisateur à ses templates (méthode FUZZY).
+
+    Pour chaque instance :
+        - au-dessus de MATCH_THRESHOLD : MATCHED sur le meilleur template
+        - sinon : ORPHAN (repris ensuite par le clustering des orphelins)
+    Les MATCH_ATTEMPTS_TOP_K meilleurs candidats sont tracés dans MatchAttempt,
+    par un MatchTraceWriter (INSERT groupés, vidé à la fin du run).
+    """
+
+    # Méthode enregistrée dans MatchAttempt
+    method = MatchMethod.FUZZY
+
+    def __init__(
+        self,
+        session: Session,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.InsRepo = InstancesRepository(session)
+        self.TemRepo = TemplatesRepository(session)
+        self.threshold = threshold if threshold is not None else MATCH_THRESHOLD
+        self.top_k = top_k or MATCH_ATTEMPTS_TOP_K
+        self.traces = MatchTraceWriter(session, top_k=self.top_k)
+        self.batch_size = batch_size or MATCH_BATCH_SIZE
+        # (templates, index) du dernier appel à rank_titles
+        self._index: Optional[Tuple[List[TemplateTitle], TemplateIndex]] = None
+
+    def match_user(self, user_id: int, check_budget: Optional[Callable[[], None]] = None) -> dict:
+        """Traite toutes les instances PENDING de l'utilisateur.
+
+        `check_budget` est appelé avant chaque paquet ; s'il lève, les paquets
+        déjà commités restent, les traces en tampon sont écrites.
+
+        Returns:
+            {"matched": 120, "orphan": 30, "attempts": 410}
+        """
+        # Copiés une fois par run : les commits de chaque paquet expireraient des objets ORM
+        templates = self.TemRepo.get_user_template_titles(user_id)
+        stats = {"matched": 0, "orphan": 0, "attempts": 0}
+
+        # Parcours par clé (scheduled_start, id) : passer une instance en MATCHED /
+        # ORPHAN ne décale pas les pages suivantes, on lit donc paquet par paquet
+        pending = self.InsRepo.iter_pending_titles(user_id, batch_size=self.batch_size)
+        # Les events récurrents reviennent avec le même titre : un seul calcul par titre et par run
+        ranked_by_title = {}
+
+        kept = self.traces.kept
+        with self.traces:
+            for chunk in chunked(pending, self.batch_size):
+                if check_budget:
+                    check_budget()
+                titles = {instance.normalized_title or normalize_title(instance.title) for instance in chunk}
+                titles.difference_update(ranked_by_title)
+                if titles:
+                    ranked_by_title.update(self.rank_titles(templates, titles))
+
+                chunk_stats = self._match_chunk(chunk, ranked_by_title)
+                for key, value in chunk_stats.items():
+                    stats[key] += value
+        stats["attempts"] = self.traces.kept - kept
+
+        logger.info(
+            f"Matching utilisateur #{user_id} : {stats['matched']} liées, "
+            f"{stats['orphan']} orphelines ({len(templates)} templates)."
+        )
+        return stats
+
+    def _match_chunk(self, instances: list, ranked_by_title: dict) -> dict:
+        matches = {}
+        orphans = []
+        attempts = []
+
+        for instance in instances:
+            normalized = instance.normalized_title or normalize_title(instance.title)
+            ranked = ranked_by_title[normalized]
+
+            accepted, method = self.decide(normalized, ranked)
+            if accepted:
+                matches[instance.id] = ranked[0][0]
+            else:
+                orphans.append(instance.id)
+
+            for rank, (template_id, score, details) in enumerate(ranked):
+                attempts.append({
+                    "instance_id": instance.id,
+                    "template_id": template_id,
+                    "score": round(score, 4),
+                    "method": method,
+                    "accepted": accepted and rank == 0,
+                    "details": details,
+                })
+
+        # Un seul commit par paquet pour les statuts ; les traces partent par lots plus gros
+        with self.InsRepo.batch():
+            self.InsRepo.mark_instances_matched(matches)
+            self.InsRepo.mark_instances_orphan(orphans)
+        self.traces.add(attempts)
+
+        return {"matched": len(matches), "orphan": len(orphans)}
+
+    def decide(self, normalized: str, ranked: List[Tuple[int, float, dict]]) -> Tuple[bool, MatchMethod]:
+        """Le meilleur candidat est-il accepté ? Et par quelle méthode.
+
+        Returns:
+            (accepté, méthode enregistrée dans MatchAttempt)
+        """
+        return bool(ranked) and ranked[0][1] >= self.threshold, self.method
+
+    def rank_titles(self, templates: List[TemplateTitle], titles: Iterable[str]) -> Dict[str, List[Tuple[int, float, dict]]]:
+        """Classement des templates pour chaque titre normalisé distinct.
+
+        Returns:
+            {titre normalisé: [(template_id, score, détails), ...]}
+        """
+        # Appelé à chaque paquet avec la même liste : l'index n'est construit qu'une fois
+        if self._index is None or self._index[0] is not templates:
+            self._index = (templates, TemplateIndex(templates))
+        index = self._index[1]
+        return {normalized: self.rank(index, normalized) for normalized in titles}
+
+    def rank(self, index: TemplateIndex, normalized: str) -> List[Tuple[int, float, dict]]:
+        """Les top_k meilleurs templates pour un titre normalisé.
+
+        Returns:
+            [(template_id, score, détails), ...] par score décroissant
+        """
+        # Titre identique à un template : rien à comparer
+        exact = index.exact.get(normalized)
+        if exact is not None:
+            return [(index.ids[exact], 1.0, {"exact": True})]
+
+        positions = index.candidates(normalized)
+        matcher = SequenceMatcher(None, "", normalized)
+        scored = []
+        for position in positions:
+            title = index.titles[position]
+
+            # Le token-set vaut au plus 1 : bornes hautes du score de plus en plus
+            # précises, pour écarter sans calcul complet un candidat qui ne peut
+            # pas entrer dans le top_k
+            if len(scored) >= self.top_k:
+                floor = scored[-1][1]
+                matcher.set_seq1(title)
+                if (1 + matcher.real_quick_ratio()) / 2 <= floor or (1 + matcher.quick_ratio()) / 2 <= floor:
+                    continue
+                if (1 + matcher.ratio()) / 2 <= floor:
+                    continue
+
+            score, details = similarity(title, normalized, matcher)
+            details["candidates"] = len(positions)
+            scored.append((index.ids[position], score, details))
+            scored.sort(key=lambda item: item[1], reverse=True)
+            del scored[self.top_k:]
+
+        return scored
@@ -1,12 +1,34 @@
 import requests
 import json
 import datetime
+import os
 from typing import Optional
 
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_API_URL = f"{OLLAMA_URL}/api/generate"
 MODEL = "qwen3:8b"
 MODEL_RESUME = "gemma3:1b"
 
+# Sortie structurée imposée à adjudicate_matches (paramètre "format" d'Ollama)
+MATCH_DECISIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "decisions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "template_id": {"type": ["integer", "null"]},
+                    "confidence": {"type": "number"},
+                },
+                "required": ["id", "template_id", "confidence"],
+            },
+        },
+    },
+    "required": ["decisions"],
+}
+
 def serialize_data(data):
     def convert(obj):
         if isinstance(obj, (dict, list)):
@@ -99,6 +121,15 @@ class Ollama:
         
         return "\n  ".join(formatted_lines)
 
+    def _format_tasks_to_place(self, tasks: list[dict]) -> str:
+        """Formate les tâches à placer : '  - "Titre" (template_id=2) durée=60min préférence=Soir priorité=4'."""
+        labels = {"morning": "Matin", "afternoon": "Après-midi", "evening": "Soir", "anytime": "Indifférente"}
+        return "\n".join(
+            f'  - "{task["title"]}" (template_id={task["template_id"]}) durée={task["duration"]}min '
+            f'préférence={labels.get(task["time_preference"], "Indifférente")} priorité={task["priority"]}'
+            for task in tasks
+        )
+
     def _format_event_exist(self, event_exist : list[dict]) -> str :
         txt = ""
         for event in event_exist :
@@ -197,6 +228,14 @@ Si aucune tâche n'est à optimiser, réponds:
             slots_text = self._format_free_slots(context['time_unabled'])
         else:
             slots_text = "Aucun créneau libre fourni"
+
+        # Tâches que DayPlanner n'a pas pu placer (sinon, tâche d'exemple)
+        if context.get('tasks_to_place'):
+            tasks_text = self._format_tasks_to_place(context['tasks_to_place'])
+            max_tasks = len(context['tasks_to_place'])
+        else:
+            tasks_text = '  - "Faire les courses" durée=60min préférence=Soir'
+            max_tasks = 5
         
         return f"""Tu es un assistant de productivité intelligent. Tu dois planifier la journée de l'utilisateur.
 
@@ -210,8 +249,8 @@ PROGRAMME ACTUEL :
 CRÉNEAUX LIBRES (tu ne peux utiliser QUE ces horaires) :
   {slots_text}
 
-TÂCHES À PLACER (maximum 5) :
-  - "Faire les courses" durée=60min préférence=Soir
+TÂCHES À PLACER (maximum {max_tasks}) :
+{tasks_text}
 
 Place chaque tâche dans un créneau libre. 
 Adapte toi au Programme actuel pour placer les taches.
@@ -323,4 +362,46 @@ Réponds UNIQUEMENT avec un JSON valide :
         raw = self._post(payload)
         return self._parse_json_response(raw)
 
+    def adjudicate_matches(self, items: list) -> Optional[dict]:
+        """Tranche en une seule requête un lot d'instances ambiguës du matching.
+
+        Args:
+            items: [{"id": 0, "title": "Dentiste Dr Martin",
+                     "candidates": [{"template_id": 3, "title": "Dentiste"}, ...]}, ...]
+
+        Returns:
+            {"decisions": [{"id": 0, "template_id": 3, "confidence": 0.9}, ...]}
+            template_id est null quand aucun candidat ne convient.
+        """
+        prompt = f"""Tu relies des événements de calendrier aux tâches récurrentes (templates) d'un utilisateur.
+
+Pour chaque événement ci-dessous, choisis parmi SES candidats le template qui désigne la même activité,
+ou null si aucun ne correspond (activité différente, simple ressemblance de mots).
+
+## ÉVÉNEMENTS
+
+{json.dumps(items, ensure_ascii=False, indent=2)}
+
+## FORMAT DE RÉPONSE
+
+Réponds UNIQUEMENT avec un JSON valide, une décision par événement :
+
+```json
+{{
+    "decisions": [
+        {{"id": 0, "template_id": 3, "confidence": 0.9}},
+        {{"id": 1, "template_id": null, "confidence": 0.8}}
+    ]
+}}
+```"""
+
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "format": MATCH_DECISIONS_SCHEMA,
+            "options": {"temperature": 0},
+        }
 
+        raw = self._post(payload)
+        return self._parse_json_response(raw)
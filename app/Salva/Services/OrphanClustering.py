@@ -0,0 +1,241 @@
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import zlib
+
+import numpy as np
+from sqlmodel import Session
+
+from Salva.models import normalize_title
+from Salva.Repository.Instances import InstancesRepository, chunked
+from Salva.Repository.Orphan import OrphanRepository
+from Salva.Services.BatchMatcher import char_ngrams
+
+logger = logging.getLogger(__name__)
+
+# Cosinus minimal avec un centroïde pour rejoindre un cluster existant
+CLUSTER_THRESHOLD = float(os.getenv("CLUSTER_THRESHOLD", 0.6))
+# Dimension des vecteurs de n-grammes hachés (fixe : les centroïdes restent comparables d'un run à l'autre)
+CLUSTER_HASH_DIM = int(os.getenv("CLUSTER_HASH_DIM", 4096))
+# Dossier des centroïdes (un fichier par utilisateur)
+CLUSTER_STORE_DIR = os.getenv("CLUSTER_STORE_DIR", "clusters")
+# Orphelines traitées par transaction
+CLUSTER_BATCH_SIZE = int(os.getenv("CLUSTER_BATCH_SIZE", 500))
+
+
+def hashed_vector(normalized: str, dim: int = CLUSTER_HASH_DIM) -> np.ndarray:
+    """Vecteur normé des n-grammes de caractères d'un titre, hachés sur `dim` cases.
+
+    crc32 plutôt que hash() : le hachage doit être le même d'un process à l'autre.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for gram, count in Counter(char_ngrams(normalized)).items():
+        vector[zlib.crc32(gram.encode("utf-8")) % dim] += count
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# ============================================
+# CENTROÏDES
+# ============================================
+
+class CentroidStore:
+    """Centroïdes des clusters actifs d'un utilisateur, persistés entre deux runs.
+
+    Pour chaque cluster : la somme des vecteurs de ses instances et leur nombre.
+    Ajouter une instance met à jour une seule ligne ; rien n'est recalculé sur
+    l'historique. Un cluster créé pendant le run n'a pas encore d'id (None).
+    """
+
+    def __init__(self, user_id: int, directory: str = CLUSTER_STORE_DIR, dim: int = CLUSTER_HASH_DIM):
+        self.path = os.path.join(directory, f"user_{user_id}.npz")
+        self.directory = directory
+        self.dim = dim
+
+        self.ids: List[Optional[int]] = []
+        self._sums = np.zeros((16, dim), dtype=np.float32)
+        self._unit = np.zeros((16, dim), dtype=np.float32)
+        self._counts = np.zeros(16, dtype=np.int64)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path) as data:
+            if data["sums"].shape[1] != self.dim:
+                logger.warning(f"Centroïdes {self.path} d'une autre dimension : ignorés.")
+                return
+            for cluster_id, total, count in zip(data["ids"].tolist(), data["sums"], data["counts"].tolist()):
+                self._append(cluster_id, total, count)
+
+    def save(self) -> None:
+        """Écrit le fichier d'un coup (fichier temporaire puis rename)."""
+        os.makedirs(self.directory, exist_ok=True)
+        size = len(self.ids)
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, ids=np.asarray(self.ids, dtype=np.int64), sums=self._sums[:size], counts=self._counts[:size])
+        os.replace(temporary, self.path)
+
+    def _append(self, cluster_id: Optional[int], total: np.ndarray, count: int) -> int:
+        position = len(self.ids)
+        if position == len(self._counts):
+            # Capacité doublée : les ajouts restent en temps constant amorti
+            self._sums = np.concatenate([self._sums, np.zeros_like(self._sums)])
+            self._unit = np.concatenate([self._unit, np.zeros_like(self._unit)])
+            self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+        self.ids.append(cluster_id)
+        self._sums[position] = total
+        self._counts[position] = count
+        self._normalize(position)
+        return position
+
+    def _normalize(self, position: int) -> None:
+        norm = np.linalg.norm(self._sums[position])
+        self._unit[position] = self._sums[position] / norm if norm else 0
+
+    def retain(self, cluster_ids: List[int]) -> List[int]:
+        """Ne garde que les clusters encore actifs ; renvoie les actifs absents du store."""
+        active = set(cluster_ids)
+        kept = [position for position, cluster_id in enumerate(self.ids) if cluster_id in active]
+        if len(kept) != len(self.ids):
+            ids, sums, counts = [self.ids[p] for p in kept], self._sums[kept], self._counts[kept]
+            self.ids = []
+            for cluster_id, total, count in zip(ids, sums, counts.tolist()):
+                self._append(cluster_id, total, count)
+        known = set(self.ids)
+        return [cluster_id for cluster_id in cluster_ids if cluster_id not in known]
+
+    def add_cluster(self, cluster_id: Optional[int], total: np.ndarray, count: int = 1) -> int:
+        """Nouveau centroïde (somme de `count` vecteurs) ; renvoie sa position."""
+        return self._append(cluster_id, total, count)
+
+    def add_member(self, position: int, vector: np.ndarray) -> None:
+        self._sums[position] += vector
+        self._counts[position] += 1
+        self._normalize(position)
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """(position du centroïde le plus proche, cosinus), ou (None, 0.0) sans cluster."""
+        if not self.ids:
+            return None, 0.0
+        scores = self._unit[:len(self.ids)] @ vector
+        position = int(np.argmax(scores))
+        return position, float(scores[position])
+
+
+# ============================================
+# CLUSTERING EN LIGNE
+# ============================================
+
+class OrphanClustering:
+    """Regroupe les instances ORPHAN en OrphanCluster, au fil de l'eau.
+
+    Chaque nouvelle orpheline rejoint le cluster actif dont le centroïde est le
+    plus proche (cosinus ≥ CLUSTER_THRESHOLD) ou en fonde un nouveau ; elle
+    passe ensuite en CLUSTERED. Les centroïdes sont gardés sur disque
+    (CentroidStore) : un run ne lit que les nouvelles orphelines, jamais
+    l'historique des clusters.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        threshold: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        directory: str = CLUSTER_STORE_DIR,
+    ):
+        self.InsRepo = InstancesRepository(session)
+        self.OrphanRepo = OrphanRepository(session)
+        self.threshold = threshold if threshold is not None else CLUSTER_THRESHOLD
+        self.batch_size = batch_size or CLUSTER_BATCH_SIZE
+        self.directory = directory
+
+    def cluster_user(self, user_id: int, check_budget: Optional[Callable[[], None]] = None) -> dict:
+        """Traite les orphelines de l'utilisateur.
+
+        `check_budget` est appelé avant chaque paquet (voir Matcher.match_user).
+
+        Returns:
+            {"clustered": 40, "created": 6}
+        """
+        stats = {"clustered": 0, "created": 0}
+        store = None
+
+        # Lu paquet par paquet (pages par clé, non décalées par les écritures)
+        orphans = self.InsRepo.iter_orphan_titles(user_id, batch_size=self.batch_size)
+        for chunk in chunked(orphans, self.batch_size):
+            if check_budget:
+                check_budget()
+            # Centroïdes chargés seulement s'il y a des orphelines à traiter
+            if store is None:
+                store = self._load_store(user_id)
+            clustered, created = self._cluster_chunk(user_id, store, chunk)
+            # Le fichier suit la base : écrit seulement après le commit du paquet
+            store.save()
+            stats["clustered"] += clustered
+            stats["created"] += created
+
+        if store is None:
+            return stats
+
+        logger.info(
+            f"Clustering utilisateur #{user_id} : {stats['clustered']} orphelines, "
+            f"{stats['created']} nouveaux clusters ({len(store)} actifs)."
+        )
+        return stats
+
+    def _load_store(self, user_id: int) -> CentroidStore:
+        store = CentroidStore(user_id, self.directory)
+        missing = store.retain(self.OrphanRepo.get_active_cluster_ids(user_id))
+
+        # Fichier perdu ou clusters créés ailleurs : centroïdes recalculés depuis leurs membres
+        if missing:
+            totals: Dict[int, np.ndarray] = {}
+            counts = Counter()
+            for cluster_id, title, normalized in self.OrphanRepo.get_cluster_member_titles(missing):
+                vector = hashed_vector(normalized or normalize_title(title), store.dim)
+                totals[cluster_id] = totals[cluster_id] + vector if cluster_id in totals else vector
+                counts[cluster_id] += 1
+            for cluster_id in missing:
+                if cluster_id in totals:
+                    store.add_cluster(cluster_id, totals[cluster_id], counts[cluster_id])
+            logger.info(f"Clustering : {len(missing)} centroïdes reconstruits.")
+        return store
+
+    def _cluster_chunk(self, user_id: int, store: CentroidStore, orphans: list) -> Tuple[int, int]:
+        assignments = []
+        founders: Dict[int, object] = {}
+
+        for orphan in orphans:
+            vector = hashed_vector(orphan.normalized_title or normalize_title(orphan.title), store.dim)
+            position, score = store.nearest(vector)
+            if position is not None and score >= self.threshold:
+                store.add_member(position, vector)
+            else:
+                position, score = store.add_cluster(None, vector), 1.0
+                founders[position] = orphan
+            assignments.append((position, orphan.id, min(1.0, max(0.0, score))))
+
+        # Un seul commit : nouveaux clusters, liens et statuts
+        with self.OrphanRepo.batch():
+            created = self.OrphanRepo.create_clusters(user_id, [
+                {
+                    "cluster_label": (orphan.normalized_title or normalize_title(orphan.title))[:500],
+                    "representative_title": orphan.title[:500],
+                }
+                for orphan in founders.values()
+            ])
+            for position, cluster in zip(founders, created):
+                store.ids[position] = cluster.id
+
+            self.OrphanRepo.add_instances_to_clusters([
+                {"cluster_id": store.ids[position], "instance_id": instance_id, "similarity_score": round(score, 4)}
+                for position, instance_id, score in assignments
+            ])
+
+        return len(assignments), len(created)
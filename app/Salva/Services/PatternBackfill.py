@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+from sqlmodel import Session
+
+from Salva.models import TaskStatus
+from Salva.Repository.Instances import naive_utc
+from Salva.Repository.Patterns import (
+    PatternsRepository,
+    COMPLETION_TIME,
+    PREFERRED_DAY,
+    DURATION,
+    FREQUENCY,
+    MAX_DURATION_MINUTES,
+    aware_utc,
+    moments,
+    summarize,
+    template_category,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+def _epoch(values: List) -> np.ndarray:
+    """Secondes depuis l'epoch (UTC) ; NaN pour une date absente."""
+    seconds = np.full(len(values), np.nan)
+    present = [row for row, value in enumerate(values) if value is not None]
+    if present:
+        dates = np.array([naive_utc(values[row]) for row in present], dtype="datetime64[us]")
+        seconds[present] = dates.astype(np.int64) / 1e6
+    return seconds
+
+
+def _moments(group: np.ndarray, values: np.ndarray, size: int) -> Dict[str, np.ndarray]:
+    """n, moyenne et M2 par groupe, en deux passes (mêmes valeurs que Welford)."""
+    n = np.bincount(group, minlength=size)
+    mean = np.bincount(group, weights=values, minlength=size) / np.maximum(n, 1)
+    m2 = np.bincount(group, weights=(values - mean[group]) ** 2, minlength=size)
+    return {"n": n, "mean": mean, "m2": m2}
+
+
+class PatternBackfill:
+    """Recalcule d'un coup les LearnedPattern par template depuis l'historique.
+
+    À lancer une fois (ou après une correction de données) : ensuite,
+    PatternsRepository.record_instance_outcome tient les patterns à jour à
+    chaque complétion / annulation. Les états produits (n, moyenne, M2...)
+    ont la forme de ceux de la mise à jour incrémentale.
+
+    Le backfill fait référence : il compte chaque instance selon son statut
+    final, alors que la mise à jour incrémentale garde la première issue
+    (complétée puis annulée reste complétée). Les deux coïncident tant
+    qu'aucune instance ne change d'issue ; sinon, relancer le backfill.
+    """
+
+    def __init__(self, session: Session):
+        self.PatternsRepo = PatternsRepository(session)
+
+    def run(self, user_id: Optional[int] = None) -> dict:
+        """Remplace les patterns par template de l'utilisateur (ou de tous).
+
+        Returns:
+            {"instances": 5400, "templates": 80, "patterns": 290}
+        """
+        outcomes = self.PatternsRepo.get_outcomes(user_id)
+        rows = self.compute(outcomes)
+        self.PatternsRepo.replace_patterns(rows, user_id)
+
+        templates = len({(row["user_id"], row["category"]) for row in rows})
+        logger.info(f"Patterns : {len(rows)} patterns recalculés ({templates} templates, {len(outcomes)} instances).")
+        return {"instances": len(outcomes), "templates": templates, "patterns": len(rows)}
+
+    def compute(self, outcomes: List[tuple]) -> List[dict]:
+        """Lignes LearnedPattern à partir des tuples de PatternsRepository.get_outcomes."""
+        if not outcomes:
+            return []
+
+        user_ids, template_ids, statuses, starts, completions, estimates = zip(*outcomes)
+        pairs = np.column_stack([np.asarray(user_ids, dtype=np.int64), np.asarray(template_ids, dtype=np.int64)])
+        keys, group = np.unique(pairs, axis=0, return_inverse=True)
+        group = group.ravel()
+        size = len(keys)
+
+        statuses = np.array([getattr(status, "value", status) for status in statuses])
+        completed = statuses == TaskStatus.COMPLETED.value
+        n_completed = np.bincount(group, weights=completed, minlength=size).astype(np.int64)
+        n_cancelled = np.bincount(group, weights=~completed, minlength=size).astype(np.int64)
+
+        start = _epoch(starts)
+        completed_at = _epoch(completions)
+        estimate = np.array([value or 0 for value in estimates], dtype=np.float64)
+        timed = completed & ~np.isnan(completed_at)
+
+        # Heure de complétion (à la minute, comme la mise à jour incrémentale)
+        seconds_of_day = completed_at[timed] % DAY
+        hour = _moments(group[timed], np.floor(seconds_of_day / 60) / 60, size)
+
+        # Jour de la semaine du début prévu (1970-01-01 était un jeudi)
+        weekday = (np.floor(start[completed] / DAY).astype(np.int64) + 3) % 7
+        weekdays = np.bincount(group[completed] * 7 + weekday, minlength=size * 7).reshape(size, 7)
+
+        # Durée réelle et rapport à l'estimation du template
+        minutes = (completed_at - start) / 60
+        plausible = timed & (minutes > 0) & (minutes <= MAX_DURATION_MINUTES)
+        duration = _moments(group[plausible], minutes[plausible], size)
+        estimated = plausible & (estimate > 0)
+        ratio = _moments(group[estimated], minutes[estimated] / estimate[estimated], size)
+        has_estimate = np.bincount(group[estimated], minlength=size) > 0
+        template_estimate = np.zeros(size)
+        template_estimate[group[estimated]] = estimate[estimated]
+
+        # Fréquence : écarts entre complétions successives d'un même template
+        timed_rows = np.flatnonzero(timed)
+        order = timed_rows[np.lexsort((completed_at[timed_rows], group[timed_rows]))]
+        same = group[order][1:] == group[order][:-1]
+        gaps = np.diff(completed_at[order]) / DAY
+        kept = same & (gaps > 0)
+        frequency = _moments(group[order][1:][kept], gaps[kept], size)
+        last_row = np.full(size, -1)
+        last_row[group[order]] = order
+
+        # Listes Python : l'accès élément par élément y est bien plus rapide que sur un tableau NumPy
+        hour, duration, ratio, frequency = (
+            {key: values.tolist() for key, values in stats.items()} for stats in (hour, duration, ratio, frequency)
+        )
+        n_completed, n_cancelled, weekdays = n_completed.tolist(), n_cancelled.tolist(), weekdays.tolist()
+        has_estimate, template_estimate, last_row = has_estimate.tolist(), template_estimate.tolist(), last_row.tolist()
+
+        rows = []
+        for g, (user_id, template_id) in enumerate(keys.tolist()):
+            data = {COMPLETION_TIME: {"completed": n_completed[g], "cancelled": n_cancelled[g]}}
+            if hour["n"][g]:
+                data[COMPLETION_TIME].update(moments("hour", hour["n"][g], hour["mean"][g], hour["m2"][g]))
+
+            if n_completed[g]:
+                data[PREFERRED_DAY] = {"counts": weekdays[g]}
+            if duration["n"][g]:
+                data[DURATION] = moments("minutes", duration["n"][g], duration["mean"][g], duration["m2"][g])
+                if has_estimate[g]:
+                    data[DURATION]["estimated_minutes"] = int(template_estimate[g])
+                    data[DURATION].update(moments("ratio", ratio["n"][g], ratio["mean"][g], ratio["m2"][g]))
+            if last_row[g] >= 0:
+                data[FREQUENCY] = {"last_completed_at": aware_utc(completions[last_row[g]]).isoformat()}
+                if frequency["n"][g]:
+                    data[FREQUENCY].update(moments("days", frequency["n"][g], frequency["mean"][g], frequency["m2"][g]))
+
+            for pattern_type, pattern_data in data.items():
+                pattern_data, observations, confidence = summarize(pattern_type, pattern_data)
+                rows.append({
+                    "user_id": user_id,
+                    "pattern_type": pattern_type,
+                    "category": template_category(template_id),
+                    "pattern_data": pattern_data,
+                    "observations_count": max(observations, 1),
+                    "confidence": confidence,
+                })
+        return rows
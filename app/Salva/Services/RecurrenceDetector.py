@@ -0,0 +1,174 @@
+from typing import Dict, List, Tuple
+import logging
+import os
+
+import numpy as np
+from sqlmodel import Session
+
+from Salva.models import RecurrencePattern
+from Salva.Repository.Instances import naive_utc
+from Salva.Repository.Orphan import OrphanRepository
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+# Période testée (jours) et tolérance (jours) sur l'écart avec l'occurrence précédente,
+# de la plus courte à la plus longue : la première qui tient l'emporte
+PERIODS: List[Tuple[RecurrencePattern, float, float]] = [
+    (RecurrencePattern.DAILY, 1, 0.25),
+    (RecurrencePattern.WEEKLY, 7, 1),
+    (RecurrencePattern.BIWEEKLY, 14, 2),
+    (RecurrencePattern.MONTHLY, 30.44, 3),
+]
+# Part minimale d'occurrences retrouvées une période plus tôt pour retenir la période
+RECURRENCE_MIN_SHARE = float(os.getenv("RECURRENCE_MIN_SHARE", 0.6))
+# En dessous, un cluster n'est pas analysé
+RECURRENCE_MIN_INSTANCES = int(os.getenv("RECURRENCE_MIN_INSTANCES", 3))
+# Créneaux de la journée pour le mode horaire (quarts d'heure)
+SLOTS_PER_DAY = 96
+
+
+def detect_recurrences(cluster_ids: np.ndarray, starts: np.ndarray) -> Dict[int, dict]:
+    """Détecte la récurrence de plusieurs clusters en un seul calcul vectorisé.
+
+    Pour chaque période de PERIODS, chaque occurrence cherche (searchsorted)
+    une occurrence du même cluster une période plus tôt, à la tolérance près :
+    la part d'occurrences retrouvées mesure la régularité. Cela reconnaît aussi
+    une habitude hebdomadaire sur plusieurs jours (lundi / mercredi / vendredi),
+    dont l'écart médian (2 jours) ne correspond à aucune période.
+
+    Jours et heures sont en UTC, comme les horaires de ScheduleEvent.
+
+    Args:
+        cluster_ids: id du cluster de chaque occurrence
+        starts: début de chaque occurrence, en secondes depuis l'epoch (UTC)
+
+    Returns:
+        {cluster_id: {"pattern": RecurrencePattern | None, "frequency_days": 7.0,
+                      "confidence": 0.8, "weekdays": [0, 2], "time": "18:30",
+                      "instances": 12, "interval_std_days": 0.4}}
+        weekdays : 0 = lundi ; seuls les clusters d'au moins RECURRENCE_MIN_INSTANCES
+        occurrences sont présents.
+    """
+    if len(cluster_ids) == 0:
+        return {}
+
+    cluster_ids = np.asarray(cluster_ids, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.float64)
+    order = np.lexsort((starts, cluster_ids))
+    cluster_ids, starts = cluster_ids[order], starts[order]
+
+    keys, index, counts = np.unique(cluster_ids, return_inverse=True, return_counts=True)
+    size = len(keys)
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    # Écarts entre occurrences successives d'un même cluster
+    same = index[1:] == index[:-1]
+    gaps = (np.diff(starts) / DAY)[same]
+    gap_cluster = index[1:][same]
+    n_gaps = np.bincount(gap_cluster, minlength=size)
+    safe_gaps = np.maximum(n_gaps, 1)
+    mean = np.bincount(gap_cluster, weights=gaps, minlength=size) / safe_gaps
+    variance = np.bincount(gap_cluster, weights=gaps ** 2, minlength=size) / safe_gaps - mean ** 2
+    std = np.sqrt(np.maximum(variance, 0))
+
+    # Médiane par cluster : écarts triés par cluster, élément(s) du milieu
+    sorted_gaps = gaps[np.lexsort((gaps, gap_cluster))]
+    gap_first = np.concatenate(([0], np.cumsum(n_gaps)[:-1]))
+    has_gaps = n_gaps > 0
+    median = np.full(size, np.nan)
+    low = gap_first + (n_gaps - 1) // 2
+    high = gap_first + n_gaps // 2
+    median[has_gaps] = (sorted_gaps[low[has_gaps]] + sorted_gaps[high[has_gaps]]) / 2
+
+    # Clés croissantes (cluster, date) : un seul searchsorted pour tous les clusters
+    origin = starts.min()
+    span = starts.max() - origin + 2 * max(period for _, period, _ in PERIODS) * DAY
+    key = index * span + (starts - origin)
+    start_of_cluster = starts[first][index]
+
+    pattern_index = np.full(size, -1)
+    share = np.zeros(size)
+    for position, (_, period, tolerance) in enumerate(PERIODS):
+        target = key - period * DAY
+        found = np.searchsorted(key, target)
+        best = np.full(len(key), np.inf)
+        for candidate in (found - 1, found):
+            valid = (candidate >= 0) & (candidate < len(key))
+            candidate = np.clip(candidate, 0, len(key) - 1)
+            distance = np.where(valid & (index[candidate] == index), np.abs(key[candidate] - target), np.inf)
+            best = np.minimum(best, distance)
+        hit = best <= tolerance * DAY
+
+        # Les premières occurrences n'ont pas de précédent possible : hors dénominateur
+        eligible = starts - period * DAY >= start_of_cluster - tolerance * DAY
+        n_eligible = np.bincount(index, weights=eligible, minlength=size)
+        period_share = np.bincount(index, weights=hit & eligible, minlength=size) / np.maximum(n_eligible, 1)
+        chosen = (pattern_index < 0) & (n_eligible >= 2) & (period_share >= RECURRENCE_MIN_SHARE)
+        pattern_index[chosen] = position
+        share[chosen] = period_share[chosen]
+
+    # Histogrammes : jour de la semaine (1970-01-01 était un jeudi) et quart d'heure
+    days = np.floor(starts / DAY).astype(np.int64)
+    weekday = (days + 3) % 7
+    weekday_hist = np.bincount(index * 7 + weekday, minlength=size * 7).reshape(size, 7)
+    slot = ((starts - days * DAY) // (DAY / SLOTS_PER_DAY)).astype(np.int64)
+    slot_hist = np.bincount(index * SLOTS_PER_DAY + slot, minlength=size * SLOTS_PER_DAY).reshape(size, SLOTS_PER_DAY)
+    slot_mode = slot_hist.argmax(axis=1)
+    slot_share = slot_hist.max(axis=1) / counts
+
+    # Confiance : régularité, pondérée par le nombre d'écarts observés et la stabilité de l'horaire
+    support = n_gaps / (n_gaps + 2)
+    confidence = np.where(pattern_index >= 0, support * (0.8 * share + 0.2 * slot_share), 0.0)
+
+    results = {}
+    for row in np.flatnonzero(counts >= RECURRENCE_MIN_INSTANCES):
+        top = weekday_hist[row].max()
+        minutes = int(slot_mode[row]) * (24 * 60 // SLOTS_PER_DAY)
+        results[int(keys[row])] = {
+            "pattern": PERIODS[pattern_index[row]][0] if pattern_index[row] >= 0 else None,
+            "frequency_days": round(float(median[row]), 2),
+            "confidence": round(float(min(1.0, confidence[row])), 4),
+            "weekdays": [int(day) for day in np.flatnonzero(weekday_hist[row] * 2 >= top)],
+            "time": f"{minutes // 60:02d}:{minutes % 60:02d}",
+            "instances": int(counts[row]),
+            "interval_std_days": round(float(std[row]), 2),
+        }
+    return results
+
+
+class RecurrenceDetector:
+    """Calcule detected_pattern / detected_frequency_days / confidence des OrphanCluster.
+
+    Une requête pour lire toutes les dates des clusters actifs de l'utilisateur,
+    un calcul NumPy pour tous les clusters, un UPDATE executemany pour tout écrire.
+    """
+
+    def __init__(self, session: Session):
+        self.OrphanRepo = OrphanRepository(session)
+
+    def detect_user(self, user_id: int, save: bool = True) -> Dict[int, dict]:
+        """Returns: voir detect_recurrences."""
+        rows = self.OrphanRepo.get_cluster_starts(user_id)
+        if not rows:
+            return {}
+
+        cluster_ids = np.fromiter((cluster_id for cluster_id, _ in rows), dtype=np.int64, count=len(rows))
+        starts = np.array([naive_utc(start) for _, start in rows], dtype="datetime64[s]").astype(np.int64)
+        results = detect_recurrences(cluster_ids, starts)
+
+        if save:
+            self.OrphanRepo.update_cluster_patterns([
+                {
+                    "cluster_id": cluster_id,
+                    "detected_frequency_days": result["frequency_days"],
+                    "detected_pattern": result["pattern"].value if result["pattern"] else None,
+                    "confidence": result["confidence"],
+                }
+                for cluster_id, result in results.items()
+            ])
+
+        recurrent = sum(1 for result in results.values() if result["pattern"])
+        logger.info(f"Récurrences utilisateur #{user_id} : {recurrent}/{len(results)} clusters récurrents.")
+        return results
@@ -1,4 +1,4 @@
-from Salva.Repository.Instances import InstancesRepository
+from Salva.Repository.Instances import InstancesRepository, naive_utc
 from Salva.Repository.Templates import TemplatesRepository
 from sqlmodel import Session
 from Salva.models import (
@@ -9,7 +9,7 @@ from Salva.models import (
     )
 
 from datetime import date, datetime, timedelta, timezone, time
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 jours = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
 
@@ -20,44 +20,65 @@ class ScheduleEvent :
         self.InsRep = InstancesRepository(session)
         self.TemRep = TemplatesRepository(session)
 
-    def calcul_new_week(self) :
+        # Instances de la semaine, créées ensemble en fin de calcul
+        self._pending_rows : List[dict] = []
+        # Date de la dernière instance par template, lue une fois par calcul
+        self._last_starts : Dict[int, Optional[datetime]] = {}
+
+    def calcul_new_week(self, user_id: int) :
         today = datetime.now().weekday()
         date_now = datetime.now()
         if jours[today] == "Dimanche" :
-            Templates = self.TemRep.get_user_templates(1)
-            for template in Templates :
-                prefs = template.recurrence_data
-                if template.recurrence_pattern == RecurrencePattern.DAILY :
-                    print(f"Template {template.title} : Toutes la semaine à {prefs['time']}")
-                elif template.recurrence_pattern == RecurrencePattern.WEEKLY :
-                    if len(prefs["days"]) == 1 :
-                        self._create_instance(template, date_now + timedelta(days=prefs["days"][0]))
-                    else :
-                        for jour in prefs["days"] :
-                            self._create_instance(template, date_now + timedelta(days=jour))
-                elif template.recurrence_pattern == RecurrencePattern.BIWEEKLY :
-                    if self._should_schedule_biweekly(template.id) :
-                        if prefs :
-                            self._create_instance(template, date_now + timedelta(days=prefs["days"][0]))
-                elif template.recurrence_pattern == RecurrencePattern.MONTHLY :
-                    if self._should_schedule_monthly(template.id) :
-                        if prefs :
+            Templates = self.TemRep.get_user_templates(user_id)
+            self._pending_rows = []
+            recurrents = [
+                t.id for t in Templates
+                if t.recurrence_pattern in (RecurrencePattern.BIWEEKLY, RecurrencePattern.MONTHLY)
+            ]
+            starts = self.InsRep.get_last_instance_starts(recurrents)
+            # Un template sans instance est gardé (None) pour ne pas être relu
+            self._last_starts = {template_id: starts.get(template_id) for template_id in recurrents}
+            with self.InsRep.batch() :
+                for template in Templates :
+                    prefs = template.recurrence_data
+                    if template.recurrence_pattern == RecurrencePattern.DAILY :
+                        print(f"Template {template.title} : Toutes la semaine à {prefs['time']}")
+                    elif template.recurrence_pattern == RecurrencePattern.WEEKLY :
+                        if len(prefs["days"]) == 1 :
                             self._create_instance(template, date_now + timedelta(days=prefs["days"][0]))
+                        else :
+                            for jour in prefs["days"] :
+                                self._create_instance(template, date_now + timedelta(days=jour))
+                    elif template.recurrence_pattern == RecurrencePattern.BIWEEKLY :
+                        if self._should_schedule_biweekly(template.id) :
+                            if prefs :
+                                self._create_instance(template, date_now + timedelta(days=prefs["days"][0]))
+                    elif template.recurrence_pattern == RecurrencePattern.MONTHLY :
+                        if self._should_schedule_monthly(template.id) :
+                            if prefs :
+                                self._create_instance(template, date_now + timedelta(days=prefs["days"][0]))
+                self._create_pending_instances(user_id)
             return
         else :
             print(f"Aujourd'hui nous sommes {jours[today]}, je n'ai créer l'emploie du temps que le Dimanche.")
             print(f"De nouvelle amélioration arriverons prochainement.")
 
+    def _last_start(self, template_id: int) -> Optional[datetime]:
+        """Date de la dernière instance du template (préchargée par calcul_new_week)."""
+        if template_id in self._last_starts:
+            return self._last_starts[template_id]
+        return self.InsRep.get_last_instance_start(template_id)
+
     def _should_schedule_biweekly(self, template_id: int) -> bool:
         """Vérifie si la tâche biweekly doit être planifiée cette semaine.
         
         Règle : si la dernière instance est dans la semaine passée, on skip.
         """
-        last = self.InsRep.get_last_instance_by_template(template_id)
+        last = self._last_start(template_id)
         if not last:
             return True
 
-        last_date = last.scheduled_start.date() if hasattr(last.scheduled_start, 'date') else last.scheduled_start
+        last_date = last.date() if hasattr(last, 'date') else last
         today = date.today()
         days_since = (today - last_date).days
 
@@ -70,11 +91,11 @@ class ScheduleEvent :
         
         Règle : si la dernière instance date de moins de 3 semaines, on skip.
         """
-        last = self.InsRep.get_last_instance_by_template(template_id)
+        last = self._last_start(template_id)
         if not last:
             return True
 
-        last_date = last.scheduled_start.date() if hasattr(last.scheduled_start, 'date') else last.scheduled_start
+        last_date = last.date() if hasattr(last, 'date') else last
         today = date.today()
         days_since = (today - last_date).days
 
@@ -93,30 +114,46 @@ class ScheduleEvent :
 
         print(f"{template.title} : {start}")
 
-        existing = self.InsRep.find_duplicate(template.user_id, template.title, start)
-
-        if existing :
-            return None
-
-        instance = self.InsRep.create_instance(
-            user_id=template.user_id,
-            title=template.title,
-            scheduled_start=start,
-            scheduled_end=end,
-            origin=TaskOrigin.SYSTEM,
-            template_id=template.id,
-            description=template.description,
-            priority=template.priority,
-            calendar_name="Travail",
-            status=TaskStatus.SCHEDULED
+        self._pending_rows.append({
+            "user_id": template.user_id,
+            "title": template.title,
+            "scheduled_start": start,
+            "scheduled_end": end,
+            "origin": TaskOrigin.SYSTEM,
+            "template_id": template.id,
+            "description": template.description,
+            "priority": template.priority,
+            "calendar_name": "Travail",
+            "status": TaskStatus.SCHEDULED,
+        })
+
+    def _create_pending_instances(self, user_id: int) :
+        """Crée les instances de la semaine en un seul INSERT, sans les doublons."""
+        rows = self._pending_rows
+        self._pending_rows = []
+
+        existing = self.InsRep.find_duplicates(
+            user_id, [(row["title"], row["scheduled_start"]) for row in rows]
         )
 
-        # Mettre à jour le template
-        self.TemRep.update_template(
-            template.id,
-            last_instance_created_at=datetime.now(timezone.utc),
-            next_suggested_date=day,
-        )
+        new_rows = []
+        for row in rows :
+            key = (row["title"], naive_utc(row["scheduled_start"]))
+            if key in existing :
+                continue
+            existing.add(key)
+            new_rows.append(row)
+
+        self.InsRep.create_instances(new_rows)
+
+        # Mettre à jour les templates (last_instance_created_at est géré par le compteur)
+        next_dates = {}
+        for row in new_rows :
+            day = row["scheduled_start"].date()
+            next_dates[row["template_id"]] = max(day, next_dates.get(row["template_id"], day))
+
+        for template_id, day in next_dates.items() :
+            self.TemRep.update_template(template_id, next_suggested_date=day)
     
     @staticmethod
     def _parse_time(time_str: Optional[str]) -> time:
@@ -0,0 +1,255 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from functools import partial
+from typing import Optional, List
+import logging
+import os
+import threading
+import time
+
+from Salva import Instrumentation
+from Salva.database import get_engine, get_replica_engine, get_session, get_pool_stats, POOL_CONFIG
+from Salva.Calendars import Calendars
+from Salva.Credentials import decrypt_password, CredentialsError
+from Salva.CalendarSync import CalendarSync
+from Salva.Repository.Users import UserRepository
+from Salva.Services.ScheduleEvent import ScheduleEvent
+from Salva.Services.Matcher import Matcher
+from Salva.Services.BatchMatcher import BatchMatcher, BATCH_MATCH_MIN_IMPORTED
+from Salva.Services.MatchCascade import MatchCascade, MATCH_CASCADE
+from Salva.Services.OrphanClustering import OrphanClustering
+from Salva.Services.RecurrenceDetector import RecurrenceDetector
+
+logger = logging.getLogger(__name__)
+
+# Délai d'une requête CalDAV (secondes), borné par le budget de l'utilisateur
+CALDAV_REQUEST_TIMEOUT = float(os.getenv("CALDAV_REQUEST_TIMEOUT", 30))
+
+
+class SyncBudgetExceeded(Exception):
+    """Levée quand un utilisateur dépasse son budget de temps de synchronisation."""
+
+
+class SyncPool:
+    """Synchronise tous les utilisateurs en parallèle.
+
+    Chaque utilisateur est traité dans un thread avec sa propre session et son
+    propre client CalDAV ; seul le moteur (et donc le pool de connexions MySQL)
+    est partagé. Un compte iCloud lent est abandonné une fois son budget écoulé
+    pour ne pas retarder les autres.
+
+    Un thread Python ne s'interrompt pas de l'extérieur : le budget est vérifié
+    dans le travail lui-même (chaque fenêtre CalDAV, chaque paquet de matching
+    et de clustering, entre les étapes), et chaque requête CalDAV a son propre
+    délai. Un utilisateur hors budget s'arrête donc au plus une requête ou un
+    paquet plus tard, avec rollback de sa transaction en cours.
+    """
+
+    def __init__(
+        self,
+        env: Optional[str] = None,
+        max_workers: int = 4,
+        budget_seconds: float = 300,
+    ):
+        self.env = env
+        self.max_workers = max_workers
+        self.budget_seconds = budget_seconds
+        # Moteur partagé du process, avec au moins une connexion par worker ;
+        # get_session réutilise ce moteur (et le réplica s'il est configuré)
+        pool_size = max(max_workers, POOL_CONFIG["pool_size"])
+        self.engine = get_engine(env, pool_size=pool_size)
+        get_replica_engine(env, pool_size=pool_size)
+
+        self._started = {}
+        self._lock = threading.Lock()
+
+    # ============================================
+    # SÉLECTION DES UTILISATEURS
+    # ============================================
+
+    def load_jobs(self, emails: Optional[List[str]] = None) -> List[dict]:
+        """Construit la liste des utilisateurs à synchroniser.
+
+        Sans filtre, les utilisateurs sans compte iCloud configuré sont ignorés.
+        Un utilisateur demandé explicitement utilise le compte du .env à défaut.
+        Un mot de passe indéchiffrable donne un job en erreur ("error"), qui
+        n'est pas lancé.
+        """
+        with get_session(self.env) as session, Instrumentation.operation("load_jobs"):
+            users = UserRepository(session).get_users(emails)
+
+            jobs = []
+            for user in users:
+                if not emails and not (user.icloud_username and user.icloud_caldav_url):
+                    logger.info(f"Utilisateur #{user.id} ignoré : aucun compte iCloud configuré.")
+                    continue
+                job = {
+                    "user_id": user.id,
+                    "email": user.email,
+                    "url": user.icloud_caldav_url,
+                    "username": user.icloud_username,
+                    "password": None,
+                }
+                if user.icloud_encrypted_password:
+                    try:
+                        job["password"] = decrypt_password(user.icloud_encrypted_password)
+                    except CredentialsError as e:
+                        logger.error(f"Utilisateur #{user.id} non synchronisé : {e}.")
+                        job["error"] = str(e)
+                jobs.append(job)
+        return jobs
+
+    # ============================================
+    # EXÉCUTION
+    # ============================================
+
+    def run(
+        self,
+        calendar_name: str,
+        start_date: datetime,
+        end_date: datetime,
+        emails: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """Synchronise chaque utilisateur et retourne un résultat par utilisateur.
+
+        Returns:
+            [{"user_id": 1, "email": "...", "status": "ok" | "error" | "timeout", ...}]
+        """
+        jobs = self.load_jobs(emails)
+        if not jobs:
+            logger.info("Aucun utilisateur à synchroniser.")
+            return []
+
+        self._started = {}
+        results = [
+            {"user_id": job["user_id"], "email": job["email"], "status": "error", "error": job["error"]}
+            for job in jobs if "error" in job
+        ]
+        jobs_to_run = [job for job in jobs if "error" not in job]
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="salva-sync")
+        try:
+            futures = {
+                executor.submit(self._sync_user, job, calendar_name, start_date, end_date): job
+                for job in jobs_to_run
+            }
+            pending = set(futures)
+
+            while pending:
+                done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    results.append(self._collect(futures[future], future))
+
+                # Abandonner les comptes qui ont dépassé leur budget
+                for future in list(pending):
+                    job = futures[future]
+                    if self._is_over_budget(job["user_id"]):
+                        logger.warning(f"Utilisateur #{job['user_id']} abandonné : budget de {self.budget_seconds}s dépassé.")
+                        future.cancel()
+                        pending.discard(future)
+                        results.append({"user_id": job["user_id"], "email": job["email"], "status": "timeout"})
+        finally:
+            # Ne pas attendre les threads abandonnés : ils lèvent SyncBudgetExceeded
+            # au prochain contrôle (fenêtre CalDAV ou paquet)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        ok = sum(1 for r in results if r["status"] == "ok")
+        logger.info(f"SyncPool : {ok}/{len(jobs)} utilisateurs synchronisés.")
+        logger.info(f"Pool de connexions : {get_pool_stats(self.env)}")
+        replica_stats = get_pool_stats(self.env, replica=True)
+        if replica_stats:
+            logger.info(f"Pool du réplica : {replica_stats}")
+        return results
+
+    def _collect(self, job: dict, future) -> dict:
+        try:
+            return future.result()
+        except SyncBudgetExceeded:
+            return {"user_id": job["user_id"], "email": job["email"], "status": "timeout"}
+        except Exception as e:
+            logger.error(f"Erreur synchronisation utilisateur #{job['user_id']} : {e}")
+            return {"user_id": job["user_id"], "email": job["email"], "status": "error", "error": str(e)}
+
+    def _is_over_budget(self, user_id: int) -> bool:
+        with self._lock:
+            started = self._started.get(user_id)
+        return started is not None and time.monotonic() - started > self.budget_seconds
+
+    def _check_budget(self, user_id: int) -> None:
+        if self._is_over_budget(user_id):
+            raise SyncBudgetExceeded(f"Utilisateur #{user_id}")
+
+    def _sync_user(
+        self,
+        job: dict,
+        calendar_name: str,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> dict:
+        """Synchronise un utilisateur de façon isolée (session et client CalDAV dédiés)."""
+        user_id = job["user_id"]
+        with self._lock:
+            self._started[user_id] = time.monotonic()
+
+        check_budget = partial(self._check_budget, user_id)
+
+        with get_session(self.env) as session:
+            try:
+                cal_client = Calendars(
+                    url=job["url"],
+                    username=job["username"],
+                    password=job["password"],
+                    timeout=min(CALDAV_REQUEST_TIMEOUT, self.budget_seconds),
+                    check_budget=check_budget,
+                )
+                sync = CalendarSync(session, cal_client)
+                SE = ScheduleEvent(session)
+
+                check_budget()
+                with Instrumentation.operation("sync"):
+                    first = sync.sync(user_id, calendar_name, start_date, end_date)
+
+                # Relier aux templates les events importés (vectorisé après un gros import)
+                check_budget()
+                if len(first["pulled"]) >= BATCH_MATCH_MIN_IMPORTED:
+                    matcher_class = BatchMatcher
+                else:
+                    matcher_class = MatchCascade if MATCH_CASCADE else Matcher
+                with Instrumentation.operation("matching"):
+                    matching = matcher_class(session).match_user(user_id, check_budget)
+
+                # Regrouper les orphelines restantes
+                check_budget()
+                with Instrumentation.operation("clustering"):
+                    clustering = OrphanClustering(session).cluster_user(user_id, check_budget)
+
+                # Récurrences recalculées seulement si des clusters ont changé
+                if clustering["clustered"]:
+                    with Instrumentation.operation("recurrence"):
+                        RecurrenceDetector(session).detect_user(user_id)
+
+                check_budget()
+                with Instrumentation.operation("calcul_new_week"):
+                    SE.calcul_new_week(user_id)
+
+                check_budget()
+                with Instrumentation.operation("sync"):
+                    second = sync.sync(user_id, calendar_name, start_date, end_date)
+            except Exception:
+                session.rollback()
+                raise
+
+        with self._lock:
+            elapsed = time.monotonic() - self._started[user_id]
+
+        logger.info(f"Utilisateur #{user_id} synchronisé en {elapsed:.1f}s.")
+        return {
+            "user_id": user_id,
+            "email": job["email"],
+            "status": "ok",
+            "pulled": len(first["pulled"]) + len(second["pulled"]),
+            "pushed": len(first["pushed"]) + len(second["pushed"]),
+            "matched": matching["matched"],
+            "clustered": clustering["clustered"],
+            "elapsed": elapsed,
+        }
@@ -1,7 +1,13 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
 from dotenv import load_dotenv
 from sqlmodel import SQLModel, create_engine, Session
-from sqlalchemy import text
+from sqlalchemy import text, event, inspect, select, func
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.elements import TextClause
 from Salva.models import (
     User,
     TaskTemplate,
@@ -17,7 +23,7 @@ load_dotenv()
 # ============================================
 # CONFIGURATION
 # ============================================
-ENV = os.getenv("ENV")  # "test" ou "prod"
+ENV = os.getenv("ENV")  # "test", "prod" ou "sqlite"
 
 DB_CONFIG = {
     "TEST": {
@@ -26,6 +32,9 @@ DB_CONFIG = {
         "database": os.getenv("DB_TEST_NAME"),
         "user": os.getenv("DB_TEST_USER"),
         "password": os.getenv("DB_TEST_PASSWORD"),
+        # Réplica en lecture seule (optionnel) : mêmes identifiants que le primaire par défaut
+        "replica_host": os.getenv("DB_TEST_REPLICA_HOST"),
+        "replica_port": os.getenv("DB_TEST_REPLICA_PORT"),
     },
     "PROD": {
         "host": os.getenv("DB_PROD_HOST"),
@@ -33,17 +42,65 @@ DB_CONFIG = {
         "database": os.getenv("DB_PROD_NAME"),
         "user": os.getenv("DB_PROD_USER"),
         "password": os.getenv("DB_PROD_PASSWORD"),
+        # Réplica en lecture seule (optionnel) : mêmes identifiants que le primaire par défaut
+        "replica_host": os.getenv("DB_PROD_REPLICA_HOST"),
+        "replica_port": os.getenv("DB_PROD_REPLICA_PORT"),
     },
+    # Base embarquée pour les installations mono-utilisateur / hors-ligne
+    "SQLITE": {
+        "path": os.getenv("DB_SQLITE_PATH", "salva.db"),
+    },
+}
+
+# Réglages appliqués à chaque connexion SQLite :
+#   - WAL : les lectures ne bloquent plus l'écriture (et inversement)
+#   - synchronous=NORMAL : fsync au checkpoint seulement, sûr en WAL
+#   - busy_timeout : attendre le verrou d'écriture au lieu d'échouer aussitôt
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", 5000)),
+    "cache_size": -int(os.getenv("DB_SQLITE_CACHE_KB", 65536)),
+    "temp_store": "MEMORY",
 }
 
 
+# Taille des pools, partagée par tous les threads d'un même process
+POOL_CONFIG = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 3600)),
+}
+
+# Après une écriture, les lectures restent sur le primaire le temps que le réplica rattrape
+REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", 5))
+
+# Un moteur par (environnement, echo) pour tout le process
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def resolve_env(env: str = None) -> str:
+    """Normalise le nom d'environnement ('test' → 'TEST'), défaut : ENV puis 'TEST'."""
+    return (env or ENV or "test").upper()
+
+
+def is_sqlite(env: str = None) -> bool:
+    return resolve_env(env) == "SQLITE"
+
+
 def get_database_url(env: str = None) -> str:
-    """Construit l'URL de connexion MySQL pour l'environnement donné."""
-    env = env or ENV
+    """Construit l'URL de connexion (MySQL, ou fichier SQLite) pour l'environnement donné."""
+    env = resolve_env(env)
     config = DB_CONFIG.get(env)
 
     if not config:
-        raise ValueError(f"Environnement inconnu : '{env}'. Utilise 'test' ou 'prod'.")
+        raise ValueError(f"Environnement inconnu : '{env}'. Utilise 'test', 'prod' ou 'sqlite'.")
+
+    if is_sqlite(env):
+        return f"sqlite:///{config['path']}"
 
     return (
         f"mysql+pymysql://{config['user']}:{config['password']}"
@@ -52,22 +109,223 @@ def get_database_url(env: str = None) -> str:
     )
 
 
-def get_engine(env: str = None, echo: bool = False):
-    """Crée le moteur SQLAlchemy pour l'environnement donné."""
-    url = get_database_url(env)
-    return create_engine(
-        url,
-        echo=echo,
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10,
+def get_replica_url(env: str = None) -> Optional[str]:
+    """URL du réplica en lecture de l'environnement, ou None s'il n'y en a pas."""
+    env = resolve_env(env)
+    config = DB_CONFIG.get(env) or {}
+
+    if not config.get("replica_host"):
+        return None
+
+    return (
+        f"mysql+pymysql://{config['user']}:{config['password']}"
+        f"@{config['replica_host']}:{config['replica_port'] or config['port']}/{config['database']}"
+        f"?charset=utf8mb4"
     )
 
 
+class TimedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps passé à obtenir une connexion."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self.wait_count += 1
+                self.wait_total += elapsed
+                self.wait_max = max(self.wait_max, elapsed)
+
+
+def get_engine(env: str = None, echo: bool = False, **pool_kwargs):
+    """Retourne le moteur SQLAlchemy de l'environnement, créé une seule fois par process.
+
+    Les paramètres de pool (pool_size, max_overflow, ...) ne s'appliquent qu'à la
+    création du moteur ; ils complètent POOL_CONFIG.
+    """
+    env = resolve_env(env)
+    key = (env, echo)
+
+    engine = _ENGINES.get(key)
+    if engine is not None:
+        return engine
+
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            if is_sqlite(env):
+                engine = create_engine(
+                    get_database_url(env),
+                    echo=echo,
+                    poolclass=TimedQueuePool,
+                    # Les connexions passent d'un thread à l'autre via le pool
+                    connect_args={"check_same_thread": False},
+                    **{**POOL_CONFIG, **pool_kwargs},
+                )
+                event.listen(engine, "connect", _apply_sqlite_pragmas)
+            else:
+                engine = create_engine(
+                    get_database_url(env),
+                    echo=echo,
+                    pool_pre_ping=True,
+                    poolclass=TimedQueuePool,
+                    **{**POOL_CONFIG, **pool_kwargs},
+                )
+            _ENGINES[key] = engine
+    return engine
+
+
+def get_replica_engine(env: str = None, echo: bool = False, **pool_kwargs):
+    """Moteur du réplica en lecture, créé une seule fois par process (None sans réplica)."""
+    env = resolve_env(env)
+    url = get_replica_url(env)
+    if url is None:
+        return None
+
+    key = (env, echo, "replica")
+    engine = _ENGINES.get(key)
+    if engine is not None:
+        return engine
+
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = create_engine(
+                url,
+                echo=echo,
+                pool_pre_ping=True,
+                poolclass=TimedQueuePool,
+                **{**POOL_CONFIG, **pool_kwargs},
+            )
+            _ENGINES[key] = engine
+    return engine
+
+
+class RoutingSession(Session):
+    """Session qui envoie les lectures vers le réplica et tout le reste vers le primaire.
+
+    Une lecture reste sur le primaire :
+        - dans un batch de UnitOfWork, pour voir ses propres écritures non commitées
+        - tant que la transaction en cours a écrit (flush, INSERT / UPDATE / DELETE,
+          texte brut), ou que la session a des objets nouveaux / modifiés / supprimés
+        - pendant REPLICA_STICKY_SECONDS après une écriture de la session
+        - pour un SELECT ... FOR UPDATE, ou pendant un flush
+    Sans réplica, la session se comporte comme une Session classique.
+    """
+
+    def __init__(self, bind=None, replica=None, **kwargs):
+        super().__init__(bind=bind, **kwargs)
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._is_select(clause) and not self._flushing:
+            if self.replica is not None and self._replica_allowed(clause):
+                return self.replica
+        elif self._flushing or self._is_write(clause):
+            self.info["last_write"] = time.monotonic()
+            # Remis à zéro en fin de transaction (_end_transaction)
+            self.info["transaction_wrote"] = True
+        # Sans requête (session.connection(), flush...) : primaire, sans compter d'écriture
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+    @staticmethod
+    def _is_select(clause) -> bool:
+        return clause is not None and getattr(clause, "is_select", False)
+
+    @staticmethod
+    def _is_write(clause) -> bool:
+        # Le texte brut peut écrire : on le suppose
+        return clause is not None and (getattr(clause, "is_dml", False) or isinstance(clause, TextClause))
+
+    def _replica_allowed(self, clause) -> bool:
+        # "uow_depth" est tenu par Salva.Repository.UnitOfWork
+        if self.info.get("uow_depth", 0) > 0:
+            return False
+        if getattr(clause, "_for_update_arg", None) is not None:
+            return False
+        # Lecture-modification-écriture hors batch : le réplica ne voit pas la transaction
+        if self.info.get("transaction_wrote") or self.new or self.dirty or self.deleted:
+            return False
+        last_write = self.info.get("last_write")
+        return last_write is None or time.monotonic() - last_write > REPLICA_STICKY_SECONDS
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _end_transaction(session, transaction) -> None:
+    # Commit ou rollback de la transaction principale (pas d'un savepoint)
+    if transaction.parent is None:
+        session.info.pop("transaction_wrote", None)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
 def get_session(env: str = None) -> Session:
-    """Retourne une session SQLModel."""
-    engine = get_engine(env)
-    return Session(engine)
+    """Retourne une session sur le moteur partagé de l'environnement.
+
+    Si un réplica est configuré, les lectures y sont routées (voir RoutingSession).
+    """
+    return RoutingSession(get_engine(env), replica=get_replica_engine(env))
+
+
+@contextmanager
+def session_scope(env: str = None):
+    """Session transactionnelle : commit à la sortie, rollback en cas d'erreur."""
+    session = get_session(env)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_pool_stats(env: str = None, replica: bool = False) -> dict:
+    """Statistiques du pool de connexions de l'environnement (ou de son réplica).
+
+    Returns:
+        {"size": 5, "checked_in": 3, "checked_out": 2, "overflow": -3,
+         "wait_count": 120, "wait_avg_ms": 0.4, "wait_max_ms": 12.8}
+    """
+    engine = get_replica_engine(env) if replica else get_engine(env)
+    if engine is None:
+        return {}
+    pool = engine.pool
+    stats = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats["wait_count"] = pool.wait_count
+            stats["wait_avg_ms"] = round(pool.wait_total / pool.wait_count * 1000, 3) if pool.wait_count else 0.0
+            stats["wait_max_ms"] = round(pool.wait_max * 1000, 3)
+    return stats
+
+
+def dispose_engines() -> None:
+    """Ferme tous les pools (ex : après un fork, ou à l'arrêt du process)."""
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
 
 
 # ============================================
@@ -75,11 +333,11 @@ def get_session(env: str = None) -> Session:
 # ============================================
 def create_database(env: str = None, echo: bool = True):
     """Crée toutes les tables dans la base de données cible."""
-    env = env or ENV
+    env = resolve_env(env)
     engine = get_engine(env, echo=echo)
 
     print(f"Connexion à la base '{env}'...")
-    print(f"URL : {get_database_url(env).replace(DB_CONFIG[env]['password'], '****')}")
+    print(f"URL : {engine.url.render_as_string(hide_password=True)}")
 
     SQLModel.metadata.create_all(engine)
 
@@ -89,11 +347,83 @@ def create_database(env: str = None, echo: bool = True):
         print(f"  - {table_name}")
 
 
+# Anciens index remplacés par un index composite qui commence par les mêmes colonnes
+# (et couvre donc aussi leurs clés étrangères) : {table: {ancien: remplaçant}}
+SUPERSEDED_INDEXES = {
+    "task_instances": {
+        "idx_instances_matching": "idx_instances_matching_start",
+        "idx_instances_user_id": "idx_instances_user_start",
+        "idx_instances_template_id": "idx_instances_template_start",
+    },
+}
+
+
+def create_indexes(env: str = None, echo: bool = True):
+    """Ajoute les index manquants sur des tables existantes (create_all ne le fait pas).
+
+    Supprime ensuite les index de SUPERSEDED_INDEXES, une fois leur remplaçant
+    en place : ils ne servent plus aux lectures et ralentissent les écritures.
+    """
+    env = resolve_env(env)
+    engine = get_engine(env, echo=echo)
+    failed = []
+
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+                print(f"  - {table.name}.{index.name}")
+            except Exception as e:
+                print(f"Échec création {table.name}.{index.name} : {e}")
+                if index.unique:
+                    # Index unique impossible tant que des doublons existent
+                    print(f"    {count_duplicates(engine, index)} groupe(s) en doublon sur "
+                          f"({', '.join(column.name for column in index.columns)}) à fusionner à la main")
+                failed.append(f"{table.name}.{index.name}")
+
+    for table_name, superseded in SUPERSEDED_INDEXES.items():
+        existing = {index["name"] for index in inspect(engine).get_indexes(table_name)}
+        for old_name, new_name in superseded.items():
+            if old_name not in existing:
+                continue
+            if new_name not in existing:
+                # Remplaçant non créé (échec ci-dessus) : l'ancien reste en place
+                print(f"  ~ {table_name}.{old_name} gardé : {new_name} absent")
+                continue
+            with engine.begin() as conn:
+                quote = conn.dialect.identifier_preparer.quote
+                if is_sqlite(env):
+                    conn.execute(text(f"DROP INDEX {quote(old_name)}"))
+                else:
+                    conn.execute(text(f"DROP INDEX {quote(old_name)} ON {quote(table_name)}"))
+            print(f"  x {table_name}.{old_name} (remplacé par {new_name})")
+
+    if failed:
+        # Un index unique manquant fait basculer les upserts sur le chemin lent :
+        # l'échec ne doit pas passer pour une mise à jour réussie
+        raise RuntimeError(f"Index non créés sur '{env}' : {', '.join(failed)}")
+    print(f"Index à jour sur '{env}'.")
+
+
+def count_duplicates(engine, index) -> int:
+    """Nombre de valeurs de clé présentes plusieurs fois pour un index unique."""
+    columns = list(index.columns)
+    duplicates = (
+        select(*columns)
+        .where(*(column.is_not(None) for column in columns))
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(duplicates)).scalar_one()
+
+
 def drop_database(env: str = None, echo: bool = True):
     """Supprime toutes les tables (à utiliser avec précaution)."""
-    env = env or ENV
+    env = resolve_env(env)
 
-    if env == "prod":
+    if env == "PROD":
         confirm = input("⚠️  Vous allez supprimer la base de PRODUCTION. Tapez 'CONFIRM' : ")
         if confirm != "CONFIRM":
             print("Annulé.")
@@ -102,11 +432,17 @@ def drop_database(env: str = None, echo: bool = True):
     engine = get_engine(env, echo=echo)
 
     # Désactive les FK checks pour éviter les problèmes de dépendances circulaires
+    if is_sqlite(env):
+        fk_off, fk_on = "PRAGMA foreign_keys = OFF", "PRAGMA foreign_keys = ON"
+    else:
+        fk_off, fk_on = "SET FOREIGN_KEY_CHECKS = 0", "SET FOREIGN_KEY_CHECKS = 1"
+
     with engine.connect() as conn:
-        conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+        quote = conn.dialect.identifier_preparer.quote
+        conn.execute(text(fk_off))
         for table_name in SQLModel.metadata.tables:
-            conn.execute(text(f"DROP TABLE IF EXISTS `{table_name}`"))
-        conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {quote(table_name)}"))
+        conn.execute(text(fk_on))
         conn.commit()
 
     print(f"Toutes les tables ont été supprimées sur '{env}'.")
\ No newline at end of file
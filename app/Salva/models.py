@@ -1,7 +1,7 @@
 from typing import Optional, List
 from datetime import datetime, date, timezone
 from sqlmodel import SQLModel, Field, Relationship, Column, JSON, Index
-from sqlalchemy import DateTime, Integer, ForeignKey, func
+from sqlalchemy import DateTime, Integer, ForeignKey, Table, func
 from pydantic import BaseModel, field_validator
 import enum
 
@@ -244,11 +244,18 @@ class TaskTemplate(SQLModel, table=True):
 class TaskInstance(SQLModel, table=True):
     __tablename__ = "task_instances"
     __table_args__ = (
-        Index("idx_instances_user_id", "user_id"),
-        Index("idx_instances_template_id", "template_id"),
-        Index("idx_instances_matching", "user_id", "matching_status"),
+        # get_pending/orphan_instances et leurs versions en flux, triées par date
+        Index("idx_instances_matching_start", "user_id", "matching_status", "scheduled_start"),
         Index("idx_instances_scheduled", "scheduled_start"),
         Index("idx_instances_calendar_event", "calendar_event_id"),
+        # get_user_instances : user + plage de dates (+ statut), trié par date
+        Index("idx_instances_user_start", "user_id", "scheduled_start", "status"),
+        # find_duplicate(s) : user + titre + date
+        Index("idx_instances_dedup", "user_id", "title", "scheduled_start", mysql_length={"title": 191}),
+        # get_last_instance_by_template : template, parcouru par date décroissante
+        Index("idx_instances_template_start", "template_id", "scheduled_start", "status"),
+        # Un event iCloud ne correspond qu'à une instance par utilisateur
+        Index("uq_instances_user_event", "user_id", "calendar_event_id", unique=True),
     )
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -454,4 +461,34 @@ class LearnedPattern(SQLModel, table=True):
     )
 
     # Relations
-    user: User = Relationship(back_populates="patterns")
\ No newline at end of file
+    user: User = Relationship(back_populates="patterns")
+
+
+# ============================================
+# ARCHIVES — lignes anciennes sorties des tables chaudes
+# ============================================
+def _archive_table(source: Table, name: str, *indexes: Index) -> Table:
+    """Copie des colonnes de `source`, sans clés étrangères ni index, plus archived_at.
+
+    Les id d'origine sont conservés pour garder le lien instance ↔ tentatives.
+    """
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+        for c in source.columns
+    ]
+    columns.append(Column("archived_at", DateTime(timezone=True), nullable=False))
+    return Table(name, SQLModel.metadata, *columns, *indexes)
+
+
+TaskInstanceArchive = _archive_table(
+    TaskInstance.__table__,
+    "task_instances_archive",
+    Index("idx_instances_archive_user_start", "user_id", "scheduled_start"),
+    Index("idx_instances_archive_template", "template_id"),
+)
+
+MatchAttemptArchive = _archive_table(
+    MatchAttempt.__table__,
+    "match_attempts_archive",
+    Index("idx_match_archive_instance", "instance_id"),
+)
@@ -1,22 +1,52 @@
-from Salva.database import create_database, drop_database
+from Salva.database import create_database, drop_database, create_indexes, get_session
+from Salva.Services.Archiver import Archiver
+from Salva.Services.PatternBackfill import PatternBackfill
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 ENV = os.getenv("ENV")
+
+
+def archive(env: str = None, horizon_days: int = None, dry_run: bool = False):
+    """Archive les instances anciennes, ou affiche seulement ce qui serait déplacé."""
+    with get_session(env) as session:
+        archiver = Archiver(session, horizon_days=horizon_days)
+
+        if dry_run:
+            report = archiver.report()
+            print(f"Archivage avant le {report['cutoff']:%Y-%m-%d} (dry-run, rien n'est modifié) :")
+            for table in ("task_instances", "match_attempts"):
+                stats = report[table]
+                size = f", ~{stats['bytes'] / 1024 / 1024:.1f} Mo" if stats["bytes"] is not None else ""
+                print(f"  - {table} : {stats['archivable']} / {stats['total']} lignes{size}")
+            return
+
+        result = archiver.run()
+        print(f"{result['instances']} instances et {result['match_attempts']} tentatives archivées.")
+
+
+def backfill_patterns(env: str = None, user_id: int = None):
+    """Recalcule les LearnedPattern par template depuis tout l'historique (instances et archives)."""
+    with get_session(env) as session:
+        result = PatternBackfill(session).run(user_id)
+        print(f"{result['patterns']} patterns recalculés pour {result['templates']} templates ({result['instances']} instances).")
+
+
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Gestion de la base de données DailyBrief")
     parser.add_argument(
         "--action",
-        choices=["create", "drop", "recreate"],
-        help="Action à effectuer : create, drop, ou recreate (drop + create)",
+        choices=["create", "drop", "recreate", "indexes", "archive", "patterns"],
+        help="Action à effectuer : create, drop, recreate (drop + create), indexes (ajoute les index manquants), archive "
+             "ou patterns (recalcule les LearnedPattern depuis l'historique)",
     )
     parser.add_argument(
         "--env",
-        choices=["test", "prod"],
+        choices=["test", "prod", "sqlite"],
         default=None,
         help="Environnement cible (défaut : variable ENV ou 'test')",
     )
@@ -26,6 +56,24 @@ if __name__ == "__main__":
         help="Afficher les requêtes SQL exécutées",
     )
 
+    parser.add_argument(
+        "--horizon-days",
+        type=int,
+        default=None,
+        help="archive : âge minimum des lignes à archiver (défaut : ARCHIVE_HORIZON_DAYS ou 365)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="archive : afficher le volume concerné sans rien déplacer",
+    )
+    parser.add_argument(
+        "--user-id",
+        type=int,
+        default=None,
+        help="patterns : limiter le recalcul à un utilisateur (défaut : tous)",
+    )
+
     args = parser.parse_args()
     target_env = args.env or ENV
 
@@ -37,4 +85,13 @@ if __name__ == "__main__":
 
     elif args.action == "recreate":
         drop_database(env=target_env, echo=args.echo)
-        create_database(env=target_env, echo=args.echo)
\ No newline at end of file
+        create_database(env=target_env, echo=args.echo)
+
+    elif args.action == "indexes":
+        create_indexes(env=target_env, echo=args.echo)
+
+    elif args.action == "archive":
+        archive(env=target_env, horizon_days=args.horizon_days, dry_run=args.dry_run)
+
+    elif args.action == "patterns":
+        backfill_patterns(env=target_env, user_id=args.user_id)
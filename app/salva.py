@@ -1,43 +1,71 @@
-from Salva.database import get_session
-from Salva.Calendars import Calendars
-from Salva.CalendarSync import CalendarSync
-from Salva.Repository.Users import UserRepository
+from Salva.Services.SyncPool import SyncPool
+from Salva import Instrumentation
 
 from datetime import datetime, timezone
-from Salva.Services.ScheduleEvent import ScheduleEvent
-from Salva.models import User
 
 import argparse
+import logging
 
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-session = get_session(os.getenv("ENV"))
+CALENDAR_NAME = "Travail"
+
+def run_salva(pool: SyncPool, emails=None) -> list[dict]:
+    results = pool.run(
+        CALENDAR_NAME,
+        datetime(2026, 2, 23, 0, 0, tzinfo=timezone.utc),
+        datetime(2026, 3, 3, 23, 0, tzinfo=timezone.utc),
+        emails=emails,
+    )
+
+    for result in results:
+        print(f"[{result['status'].upper()}] {result['email']}")
+
+    return results
 
 def main(opt):
-    userRep = UserRepository(session)
+    if opt.profile_sql or opt.profile_sql_out:
+        Instrumentation.enable()
+        if opt.profile_sql_out:
+            Instrumentation.add_sink(Instrumentation.JsonLinesSink(opt.profile_sql_out))
 
-    user : User = userRep.get_user_by_email(opt.user)
+    pool = SyncPool(os.getenv("ENV"), max_workers=opt.workers, budget_seconds=opt.budget)
 
-    cal_client = Calendars()
-    sync = CalendarSync(session, cal_client)
-    SE = ScheduleEvent(session)
+    emails = [opt.user] if opt.user else None
+    results = run_salva(pool, emails)
 
-    sync.sync(user.id, "Travail", datetime(2026, 2, 23, 0, 0, tzinfo=timezone.utc), datetime(2026, 3, 3, 23, 0, tzinfo=timezone.utc))
-    SE.calcul_new_week()  
-    sync.sync(user.id, "Travail", datetime(2026, 2, 23, 0, 0, tzinfo=timezone.utc), datetime(2026, 3, 3, 23, 0, tzinfo=timezone.utc))
+    if Instrumentation.is_enabled():
+        Instrumentation.emit()
+
+    return 0 if all(r["status"] == "ok" for r in results) else 1
 
 if __name__ == "__main__" :
+    logging.basicConfig(level=logging.INFO)
+
     opt = argparse.ArgumentParser(
         description="Salva est un moteur de management d'emploie du temps sur Iphone."
     )
 
     opt.add_argument(
-        "--user", default="batmoon19@gmail.com", type=str, help="Adresse mail du compte que vous voulez connecter", required=True
+        "--user", default=None, type=str, help="Adresse mail du compte à synchroniser (défaut : tous les utilisateurs)"
+    )
+    opt.add_argument(
+        "--workers", default=4, type=int, help="Nombre d'utilisateurs synchronisés en parallèle"
+    )
+    opt.add_argument(
+        "--budget", default=300, type=float, help="Temps maximum (secondes) accordé à chaque utilisateur"
+    )
+
+    opt.add_argument(
+        "--profile-sql", action="store_true", help="Compter les requêtes SQL par opération / méthode et signaler les N+1"
+    )
+    opt.add_argument(
+        "--profile-sql-out", default=None, type=str, help="Fichier JSON Lines où ajouter le résumé SQL (active --profile-sql)"
     )
 
     args = opt.parse_args()
 
-    main(args)
\ No newline at end of file
+    raise SystemExit(main(args))
@@ -1,17 +1,28 @@
 import schedule
 import time
-import subprocess
+import logging
+import os
 from datetime import datetime
 
+from salva import run_salva
+from Salva.Services.SyncPool import SyncPool
+
+logging.basicConfig(level=logging.INFO)
+
+# Exécuté dans le process du scheduler : le pool de connexions reste chaud entre deux runs
+pool = SyncPool(os.getenv("ENV"))
+
 def Salva():
     print(f"[{datetime.now()}] → Exécution de l'algorithme Salva ...")
-    result = subprocess.run(
-        ["python", "salava.py", "--user", "batmoon19@gmail.com"],
-        capture_output=True,
-        text=True
-    )
-    if result.returncode != 0:
-        print(f"[ERREUR] {result.stderr}")
+    try:
+        results = run_salva(pool)
+    except Exception as e:
+        print(f"[ERREUR] {e}")
+        return
+
+    failed = [r for r in results if r["status"] != "ok"]
+    if failed:
+        print(f"[ERREUR] {len(failed)} utilisateur(s) en échec : {', '.join(r['email'] for r in failed)}")
     else:
         print(f"[OK] Terminé avec succès")
 
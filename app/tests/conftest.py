@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+# Les modules se lancent depuis app/ (imports "Salva....")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Salva import models  # noqa: E402,F401  (enregistre les tables dans SQLModel.metadata)
+
+
+@pytest.fixture
+def engine():
+    """Base SQLite en mémoire, une connexion partagée par toutes les sessions du test."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
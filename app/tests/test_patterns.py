@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+from sqlmodel import Session, select
+
+from Salva.models import LearnedPattern, TaskInstance, TaskOrigin, TaskTemplate, User
+from Salva.Repository import Instances
+from Salva.Repository.Instances import InstancesRepository
+from Salva.Repository.Patterns import COMPLETION_TIME, DURATION, FREQUENCY, PREFERRED_DAY, template_category
+from Salva.Services.PatternBackfill import PatternBackfill
+
+# Lundi 5 janvier 2026, 8h UTC
+BASE = datetime(2026, 1, 5, 8, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def template(engine):
+    """Un template et 6 instances, chaque lundi ; renvoie (user_id, template_id, ids)."""
+    with Session(engine) as session:
+        user = User(email="patterns@example.com")
+        session.add(user)
+        session.commit()
+        template = TaskTemplate(user_id=user.id, title="Piscine", estimated_duration=60)
+        session.add(template)
+        session.commit()
+
+        InstancesRepository(session).create_instances([
+            {
+                "user_id": user.id,
+                "template_id": template.id,
+                "title": "Piscine",
+                "scheduled_start": BASE + timedelta(weeks=week),
+                "scheduled_end": BASE + timedelta(weeks=week, hours=1),
+                "origin": TaskOrigin.CALENDAR,
+                "calendar_event_id": f"piscine-{week}",
+            }
+            for week in range(6)
+        ])
+        ids = session.exec(select(TaskInstance.id).order_by(TaskInstance.scheduled_start)).all()
+        return user.id, template.id, ids
+
+
+def complete(engine, instance_id: int, minutes: int) -> None:
+    """Complète une instance `minutes` après son début prévu, dans sa propre session."""
+    with Session(engine) as session:
+        repo = InstancesRepository(session)
+        start = repo.get_instance(instance_id).scheduled_start.replace(tzinfo=timezone.utc)
+        with mock.patch.object(Instances, "now_utc", return_value=start + timedelta(minutes=minutes)):
+            repo.complete_instance(instance_id)
+
+
+def load_patterns(engine, user_id: int, template_id: int) -> dict:
+    """Patterns relus depuis la base, dans une session neuve."""
+    with Session(engine) as session:
+        statement = (
+            select(LearnedPattern)
+            .where(LearnedPattern.user_id == user_id)
+            .where(LearnedPattern.category == template_category(template_id))
+        )
+        return {pattern.pattern_type: pattern.pattern_data for pattern in session.exec(statement).all()}
+
+
+def test_completions_are_persisted(engine, template):
+    user_id, template_id, ids = template
+    for instance_id in ids[:4]:
+        complete(engine, instance_id, minutes=50)
+
+    patterns = load_patterns(engine, user_id, template_id)
+    assert patterns[COMPLETION_TIME]["completed"] == 4
+    # Toujours le lundi : seuls les compteurs changent (share et preferred_weekday
+    # restent égaux), l'UPDATE ne doit pas être omis pour autant
+    assert patterns[PREFERRED_DAY]["counts"] == [4, 0, 0, 0, 0, 0, 0]
+    assert patterns[FREQUENCY]["days_n"] == 3
+    assert patterns[FREQUENCY]["days_mean"] == pytest.approx(7)
+    assert patterns[DURATION]["minutes_n"] == 4
+    assert patterns[DURATION]["minutes_mean"] == pytest.approx(50)
+
+
+def test_status_change_counts_first_outcome_only(engine, template):
+    user_id, template_id, ids = template
+    complete(engine, ids[0], minutes=30)
+    with Session(engine) as session:
+        InstancesRepository(session).cancel_instance(ids[0])
+        InstancesRepository(session).cancel_instance(ids[1])
+        InstancesRepository(session).complete_instance(ids[1])
+
+    patterns = load_patterns(engine, user_id, template_id)
+    assert patterns[COMPLETION_TIME]["completed"] == 1
+    assert patterns[COMPLETION_TIME]["cancelled"] == 1
+    assert sum(patterns[PREFERRED_DAY]["counts"]) == 1
+
+
+def test_backfill_matches_incremental_without_status_change(engine, template):
+    user_id, template_id, ids = template
+    for offset, instance_id in enumerate(ids[:5]):
+        complete(engine, instance_id, minutes=40 + 10 * offset)
+    with Session(engine) as session:
+        InstancesRepository(session).cancel_instance(ids[5])
+
+    incremental = load_patterns(engine, user_id, template_id)
+    with Session(engine) as session:
+        PatternBackfill(session).run(user_id)
+    backfilled = load_patterns(engine, user_id, template_id)
+
+    assert incremental.keys() == backfilled.keys()
+    for pattern_type, data in incremental.items():
+        assert data.keys() == backfilled[pattern_type].keys()
+        for key, value in data.items():
+            assert backfilled[pattern_type][key] == (pytest.approx(value) if isinstance(value, float) else value)